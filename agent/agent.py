@@ -1,25 +1,73 @@
-import requests
+import asyncio
+import atexit
 import json
 import re
 import os
 import tempfile
-import subprocess
 import sys
+import threading
+import time
+import uuid
 from termcolor import colored
-from agent.prompts import SYSTEM_PROMPT, error_prompt
+from agent.prompts import SYSTEM_PROMPT, EDIT_MODE_PROMPT, error_prompt
+from agent.llm_client import get_async_client, close_async_clients
+from agent.output_capture import OutputCapture, pump_streams, watch_output
+from agent.workspace import Workspace
+from agent.result_cache import ResultCache
+from agent.preflight import preflight, format_issues
+from agent.test_results import parse_test_results
+from agent.crash_report import report_env, read_report, report_lines, format_report
+from agent.context import CHARS_PER_TOKEN, ContextBudget
+from agent.patching import PatchError, apply_reply, is_patch
+from agent.event_log import EventLog
+from agent.metrics import SessionMetrics
+
+# Constraint templates (see llm/constraints.py) that make the servers return
+# well-formed replies in one request instead of relying on reminder loops:
+#  - code replies: free-form reasoning, exactly one python block, then EOS
+#  - edit-mode replies: the same with an edits/diff block allowed instead
+#  - analyzer replies: the [BOOL]/[SUMMARY] format parsed below
+CODE_CONSTRAINT = "{*12000}```python{*}```"
+EDIT_CONSTRAINT = "{*12000}```{python|edits|diff}{*}```"
+ANALYZER_CONSTRAINT = "[BOOL] {TRUE|FALSE} [/BOOL]\n[SUMMARY]{*800}[/SUMMARY]"
+
+# Headroom over the prompt's "~N tokens" request before the server cuts a helper reply off
+HELPER_TOKEN_HEADROOM = 1.5
+
+# Event loop per thread behind the synchronous wrappers; reusing it keeps the
+# async client's keep-alive connections open between calls
+_SYNC_LOOPS = threading.local()
+
+
+def _run_sync(coro):
+    loop = getattr(_SYNC_LOOPS, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _SYNC_LOOPS.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coro)
+
+
+@atexit.register
+def _close_sync_loop():
+    loop = getattr(_SYNC_LOOPS, "loop", None)
+    if loop is not None and not loop.is_closed():
+        loop.run_until_complete(close_async_clients())
+        loop.close()
 
 ######################################################################
 # 1) HELPER: Extract lines around the error
 ######################################################################
-def detect_error_lines(code_str, error_msg, context_radius=3):
+def detect_error_lines(code_str, error_msg, context_radius=3, crash=None):
     """
     Given the raw code string and an error message, attempt to find any line number
     references in the error. For each line number found, capture a small snippet of code
     (context_radius lines before and after).
+    With a crash report (agent/crash_report.py) the line numbers come from its
+    frames in the script, not from the message, whose own "line N" mentions
+    (e.g. a JSON decode error) say nothing about the script.
 
     Returns a string with the relevant lines, or an empty string if none found.
     """
-    line_numbers = re.findall(r"line\s+(\d+)", error_msg)
+    line_numbers = report_lines(crash) if crash is not None else re.findall(r"line\s+(\d+)", error_msg)
     if not line_numbers:
         return ""  # no line info found
 
@@ -51,15 +99,19 @@ def detect_error_lines(code_str, error_msg, context_radius=3):
 ######################################################################
 # 2) HELPER: Summarize the attempt with the LLM
 ######################################################################
-def summarize_attempt_with_llm(llm_url, code, error_msg, iteration, token_limit=200):
+async def summarize_attempt_with_llm_async(llm_url, code, error_msg, iteration, token_limit=200, model=None,
+                                           crash=None):
     """
     Calls the LLM *again* to produce a short summary (~200 tokens) of:
       - The code snippet
       - The lines around the error, if any
       - The error message
     Then returns that short summary string.
+    `model` selects a model by name on the multi-model server.
+    `llm_url` may be a URL, a list of URLs or an AsyncLLMClient.
+    `crash` is the attempt's crash report, if the script wrote one.
     """
-    relevant_snippet = detect_error_lines(code, error_msg)
+    relevant_snippet = detect_error_lines(code, error_msg, crash=crash)
     system_instruction = {
         "role": "system",
         "content": (
@@ -78,13 +130,12 @@ def summarize_attempt_with_llm(llm_url, code, error_msg, iteration, token_limit=
         )
     }
     conversation = [system_instruction, user_input]
-    headers = {"Content-Type": "application/json"}
-    data = {"messages": conversation}
+    data = {"messages": conversation, "max_new_tokens": int(token_limit * HELPER_TOKEN_HEADROOM)}
+    if model:
+        data["model"] = model
 
     try:
-        resp = requests.post(llm_url, headers=headers, data=json.dumps(data))
-        resp.raise_for_status()
-        summary_text = resp.text.strip()
+        summary_text = (await get_async_client(llm_url).generate(data)).strip()
     except Exception as e:
         fallback_summary = (
             f"Attempt #{iteration} - Summarizer call failed. Error excerpt: {error_msg[:100]}"
@@ -94,16 +145,26 @@ def summarize_attempt_with_llm(llm_url, code, error_msg, iteration, token_limit=
     return f"[SUMMARY OF ATTEMPT #{iteration}]\n{summary_text}\n"
 
 
+def summarize_attempt_with_llm(llm_url, code, error_msg, iteration, token_limit=200, model=None, crash=None):
+    """
+    Synchronous wrapper around summarize_attempt_with_llm_async.
+    """
+    return _run_sync(summarize_attempt_with_llm_async(llm_url, code, error_msg, iteration, token_limit, model, crash))
+
+
 ######################################################################
 # 3) HELPER: Analyze unit test output using the LLM
 ######################################################################
-def analyze_unit_test_with_llm(content, llm_url, token_limit=200, max_attempts=15):
+async def analyze_unit_test_with_llm_async(content, llm_url, token_limit=200, max_attempts=15, model=None):
     """
     Calls the LLM *again* to produce an analysis of:
       - The unit test output file.
-    It keeps calling the LLM with a reminder message until the response is
-    properly formatted with the required [BOOL] and [SUMMARY] tags.
+    The request is constrained to the [BOOL]/[SUMMARY] format, so one call is
+    normally enough; the reminder loop remains as a fallback for servers
+    without constraint support.
     Then returns a BOOL and a short summary string.
+    `model` selects a model by name on the multi-model server.
+    `llm_url` may be a URL, a list of URLs or an AsyncLLMClient.
     """
     system_instruction = {
         "role": "system",
@@ -124,7 +185,7 @@ def analyze_unit_test_with_llm(content, llm_url, token_limit=200, max_attempts=1
         )
     }
     conversation = [system_instruction, user_input]
-    headers = {"Content-Type": "application/json"}
+    client = get_async_client(llm_url)
     reminder_msg = (
         "You forgot to properly enclose your response with the required [BOOL] and [SUMMARY] tags. "
         "Please resend your answer in the correct format."
@@ -135,10 +196,14 @@ def analyze_unit_test_with_llm(content, llm_url, token_limit=200, max_attempts=1
     while attempts < max_attempts:
         attempts += 1
         try:
-            data = {"messages": conversation}
-            resp = requests.post(llm_url, headers=headers, data=json.dumps(data))
-            resp.raise_for_status()
-            llm_full_res = resp.text.strip()
+            data = {
+                "messages": conversation,
+                "max_new_tokens": int(token_limit * HELPER_TOKEN_HEADROOM),
+                "constraint": ANALYZER_CONSTRAINT
+            }
+            if model:
+                data["model"] = model
+            llm_full_res = (await client.generate(data)).strip()
         except Exception as e:
             return False, "Unit test analyzer call failed."
         
@@ -158,14 +223,129 @@ def analyze_unit_test_with_llm(content, llm_url, token_limit=200, max_attempts=1
     return False, f"Max attempts reached. Last response: {llm_full_res}"
 
 
+def analyze_unit_test_with_llm(content, llm_url, token_limit=200, max_attempts=15, model=None):
+    """
+    Synchronous wrapper around analyze_unit_test_with_llm_async.
+    """
+    return _run_sync(analyze_unit_test_with_llm_async(content, llm_url, token_limit, max_attempts, model))
+
+
 ######################################################################
-# 4) Updated BugOutAgent Class with Final Check of Unit Test Results
+# 4) AsyncBugOutAgent: one refinement session on an asyncio event loop
 ######################################################################
-class BugOutAgent:
-    def __init__(self, llm_url, log_file):
+class AsyncBugOutAgent:
+    """
+    The BugOut refinement loop with async LLM streaming and async subprocess
+    execution, so many sessions can share one event loop (see run_sessions).
+    Requests to each backend are capped by the client's `max_concurrency`.
+
+    With `candidates` > 1, each iteration samples that many replies at once
+    (at `candidate_temperature`), runs every candidate in its own working
+    directory and keeps the first one whose run and unit-test check pass;
+    the rest are cancelled, which also stops their generation on the server.
+    """
+
+    def __init__(self, llm_url, log_file, code_model=None, helper_model=None, candidates=1,
+                 candidate_temperature=0.8, interpreter_pool=None, max_output_bytes=64 * 1024,
+                 inactivity_timeout=None, kill_pattern=None, sandbox=None, workspace_root=None,
+                 workspace_tmpfs=False, archive_dir="output", result_cache=None,
+                 preflight=True, summarize_every=1, context_budget=None, edit_mode=False,
+                 speculative=False, metrics=None):
+        # llm_url may be one URL, a list of backend URLs or a configured
+        # AsyncLLMClient (timeouts, retries, routing, concurrency)
         self.llm_url = llm_url
-        self.log_file = log_file
+        self.client = get_async_client(llm_url)
+
+        # log_file: path of the session's JSONL event log (agent/event_log.py),
+        # or an EventLog to share one log between sessions
+        self.events = log_file if isinstance(log_file, EventLog) else EventLog(log_file)
+        self.log_file = self.events.path
+
+        # Model names for llm/multi_model_api.py: a large one for code, a small
+        # one for summaries and unit-test analysis (None = server default)
+        self.code_model = code_model
+        self.helper_model = helper_model
+
+        # speculative=True asks for code replies through the server's draft
+        # model (BUGOUT_DRAFT_MODEL); servers without one use the batch scheduler
+        self.speculative = speculative
         
+        self.candidates = candidates
+        self.candidate_temperature = candidate_temperature
+
+        # Optional InterpreterPool (agent/interpreter_pool.py) of warm interpreters
+        # for run_code; may be shared by several sessions
+        self.interpreter_pool = interpreter_pool
+
+        # Script output limits (agent/output_capture.py): keep the head and tail
+        # of each stream, optionally stop scripts silent for inactivity_timeout
+        # seconds (default None = never; quiet scripts such as a pip install
+        # are legitimate) and stop at the first kill_pattern match
+        # (e.g. TRACEBACK_PATTERN)
+        self.max_output_bytes = max_output_bytes
+        self.inactivity_timeout = inactivity_timeout
+        self.kill_pattern = kill_pattern
+
+        # Optional Sandbox (agent/sandbox.py): CPU, memory, file and process
+        # limits for every run, with peak RSS and CPU time reported
+        self.sandbox = sandbox
+
+        # Every run gets its own Workspace (agent/workspace.py), optionally on
+        # tmpfs; finished workspaces are moved to archive_dir/<session_id>/
+        # (None = deleted)
+        self.workspace_root = workspace_root
+        self.workspace_tmpfs = workspace_tmpfs
+        self.archive_dir = archive_dir
+        self.session_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+        # Outcomes of earlier attempts (agent/result_cache.py), so code equivalent
+        # to a known failure is not run again; pass ResultCache(path=...) to keep
+        # it across sessions, or share one between sessions
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+
+        # In-process pre-flight checks (agent/preflight.py) before each run; code
+        # they reject is sent straight back without a subprocess or LLM summary
+        self.preflight = preflight
+        self.preflight_stats = {"checked": 0, "rejected": 0, "runs_saved": 0, "llm_calls_saved": 0}
+
+        # How unit-test verdicts were reached: parsed from runner/JSON output
+        # (agent/test_results.py) or, when that is inconclusive, by the LLM
+        self.verdict_stats = {"parsed": 0, "llm": 0}
+
+        # Failed attempts are summarized in the background, every
+        # summarize_every failures, while the next fix is generated (see
+        # _record_failure); summaries are folded into the conversation when ready
+        self.summarize_every = max(1, summarize_every)
+        self._pending_attempts = []
+        self._summary_tasks = []
+        self._summary_msg = None
+        self._last_failed_code = None
+
+        # Prompt token budget (agent/context.py): older attempt summaries are
+        # merged into a rolling digest when the prompt would exceed it, and
+        # every iteration's prompt size is recorded in prompt_tokens
+        self.context_budget = context_budget if context_budget is not None else ContextBudget()
+        self.attempt_summaries = []
+        self.attempts_digest = ""
+        self.prompt_tokens = []
+
+        # Edit mode: after the first attempt the LLM may answer with
+        # search/replace edits or a diff against the code the prompt shows as
+        # "Last Code Generated with Errors" (agent/patching.py); replies that
+        # do not apply fall back to full regeneration, and so does the reply
+        # after a patched script was rejected unseen by pre-flight checks
+        self.edit_mode = edit_mode
+        self._full_script_next = False
+        self.edit_stats = {"applied": 0, "failed": 0, "chars_saved": 0}
+
+        # Per-phase latencies, TTFT, decode rate, prompt sizes and iterations
+        # (agent/metrics.py), recorded into `metrics` (a MetricsRegistry; None =
+        # the process-wide REGISTRY) and summarized per session by metrics_report()
+        self.metrics = SessionMetrics(metrics)
+        self.iterations = 0
+        self.outcome = None
+        self._started = None
+
         self.conversation = []
         self.max_iterations = 50
         
@@ -180,105 +360,155 @@ class BugOutAgent:
         self.attempts_summary = ""
         self.last_code = None
 
+    def _log(self, event, **fields):
+        self.events.log(event, session=self.session_id, **fields)
+
     def add_message(self, role, input_text):
         return {"role": role, "content": input_text}
 
-    def call_llm(self):
+    async def call_llm(self, conversation=None, sampling=None, echo=True):
         """
-        Sends self.conversation to the LLM API and returns (final_text, code).
+        Sends a conversation (default: self.conversation) to the LLM API and
+        returns (final_text, code). The reply is appended to that conversation.
+        `sampling` adds generation fields such as do_sample/temperature; `echo`
+        prints the reply as it streams.
         """
-        headers = {"Content-Type": "application/json"}
+        if conversation is None:
+            conversation = self.conversation
         code_marker = "```python"
+        # In edit mode the reply may patch the last failed attempt (the code
+        # the prompt shows) instead of repeating it
+        base_code = self._last_failed_code if self.edit_mode and not self._full_script_next else None
         final_text = ""
 
-        while code_marker not in final_text:
-            data = {"messages": self.conversation}
+        while True:
+            constraint = EDIT_CONSTRAINT if base_code is not None else CODE_CONSTRAINT
+            data = {"messages": conversation, "constraint": constraint, **(sampling or {})}
+            if self.code_model:
+                data["model"] = self.code_model
+            if self.speculative:
+                data["speculative"] = True
 
-            with open(self.log_file, "a", encoding="utf-8") as f:
-                f.write(f"\n\nConversation:\n{self.conversation}")
+            self._log("llm_request", model=self.code_model, constraint=constraint, sampling=sampling,
+                      messages=conversation)
 
             try:
-                with requests.post(self.llm_url, headers=headers, data=json.dumps(data), stream=True) as r:
-                    r.raise_for_status()
-                    chunk_texts = []
-                    for chunk in r.iter_content(chunk_size=None):
-                        token_str = chunk.decode("utf-8")
+                started = time.time()
+                first_chunk_at = None
+                chunk_texts = []
+                async for token_str in self.client.stream_text(data):
+                    if first_chunk_at is None:
+                        first_chunk_at = time.time()
+                    if echo:
                         print(colored(token_str, "yellow"), end="", flush=True)
-                        chunk_texts.append(token_str)
-                    final_text = "".join(chunk_texts)
+                    chunk_texts.append(token_str)
+                final_text = "".join(chunk_texts)
+                self._observe_llm(started, first_chunk_at, final_text)
 
                 msg = self.add_message("assistant", final_text)
-                self.conversation.append(msg)
+                conversation.append(msg)
 
-                with open(self.log_file, "a", encoding="utf-8") as f:
-                    f.write(f"\n\nLLM RAW Response:\n{final_text}")
+                self._log(
+                    "llm_response", seconds=round(time.time() - started, 3),
+                    ttft=round(first_chunk_at - started, 3) if first_chunk_at else None, text=final_text
+                )
 
             except Exception as e:
                 print(colored(f"\n\nError during LLM API call:\n{str(e)}", "red"))
+                self._log("llm_error", error=str(e))
                 return None, None
 
-            code_blocks = re.findall(r'```python(.*?)```', final_text, re.DOTALL)
-            if code_blocks:
-                if len(code_blocks) == 1:
-                    print("\n\nSingle code block found")
-                    code = code_blocks[0].strip()
-                else:
-                    print("\n\nMultiple code blocks found")
-                    code = "\n\n".join(block.strip() for block in code_blocks)
-
-                with open(self.log_file, "a", encoding="utf-8") as f:
-                    f.write(f"\n\nCode Generated:\n{code}")
+            if base_code is not None:
+                try:
+                    code = apply_reply(base_code, final_text)
+                except PatchError as e:
+                    # Fall back to regenerating the whole script
+                    self.edit_stats["failed"] += 1
+                    self._log("edits_rejected", error=str(e))
+                    conversation.append(self.add_message(
+                        "user",
+                        f"Your edits could not be applied: {e}\n"
+                        f"Please resend the complete corrected script in a single {code_marker} block."
+                    ))
+                    base_code = None
+                    continue
+                if code is not None:
+                    self.edit_stats["applied"] += 1
+                    self.edit_stats["chars_saved"] += max(0, len(code) - len(final_text))
+                    self._log("code", source="edits", code=code)
+                    return final_text, code
 
-                return final_text, code
+            code_block = re.search(r'```python(.*?)```', final_text, re.DOTALL)
+            if code_block is None:
+                self._log("code_missing", chars=len(final_text))
+                if code_marker in final_text:
+                    # An unclosed block: the server's token limit cut the reply off
+                    conversation.append(self.add_message(
+                        "user",
+                        f"Your reply was cut off before the {code_marker} block was closed. "
+                        "Please resend the complete script with shorter reasoning."
+                    ))
+                    return final_text, None
+                # No block at all: a server without constraint support
+                conversation.append(self.add_message(
+                    "user",
+                    f"You forgot to properly enclose your code with {code_marker}.\n"
+                    "Please resend the response with proper Python code enclosures."
+                ))
+                continue
 
-            reminder_msg = (
-                f"You forgot to properly enclose your code with {code_marker}.\n"
-                "Please resend the response with proper Python code enclosures."
-            )
-            self.conversation.append(self.add_message("user", reminder_msg))
+            code = code_block.group(1).strip()
+            self._log("code", source="reply", code=code)
+            return final_text, code
 
-        return final_text, None
+    async def run_code(self, code, timeout=90, cwd=None, env=None):
+        """
+        Executes code in a subprocess (in `cwd`, with extra `env` variables, if
+        given) and returns (success, result).
+        """
+        success, result, _ = await self._run_script(code, timeout, cwd, env)
+        return success, result
 
-    def run_code(self, code, timeout=90):
-        """Executes code in a subprocess and returns (success, result)."""
+    async def _run_script(self, code, timeout=90, cwd=None, env=None):
+        """
+        run_code returning (success, result, run): `run` is the execution
+        record (returncode, stopped, limit, ...) with the script's crash report
+        under "crash", or None if the script could not be run.
+        """
         print(colored(f"\n\n===>Executing Code:\n\n", "cyan"))
         
         with tempfile.NamedTemporaryFile(mode='w', suffix=".py", delete=False) as tmp_file:
             script_path = tmp_file.name
             tmp_file.write(code)
+        # An uncaught exception is also reported as structured data (agent/crash_report.py)
+        report_path = script_path[:-3] + "-crash.json"
+        env = {**(env or {}), **report_env(script_path, report_path)}
+        # Output reaches a pipe: without this, print() sits in an 8 KB block
+        # buffer, so progress never shows and looks like silence
+        env.setdefault("PYTHONUNBUFFERED", "1")
 
+        run = None
         try:
-            proc = subprocess.Popen(
-                [sys.executable, script_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+            run = await self._execute(script_path, timeout, cwd, env)
+            stdout, stderr = run["stdout"], run["stderr"]
+            run["crash"] = crash = read_report(report_path)
+            self._observe_run(run)
+            self._log(
+                "execution", script=script_path, cwd=cwd, timeout=timeout, returncode=run["returncode"],
+                seconds=round(run["seconds"], 3), stopped=run["stopped"], limit=run["limit"],
+                peak_rss_mb=run["peak_rss_mb"], cpu_seconds=run["cpu_seconds"], stdout=stdout, stderr=stderr,
+                crash=crash
             )
-            try:
-                stdout, stderr = proc.communicate(timeout=timeout)
-            except subprocess.TimeoutExpired:
-                proc.kill()
-                stdout, stderr = proc.communicate()
-                return_code = proc.returncode
-
-                with open(self.log_file, "a", encoding="utf-8") as f:
-                    f.write(f"\n\n=== Subprocess Execution (Timed Out) ===\n")
-                    f.write(f"Script: {script_path}\n")
-                    f.write(f"Timeout: {timeout} seconds\n")
-                    f.write(f"STDOUT:\n{stdout}\n")
-                    f.write(f"STDERR:\n{stderr}\n")
-
+            if run["stopped"] in ("timeout", "inactivity"):
                 print(colored("\n\nError: Code execution timed out!", "red"))
-                return False, f"Execution timed out after {timeout} seconds."
-
-            return_code = proc.returncode
-            with open(self.log_file, "a", encoding="utf-8") as f:
-                f.write(f"\n\n=== Subprocess Execution ===\n")
-                f.write(f"Script: {script_path}\n")
-                f.write(f"Return code: {return_code}\n")
-                f.write(f"STDOUT:\n{stdout}\n")
-                f.write(f"STDERR:\n{stderr}\n")
+                if run["stopped"] == "inactivity":
+                    return False, (
+                        f"Execution stopped after {self.inactivity_timeout} seconds without any output "
+                        f"(the script appears to hang).\n\nSTDOUT (last lines):\n{stdout[-2000:]}"
+                    ), run
+                return False, f"Execution timed out after {timeout} seconds.", run
 
+            return_code = run["returncode"]
             if return_code == 0:
                 print(colored("\n\nGood Code Execution (no Python error)!", "green"))
                 print("STDOUT:", stdout)
@@ -289,29 +519,107 @@ class BugOutAgent:
             os.remove(script_path)
 
             if return_code != 0:
-                return False, f"Script exited with code {return_code}\n\nSTDERR:\n{stderr}"
+                if run["limit"] == "cpu":
+                    return False, (
+                        f"Script exceeded its CPU time limit of {self.sandbox.cpu_seconds} seconds.\n\nSTDERR:\n{stderr}"
+                    ), run
+                if run["limit"] == "memory":
+                    return False, (
+                        f"Script was killed for exceeding its memory limit of {self.sandbox.memory_mb} MB.\n\nSTDERR:\n{stderr}"
+                    ), run
+                if crash is not None:
+                    return False, self._crash_feedback(return_code, crash, stderr), run
+                return False, f"Script exited with code {return_code}\n\nSTDERR:\n{stderr}", run
 
-            return True, stdout
+            return True, stdout, run
 
         except Exception as e:
             print(colored(f"\n\nError Encountered:\n{str(e)}", "red"))
-            with open(self.log_file, "a", encoding="utf-8") as f:
-                f.write(f"\n\nError Encountered:\n{str(e)}\n")
-            return False, str(e)
+            self._log("execution_error", script=script_path, error=str(e))
+            return False, str(e), None
+        finally:
+            for path in (script_path, report_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _crash_feedback(self, return_code, crash, stderr):
+        """
+        Error feedback built from a crash report instead of the raw stderr:
+        the exception, the script's own frames and their locals, plus the
+        last lines the script wrote to stderr before the traceback, if any.
+        """
+        feedback = f"Script exited with code {return_code}\n\n{format_report(crash)}"
+        before_traceback = stderr.split("Traceback (most recent call last)", 1)[0].strip()
+        if before_traceback:
+            feedback += "\n\nSTDERR before the error (last lines):\n" + "\n".join(before_traceback.splitlines()[-10:])
+        return feedback
+
+    async def _execute(self, script_path, timeout, cwd=None, env=None):
+        """
+        Runs a script in a warm interpreter from the pool, or a cold
+        `python script.py` without one (under the sandbox's limits, if set),
+        streaming its output into a bounded OutputCapture. Returns stdout,
+        stderr, returncode, seconds and stopped ("timeout", "inactivity",
+        "pattern" or None), plus peak_rss_mb, cpu_seconds and limit when
+        measured; the script is killed if the caller is cancelled.
+        """
+        capture = OutputCapture(self.max_output_bytes, self.kill_pattern)
+        if self.interpreter_pool is not None:
+            return await self.interpreter_pool.run(
+                script_path, timeout, cwd=cwd, env=env, capture=capture, inactivity_timeout=self.inactivity_timeout,
+                sandbox=self.sandbox
+            )
+        if self.sandbox is not None:
+            return await self.sandbox.run(
+                script_path, timeout, cwd=cwd, env=env, capture=capture, inactivity_timeout=self.inactivity_timeout
+            )
+
+        started = time.time()
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, script_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env={**os.environ, **env} if env else None
+        )
+
+        def kill():
+            if proc.returncode is None:
+                proc.kill()
+
+        queue = asyncio.Queue()
+        pump = asyncio.create_task(pump_streams({"stdout": proc.stdout, "stderr": proc.stderr}, queue))
+        try:
+            stopped = await watch_output(queue, kill, capture, timeout, self.inactivity_timeout)
+            await proc.wait()
+        except asyncio.CancelledError:
+            # Another candidate won; do not leave the script running
+            kill()
+            await proc.wait()
+            raise
         finally:
-            if os.path.exists(script_path):
-                os.remove(script_path)
+            pump.cancel()
+        return {
+            "stdout": capture.text("stdout"),
+            "stderr": capture.text("stderr"),
+            "returncode": proc.returncode,
+            "seconds": time.time() - started,
+            "stopped": stopped,
+            "peak_rss_mb": None,
+            "cpu_seconds": None,
+            "limit": None,
+        }
 
-    def final_check_unit_tests(self):
+    async def final_check_unit_tests(self, output_dir="output"):
         """
         Final check after successful execution:
         - Look for unit test result files in the output/ directory.
         - Verify that at least one file (e.g., one with 'test' in its name) exists.
-        - Read the file's contents to determine if tests passed.
+        - Read the file's contents to determine if tests passed: parsed from
+          unittest/pytest/JSON results when possible, otherwise by the LLM.
         Returns (True, message) if the unit test results are valid,
         or (False, error_message) if not.
         """
-        output_dir = "output"
         if not os.path.isdir(output_dir):
             return False, "Output directory 'output/' not found. Unit tests did not run."
 
@@ -325,17 +633,29 @@ class BugOutAgent:
                 try:
                     with open(test_file, "r", encoding="utf-8") as tf:
                         content = tf.read()
-                        pass_fail, summary = analyze_unit_test_with_llm(content, self.llm_url, token_limit=200)
-                        if pass_fail:
-                            return True, "Unit tests passed."
-                        else:
-                            return False, summary
+                    verdict = parse_test_results(content)
+                    if verdict is not None:
+                        self.verdict_stats["parsed"] += 1
+                        self._log("verdict", method="parsed", file=f, passed=verdict["passed"],
+                                  format=verdict["format"], message=verdict["summary"])
+                        return verdict["passed"], verdict["summary"]
+                    self.verdict_stats["llm"] += 1
+                    started = time.time()
+                    pass_fail, summary = await analyze_unit_test_with_llm_async(
+                        content, self.client, token_limit=200, model=self.helper_model
+                    )
+                    self.metrics.observe("bugout_phase_seconds", time.time() - started, phase="analyzer")
+                    self._log("verdict", method="llm", file=f, passed=pass_fail, message=summary, content=content)
+                    if pass_fail:
+                        return True, "Unit tests passed."
+                    else:
+                        return False, summary
                 except Exception as e:
                     return False, f"Error reading unit test file {test_file}: {str(e)}"
 
         return False, "No unit test result file found in output/ directory."
 
-    def generate_and_refine(self, user_request):
+    async def generate_and_refine(self, user_request):
         """
         Main refinement loop with:
           - Additional LLM-based summarization (200 tokens) of code and error.
@@ -344,94 +664,466 @@ class BugOutAgent:
         """
         self.user_request_msg = {"role": "user", "content": user_request}
         self.conversation.append(self.user_request_msg)
+        self._started = time.time()
+        code = None
+        try:
+            code, result = await self._refine()
+            return code, result
+        finally:
+            # Summaries still running are not needed once the session ends
+            for _, task in self._summary_tasks:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in self._summary_tasks), return_exceptions=True)
+            self._summary_tasks = []
+            self._finish_session(code is not None)
 
+    async def _refine(self):
         for iteration in range(1, self.max_iterations + 1):
-            # 1) Ask the LLM for code
-            _, code = self.call_llm()
-            if not code:
-                continue
+            self.iterations = iteration
+            started = time.time()
+            try:
+                self._fold_summaries()
+                await self._fit_context(iteration)
+                if self.candidates > 1:
+                    code, result = await self._best_of_candidates(iteration)
+                    if code is not None:
+                        return code, result
+                    continue
 
-            if self.last_code is not None and code.strip() == self.last_code.strip():
-                self.conversation.append(
-                    self.add_message("user", "This code is identical to the previous attempt. Please try a new approach.")
-                )
-                continue
-            self.last_code = code
-
-            # 2) Run the code in a subprocess
-            success, result = self.run_code(code)
-            if success:
-                print("\n\n=== Saving Generated Code Before Test Result Analysis ===\n\n")
-                generated_code_iteration_path = self.code_out = f"output/generated_code_iteration-{iteration}.py"
-                # Write the iteration code to your specified output file
-                with open(generated_code_iteration_path, "w", encoding="utf-8") as f:
-                    f.write(code)
-
-                # === Final Check: Verify unit test results ===
-                final_ok, final_message = self.final_check_unit_tests()
-                if final_ok:
-                    print(colored("\n\nFinal Check Passed: Unit tests are valid.", "green"))
-                    return code, result
-                else:
-                    print(colored(f"\n\nFinal Check Failed: {final_message}", "red"))
-                    # Summarize final check failure and update summary
-                    iteration_summary = summarize_attempt_with_llm(
-                        llm_url=self.llm_url,
-                        code=code,
-                        error_msg=final_message,
-                        iteration=iteration,
-                        token_limit=200
-                    )
-                    # Remove any stale code marker from the cumulative summary
-                    marker = "Last Code Generated with Errors:"
-                    if marker in self.attempts_summary:
-                        idx = self.attempts_summary.rfind(marker)
-                        self.attempts_summary = self.attempts_summary[:idx]
-                    self.attempts_summary += iteration_summary + "\nLast Code Generated with Errors: " + code + "\n"
-                    debug_msg = error_prompt(final_message)
-                    system_msg = self.conversation[0]  # system prompt
-                    user_req = self.conversation[1]    # original user request
-                    summary_msg = self.add_message(
-                        "assistant",
-                        f"Here is a summary of all attempts so far:\n{self.attempts_summary}"
+                # 1) Ask the LLM for code
+                reply, code = await self.call_llm()
+                if not code:
+                    continue
+
+                if self.last_code is not None and code.strip() == self.last_code.strip():
+                    self.conversation.append(
+                        self.add_message("user", "This code is identical to the previous attempt. Please try a new approach.")
                     )
-                    debug_msg_struct = self.add_message("user", debug_msg)
-                    self.conversation = [
-                        system_msg,
-                        user_req,
-                        summary_msg,
-                        debug_msg_struct
-                    ]
-                    print(colored(f"===>Error feedback (final check) sent to LLM. Iteration {iteration}", "red"))
                     continue
-            else:
-                iteration_summary = summarize_attempt_with_llm(
-                    llm_url=self.llm_url,
-                    code=code,
-                    error_msg=result,
-                    iteration=iteration,
-                    token_limit=200
-                )
-                # Remove any stale code marker from the cumulative summary
-                marker = "Last Code Generated with Errors:"
-                if marker in self.attempts_summary:
-                    idx = self.attempts_summary.rfind(marker)
-                    self.attempts_summary = self.attempts_summary[:idx]
-                self.attempts_summary += iteration_summary + "\nLast Code Generated with Errors: " + code + "\n"
-                debug_msg = error_prompt(result)
-                system_msg = self.conversation[0]
-                user_req = self.conversation[1]
-                summary_msg = self.add_message(
-                    "assistant",
-                    f"Here is a summary of all attempts so far:\n{self.attempts_summary}"
-                )
-                debug_msg_struct = self.add_message("user", debug_msg)
-                self.conversation = [
-                    system_msg,
-                    user_req,
-                    summary_msg,
-                    debug_msg_struct
-                ]
-                print(colored(f"===>Error feedback sent to LLM. Iteration {iteration}", "red"))
+                self.last_code = code
+
+                known_error = self._known_failure(code)
+                if known_error is not None:
+                    self.conversation.append(self.add_message("user", known_error))
+                    continue
+
+                preflight_error = self._preflight_failure(code, patched=is_patch(reply))
+                if preflight_error is not None:
+                    self.conversation.append(self.add_message("user", preflight_error))
+                    print(colored(f"===>Pre-flight feedback sent to LLM. Iteration {iteration}", "red"))
+                    continue
+
+                # 2) Run the code in a subprocess, inside this iteration's own workspace
+                workspace = self._new_workspace(f"iteration-{iteration}")
+                try:
+                    success, result, run = await self._run_script(code, cwd=workspace.path, env=workspace.env())
+                    if success:
+                        print("\n\n=== Saving Generated Code Before Test Result Analysis ===\n\n")
+                        workspace.write("generated_code.py", code)
+
+                        # === Final Check: Verify unit test results ===
+                        final_ok, final_message = await self.final_check_unit_tests(workspace.output_dir)
+                finally:
+                    self._close_workspace(workspace)
+
+                if success:
+                    self.result_cache.put(code, final_ok, None if final_ok else final_message, result)
+                    if final_ok:
+                        print(colored("\n\nFinal Check Passed: Unit tests are valid.", "green"))
+                        return code, result
+                    else:
+                        print(colored(f"\n\nFinal Check Failed: {final_message}", "red"))
+                        # Summarize final check failure and update summary
+                        await self._record_failure(code, final_message, iteration)
+                        print(colored(f"===>Error feedback (final check) sent to LLM. Iteration {iteration}", "red"))
+                        continue
+                else:
+                    if self._cacheable(run):
+                        self.result_cache.put(code, False, result)
+                    await self._record_failure(code, result, iteration, run and run["crash"])
+                    print(colored(f"===>Error feedback sent to LLM. Iteration {iteration}", "red"))
+            finally:
+                self.metrics.observe("bugout_phase_seconds", time.time() - started, phase="iteration")
 
         return None, "Could not produce a working solution in time."
+
+    async def _best_of_candidates(self, iteration):
+        """
+        One best-of-N iteration. Returns (code, result) of the first passing
+        candidate, or (None, None) after feeding a failure back to the LLM.
+        """
+        print(colored(f"\n\n===>Generating {self.candidates} candidates. Iteration {iteration}", "cyan"))
+        workspaces = [
+            self._new_workspace(f"iteration-{iteration}-candidate-{index + 1}") for index in range(self.candidates)
+        ]
+        tasks = [asyncio.create_task(self._try_candidate(workspace)) for workspace in workspaces]
+        failures = []
+        try:
+            for finished in asyncio.as_completed(tasks):
+                try:
+                    candidate = await finished
+                except Exception as e:
+                    # One broken candidate must not end the session; the others still count
+                    print(colored(f"\n\nCandidate failed with an error:\n{e}", "red"))
+                    self._log("candidate_error", error=repr(e))
+                    failures.append({"code": None, "result": None, "passed": False, "error": str(e), "crash": None})
+                    continue
+                if candidate["passed"]:
+                    print(colored("\n\nFinal Check Passed: Unit tests are valid.", "green"))
+                    return candidate["code"], candidate["result"]
+                failures.append(candidate)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Archive candidates that ran to completion; drop the cancelled ones
+            for workspace, task in zip(workspaces, tasks):
+                self._close_workspace(workspace, archive=not task.cancelled())
+
+        # No candidate passed: feed back the first failure that produced code
+        with_code = [candidate for candidate in failures if candidate["code"]]
+        if with_code:
+            failure = with_code[0]
+            self.last_code = failure["code"]
+            if failure.get("preflight"):
+                self.conversation.append(self.add_message("user", failure["error"]))
+            else:
+                await self._record_failure(failure["code"], failure["error"], iteration, failure.get("crash"))
+            print(colored(f"===>Error feedback sent to LLM ({len(failures)} candidates failed). Iteration {iteration}", "red"))
+        return None, None
+
+    async def _try_candidate(self, workspace):
+        """
+        Samples one reply for the current conversation, then runs and checks
+        its code inside `workspace` (a Workspace).
+        """
+        candidate = {"code": None, "result": None, "passed": False, "error": None, "crash": None}
+        sampling = {"do_sample": True, "temperature": self.candidate_temperature}
+        reply, code = await self.call_llm(list(self.conversation), sampling=sampling, echo=False)
+        if not code:
+            candidate["error"] = "No Python code block in the reply."
+            return candidate
+        candidate["code"] = code
+        if self.last_code is not None and code.strip() == self.last_code.strip():
+            candidate["error"] = "This code is identical to the previous attempt. Please try a new approach."
+            return candidate
+        known_error = self._known_failure(code)
+        if known_error is not None:
+            candidate["error"] = known_error
+            return candidate
+        preflight_error = self._preflight_failure(code, patched=is_patch(reply))
+        if preflight_error is not None:
+            candidate["error"] = preflight_error
+            candidate["preflight"] = True
+            return candidate
+
+        success, result, run = await self._run_script(code, cwd=workspace.path, env=workspace.env())
+        candidate["result"] = result
+        if not success:
+            candidate["error"] = result
+            candidate["crash"] = run and run["crash"]
+            if self._cacheable(run):
+                self.result_cache.put(code, False, result)
+            return candidate
+
+        workspace.write("generated_code.py", code)
+        candidate["passed"], message = await self.final_check_unit_tests(workspace.output_dir)
+        if not candidate["passed"]:
+            candidate["error"] = message
+        self.result_cache.put(code, candidate["passed"], candidate["error"], result)
+        return candidate
+
+    @staticmethod
+    def _cacheable(run):
+        """
+        Whether a failed run says something about the code itself: runs
+        stopped for time or silence, or killed by a sandbox limit, depend on
+        the limits and the machine, and are not cached.
+        """
+        return run is not None and run["stopped"] not in ("timeout", "inactivity") and not run["limit"]
+
+    def _known_failure(self, code):
+        """
+        Feedback for code equivalent to an attempt that already failed (from
+        the result cache), or None if it has to be run.
+        """
+        cached = self.result_cache.get(code)
+        if cached is None or cached["passed"]:
+            return None
+        print(colored("\n\n===>Skipping execution: equivalent code already failed before.", "yellow"))
+        self._log("cache_hit", error=cached["error"])
+        return (
+            "This code is equivalent (ignoring formatting, comments and docstrings) to an earlier attempt "
+            "that already failed with:\n"
+            f"{cached['error']}\n"
+            "Do not resubmit it. Please try a fundamentally different approach."
+        )
+
+    def _preflight_failure(self, code, patched=False):
+        """
+        Feedback listing the pre-flight issues of `code`, or None if it
+        passes (or pre-flight checks are off). `patched` code came from edits
+        the LLM has never seen applied, so a complete script is asked for next.
+        """
+        if not self.preflight:
+            return None
+        self.preflight_stats["checked"] += 1
+        started = time.time()
+        issues = preflight(code)
+        self.metrics.observe("bugout_phase_seconds", time.time() - started, phase="preflight")
+        if not issues:
+            return None
+        # Each rejection saves the script run and the LLM summary of its failure
+        self.preflight_stats["rejected"] += 1
+        self.preflight_stats["runs_saved"] += 1
+        self.preflight_stats["llm_calls_saved"] += 1
+        feedback = format_issues(issues)
+        if patched:
+            self._full_script_next = True
+            feedback += "\nYour edits were applied to the last code to get this result; send a complete script, not edits."
+        print(colored(f"\n\n===>Pre-flight check failed:\n{feedback}", "red"))
+        self._log("preflight_rejected", issues=issues, totals=dict(self.preflight_stats))
+        return feedback
+
+    def _new_workspace(self, label):
+        return Workspace(label, root=self.workspace_root, tmpfs=self.workspace_tmpfs)
+
+    def _close_workspace(self, workspace, archive=True):
+        """
+        Archives (or deletes) a finished workspace; remembers where the
+        archived generated code went in self.code_out.
+        """
+        archive_dir = os.path.join(self.archive_dir, self.session_id) if (archive and self.archive_dir) else None
+        archived = workspace.close(archive_dir)
+        code_path = os.path.join(archived, "generated_code.py") if archived else None
+        if code_path and os.path.exists(code_path):
+            self.code_out = code_path
+
+    async def _record_failure(self, code, error_msg, iteration, crash=None):
+        """
+        Rebuilds the conversation around the cumulative summary and the new
+        error feedback, without waiting for this attempt's summary: every
+        `summarize_every` failures the pending attempts are summarized in a
+        background task, which runs next to the following code generation
+        (so the server can batch both) and is folded in when it completes.
+        `crash` is the run's crash report, if any.
+        """
+        self._fold_summaries()
+        self._pending_attempts.append((iteration, code, error_msg, crash))
+        if len(self._pending_attempts) >= self.summarize_every:
+            attempts, self._pending_attempts = self._pending_attempts, []
+            self._summary_tasks.append((attempts, asyncio.create_task(self._summarize_attempts(attempts))))
+        self._last_failed_code = code
+        self._full_script_next = False
+
+        debug_msg = error_prompt(error_msg) + (EDIT_MODE_PROMPT if self.edit_mode else "")
+        system_msg = self.conversation[0]  # system prompt
+        user_req = self.conversation[1]    # original user request
+        self._summary_msg = self.add_message("assistant", self._summary_text())
+        debug_msg_struct = self.add_message("user", debug_msg)
+        self.conversation = [
+            system_msg,
+            user_req,
+            self._summary_msg,
+            debug_msg_struct
+        ]
+
+    async def _summarize_attempts(self, attempts):
+        """
+        One LLM summary for a list of (iteration, code, error, crash) attempts.
+        """
+        if len(attempts) == 1:
+            iteration, code, error_msg, crash = attempts[0]
+        else:
+            iteration = f"{attempts[0][0]}-{attempts[-1][0]}"
+            code, crash = attempts[-1][1], attempts[-1][3]
+            error_msg = "\n\n".join(f"Attempt #{number}:\n{error[:1000]}" for number, _, error, _ in attempts)
+        started = time.time()
+        summary = await summarize_attempt_with_llm_async(
+            llm_url=self.client,
+            code=code,
+            error_msg=error_msg,
+            iteration=iteration,
+            token_limit=200,
+            model=self.helper_model,
+            crash=crash
+        )
+        self.metrics.observe("bugout_phase_seconds", time.time() - started, phase="summarizer")
+        return summary
+
+    def _fold_summaries(self):
+        """
+        Moves finished summaries (in attempt order) into attempts_summary and
+        refreshes the summary message of the current conversation.
+        """
+        folded = False
+        while self._summary_tasks and self._summary_tasks[0][1].done():
+            attempts, task = self._summary_tasks.pop(0)
+            if task.cancelled() or task.exception() is not None:
+                first, last = attempts[0][0], attempts[-1][0]
+                self.attempt_summaries.append(f"Attempts #{first}-{last} - Summarizer call failed.\n")
+            else:
+                self.attempt_summaries.append(task.result())
+            folded = True
+        if folded:
+            self._update_summary()
+
+    def _update_summary(self):
+        self.attempts_summary = self.attempts_digest + "".join(self.attempt_summaries)
+        if self._summary_msg is not None:
+            self._summary_msg["content"] = self._summary_text()
+
+    async def _fit_context(self, iteration):
+        """
+        Counts the tokens of the next prompt and, while it is over budget,
+        merges older attempt summaries into the digest and then drops the
+        oldest follow-up turns. Records the final count for the iteration.
+        """
+        budget = self.context_budget
+        tokens, exact = await budget.count(self.client, self.conversation, self.code_model)
+        if tokens > budget.max_prompt_tokens and len(self.attempt_summaries) > budget.keep_recent:
+            started = time.time()
+            self.attempts_digest, self.attempt_summaries = await budget.compact(
+                self.client, self.attempts_digest, self.attempt_summaries,
+                int(budget.digest_tokens * HELPER_TOKEN_HEADROOM), model=self.helper_model
+            )
+            self.metrics.observe("bugout_phase_seconds", time.time() - started, phase="digest")
+            self._update_summary()
+            tokens, exact = await budget.count(self.client, self.conversation, self.code_model)
+
+        # Replies and notes appended since the conversation was last rebuilt
+        base = 4 if self._summary_msg in self.conversation else 2
+        while tokens > budget.max_prompt_tokens and len(self.conversation) > base + 2:
+            del self.conversation[base:base + 2]
+            tokens, exact = await budget.count(self.client, self.conversation, self.code_model)
+
+        self.prompt_tokens.append({"iteration": iteration, "tokens": tokens, "exact": exact})
+        self.metrics.observe("bugout_prompt_tokens", tokens)
+        source = "server tokenizer" if exact else "estimate"
+        print(colored(f"\n===>Prompt: {tokens} tokens ({source}), budget {budget.max_prompt_tokens}", "cyan"))
+        self._log("prompt_tokens", iteration=iteration, tokens=tokens, exact=exact, budget=budget.max_prompt_tokens)
+
+    def _observe_llm(self, started, first_chunk_at, text):
+        """
+        Records the latency, time to first chunk and decode rate of a code request.
+        """
+        finished = time.time()
+        self.metrics.observe("bugout_phase_seconds", finished - started, phase="llm")
+        if first_chunk_at is None:
+            return
+        self.metrics.observe("bugout_llm_ttft_seconds", first_chunk_at - started)
+        if finished - first_chunk_at > 0.01:
+            tokens = len(text) / CHARS_PER_TOKEN
+            self.metrics.observe("bugout_llm_output_tokens_per_second", tokens / (finished - first_chunk_at))
+
+    def _observe_run(self, run):
+        if run["stopped"] in ("timeout", "inactivity"):
+            outcome = "timeout"
+        else:
+            outcome = "ok" if run["returncode"] == 0 else "error"
+        self.metrics.inc("bugout_executions_total", outcome=outcome)
+        self.metrics.observe("bugout_phase_seconds", run["seconds"], phase="execution")
+        if run["cpu_seconds"] is not None:
+            self.metrics.observe("bugout_execution_cpu_seconds", run["cpu_seconds"])
+
+    def _finish_session(self, success):
+        self.outcome = "success" if success else "failure"
+        self.metrics.inc("bugout_sessions_total", outcome=self.outcome)
+        if success:
+            self.metrics.observe("bugout_iterations_to_success", self.iterations)
+        report = self.metrics_report()
+        self._log("session_report", report=report)
+        if self.archive_dir:
+            path = os.path.join(self.archive_dir, self.session_id, "metrics.json")
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(report, f, indent=2)
+            except OSError as e:
+                print(colored(f"\n\nCould not write the metrics report: {e}", "red"))
+
+    def metrics_report(self):
+        """
+        Per-session JSON-serializable report: outcome, iterations, wall time,
+        per-phase latency summaries ({count, total, mean, p50, p95, max}) and
+        the session's other counters.
+        """
+        return {
+            "session_id": self.session_id,
+            "outcome": self.outcome,
+            "iterations": self.iterations,
+            "seconds": round(time.time() - self._started, 3) if self._started else None,
+            "metrics": self.metrics.report(),
+            "verdicts": dict(self.verdict_stats),
+            "preflight": dict(self.preflight_stats),
+            "edits": dict(self.edit_stats),
+            "result_cache": self.result_cache.stats(),
+            "context": self.context_budget.stats(),
+            "log": dict(self.events.stats),
+        }
+
+    def _summary_text(self):
+        text = f"Here is a summary of all attempts so far:\n{self.attempts_summary}"
+        waiting = [attempt for attempts, _ in self._summary_tasks for attempt in attempts] + self._pending_attempts
+        for iteration, _, error_msg, _ in waiting[:-1]:  # the last one's error follows in full
+            text += f"[ATTEMPT #{iteration}, NOT SUMMARIZED YET] Error: {' '.join(error_msg.split())[:200]}\n"
+        return text + "\nLast Code Generated with Errors: " + self._last_failed_code + "\n"
+
+
+async def run_sessions(user_requests, llm_url, log_dir="logs", **agent_kwargs):
+    """
+    Runs one AsyncBugOutAgent per user request concurrently on the current
+    event loop and returns their (code, result) pairs in order.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    agents = [
+        AsyncBugOutAgent(llm_url, os.path.join(log_dir, f"agent_log_{index}.jsonl"), **agent_kwargs)
+        for index in range(len(user_requests))
+    ]
+    try:
+        return await asyncio.gather(*(
+            agent.generate_and_refine(user_request)
+            for agent, user_request in zip(agents, user_requests)
+        ))
+    finally:
+        await close_async_clients()
+
+
+######################################################################
+# 5) BugOutAgent: synchronous wrapper around AsyncBugOutAgent
+######################################################################
+class BugOutAgent:
+    """
+    Synchronous API kept for existing callers: every method runs the matching
+    AsyncBugOutAgent coroutine to completion. Session state (conversation,
+    attempts_summary, max_iterations, ...) lives on `self.session`.
+    """
+
+    def __init__(self, llm_url, log_file, **options):
+        # Same options as AsyncBugOutAgent (code_model, helper_model, candidates, ...)
+        self.session = AsyncBugOutAgent(llm_url, log_file, **options)
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper itself
+        if name == "session":
+            raise AttributeError(name)
+        return getattr(self.session, name)
+
+    def __setattr__(self, name, value):
+        # Settings such as max_iterations belong to the session
+        if name == "session":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.session, name, value)
+
+    def call_llm(self, conversation=None, sampling=None, echo=True):
+        return _run_sync(self.session.call_llm(conversation, sampling, echo))
+
+    def run_code(self, code, timeout=90, cwd=None, env=None):
+        return _run_sync(self.session.run_code(code, timeout, cwd, env))
+
+    def final_check_unit_tests(self, output_dir="output"):
+        return _run_sync(self.session.final_check_unit_tests(output_dir))
+
+    def generate_and_refine(self, user_request):
+        return _run_sync(self.session.generate_and_refine(user_request))
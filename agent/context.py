@@ -0,0 +1,93 @@
+# Rough characters per token, used when the server cannot count for us
+CHARS_PER_TOKEN = 3.5
+
+
+######################################################################
+# 1) HELPER: Token counting with the server's tokenizer
+######################################################################
+def estimate_tokens(messages):
+    return int(sum(len(message["content"]) for message in messages) / CHARS_PER_TOKEN) + 8 * len(messages)
+
+
+######################################################################
+# 2) ContextBudget: keep prompts under a token budget
+######################################################################
+class ContextBudget:
+    """
+    Prompt budget for one session.
+
+    `count()` measures a conversation with the server's own tokenizer and
+    chat template (POST /tokenize), falling back to an estimate for servers
+    without it. When a prompt is over `max_prompt_tokens`, AsyncBugOutAgent
+    calls `compact()`, which merges all but the `keep_recent` newest attempt
+    summaries into a rolling digest of about `digest_tokens` tokens, so the
+    summary history stops growing with the iteration count.
+    """
+
+    def __init__(self, max_prompt_tokens=8192, keep_recent=3, digest_tokens=300):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.keep_recent = keep_recent
+        self.digest_tokens = digest_tokens
+        self.server_counts = True  # until the server shows it has no /tokenize
+        self.compactions = 0
+
+    async def count(self, client, messages, model=None):
+        """
+        Returns (tokens, exact): exact is False for estimates.
+        """
+        if self.server_counts:
+            tokens = await client.count_tokens(messages, model=model)
+            if tokens is not None:
+                return tokens, True
+            # Only a missing endpoint is permanent; timeouts and other errors
+            # fall back to an estimate for this call alone
+            self.server_counts = client.counts_tokens
+        return estimate_tokens(messages), False
+
+    async def compact(self, client, digest, summaries, max_new_tokens, model=None):
+        """
+        Folds the older attempt summaries into `digest`; returns the new
+        (digest, summaries). The LLM writes the digest; if that fails, the
+        old summaries are kept in shortened form instead.
+        """
+        split = max(0, len(summaries) - self.keep_recent)
+        older, recent = summaries[:split], summaries[split:]
+        if not older:
+            return digest, summaries
+        self.compactions += 1
+        history = (f"--- EARLIER DIGEST ---\n{digest}\n\n" if digest else "") + \
+            "--- ATTEMPT SUMMARIES ---\n" + "\n".join(older)
+        data = {
+            "messages": [
+                {
+                    "role": "system",
+                    "content": (
+                        "You condense the history of failed coding attempts into one digest. "
+                        "Keep every distinct approach that was tried, why it failed, and what must not be repeated. "
+                        "Drop repetition."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": f"{history}\n\nWrite the digest in under ~{self.digest_tokens} tokens."
+                }
+            ],
+            "max_new_tokens": max_new_tokens
+        }
+        if model:
+            data["model"] = model
+        try:
+            text = (await client.generate(data)).strip()
+        except Exception:
+            text = ""
+        if not text:
+            # Keep the gist of each summary rather than nothing
+            text = "\n".join(" ".join(summary.split())[:200] for summary in ([digest] if digest else []) + older)
+        return f"[DIGEST OF EARLIER ATTEMPTS]\n{text}\n", recent
+
+    def stats(self):
+        return {
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "server_counts": self.server_counts,
+            "compactions": self.compactions,
+        }
@@ -0,0 +1,169 @@
+"""
+Structured report of the exception that ended a generated script: its type,
+message and the frames inside the script itself, with truncated locals.
+
+Runs inside the script's process, so it only uses the standard library:
+pool workers (agent/pool_worker.py) call write_report directly and cold
+runs load it through agent/site_hooks/sitecustomize.py.
+"""
+import json
+import linecache
+import os
+import reprlib
+import sys
+import types
+
+# Where the report goes, and which script it is for (child processes it starts inherit both)
+REPORT_ENV = "BUGOUT_CRASH_REPORT"
+SCRIPT_ENV = "BUGOUT_CRASH_SCRIPT"
+SITE_HOOKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "site_hooks")
+
+MAX_FRAMES = 5
+MAX_LOCALS = 12
+MAX_VALUE_CHARS = 120
+
+_repr = reprlib.Repr()
+_repr.maxstring = 80
+_repr.maxother = 80
+_repr.maxlist = _repr.maxtuple = _repr.maxset = _repr.maxdict = 6
+
+
+######################################################################
+# 1) Inside the script process: build and write the report
+######################################################################
+def _safe_repr(value):
+    try:
+        text = _repr.repr(value)
+    except Exception as e:
+        text = f"<repr failed: {e.__class__.__name__}>"
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 3] + "..."
+
+
+def _frame_locals(frame):
+    values = {}
+    for name, value in frame.f_locals.items():
+        if name.startswith("__") or isinstance(value, (types.ModuleType, types.FunctionType, type)):
+            continue
+        if len(values) == MAX_LOCALS:
+            break
+        values[name] = _safe_repr(value)
+    return values
+
+
+def build_report(exc, script, with_cause=True):
+    """
+    {"type", "message", "frames": [{"line", "function", "code", "locals"}],
+    "cause"} for `exc`, keeping only frames in `script` (innermost last).
+    "cause" is the same report (without its own cause) for the exception
+    it was raised from or while handling, or None.
+    """
+    frames = []
+    tb = exc.__traceback__
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        if os.path.abspath(code.co_filename) == script:
+            frames.append({
+                "line": tb.tb_lineno,
+                "function": code.co_name,
+                "code": linecache.getline(code.co_filename, tb.tb_lineno).strip(),
+                "locals": _frame_locals(tb.tb_frame),
+            })
+        tb = tb.tb_next
+
+    cause = exc.__cause__ or (None if exc.__suppress_context__ else exc.__context__)
+    return {
+        "type": type(exc).__name__,
+        "message": str(exc)[:1000],
+        "frames": frames[-MAX_FRAMES:],
+        "cause": build_report(cause, script, with_cause=False) if cause is not None and with_cause else None,
+    }
+
+
+def write_report(exc, script, path):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(build_report(exc, script), f)
+    except Exception:
+        pass  # the regular traceback on stderr still describes the error
+
+
+def install():
+    """
+    Chains a sys.excepthook that writes the report for uncaught exceptions
+    of the script named in the environment (not of other Python processes
+    it starts).
+    """
+    path, script = os.environ.get(REPORT_ENV), os.environ.get(SCRIPT_ENV)
+    if not path or not script:
+        return
+    previous = sys.excepthook
+
+    def hook(exc_type, exc, tb):
+        if sys.argv and os.path.abspath(sys.argv[0]) == script:
+            write_report(exc, script, path)
+        previous(exc_type, exc, tb)
+
+    sys.excepthook = hook
+
+
+######################################################################
+# 2) In the agent: set up a run and turn its report into feedback
+######################################################################
+def report_env(script, path):
+    """
+    Environment variables that make a run of `script` write its report to
+    `path`; PYTHONPATH is only needed for cold `python script.py` runs.
+    """
+    python_path = os.environ.get("PYTHONPATH")
+    return {
+        REPORT_ENV: path,
+        SCRIPT_ENV: os.path.abspath(script),
+        "PYTHONPATH": SITE_HOOKS_DIR + (os.pathsep + python_path if python_path else ""),
+    }
+
+
+def read_report(path):
+    """
+    The report written by a run (removing the file), or None.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def report_lines(report):
+    """
+    Line numbers of the script's frames in `report` (the exception it was
+    raised from first), without repeats.
+    """
+    reports = [report["cause"], report] if report.get("cause") else [report]
+    return list(dict.fromkeys(frame["line"] for part in reports for frame in part["frames"]))
+
+
+def format_report(report):
+    """
+    Compact error description for the LLM: the exception (and the one it
+    was raised from) with the script's own frames and their local variables.
+    """
+    lines = []
+    if report.get("cause"):
+        lines += _format_exception(report["cause"]) + ["", "which caused:"]
+    return "\n".join(lines + _format_exception(report))
+
+
+def _format_exception(report):
+    lines = [f"{report['type']}: {report['message']}"]
+    if not report["frames"]:
+        lines.append("Raised outside the generated script (no frames in it).")
+        return lines
+    lines.append("Frames in the generated script (innermost last):")
+    for frame in report["frames"]:
+        lines.append(f"  line {frame['line']}, in {frame['function']}: {frame['code']}")
+        if frame["locals"]:
+            lines.append("    locals: " + ", ".join(f"{name}={value}" for name, value in frame["locals"].items()))
+    return lines
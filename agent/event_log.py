@@ -0,0 +1,260 @@
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import weakref
+
+# Marks a string that was moved to a "blob" record: {"$blob": "<id>"}
+BLOB_KEY = "$blob"
+# The writer thread exits after this many idle seconds (and restarts on the next record)
+IDLE_SECONDS = 5.0
+_STOP = object()
+
+
+######################################################################
+# 1) HELPER: Replace long strings with content-addressed references
+######################################################################
+def _blob_id(text):
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()[:16]
+
+
+def _extract_blobs(value, blobs, min_chars):
+    """
+    Copy of `value` (JSON-like) with every string of at least `min_chars`
+    characters replaced by {"$blob": id}; the strings are added to `blobs`.
+    The copy also makes the record safe to serialize on another thread.
+    """
+    if isinstance(value, str):
+        if len(value) < min_chars:
+            return value
+        blob = _blob_id(value)
+        blobs[blob] = value
+        return {BLOB_KEY: blob}
+    if isinstance(value, dict):
+        return {key: _extract_blobs(item, blobs, min_chars) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_extract_blobs(item, blobs, min_chars) for item in value]
+    return value
+
+
+def _resolve_blobs(value, blobs):
+    if isinstance(value, dict):
+        if len(value) == 1 and BLOB_KEY in value:
+            return blobs.get(value[BLOB_KEY], value)
+        return {key: _resolve_blobs(item, blobs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve_blobs(item, blobs) for item in value]
+    return value
+
+
+######################################################################
+# 2) EventLog: buffered JSONL writer with rotation
+######################################################################
+class EventLog:
+    """
+    Session log with one compact JSON record per line:
+    {"ts", "event", ...fields}.
+
+    - `log()` only queues the record. A background thread writes queued
+      records in batches, so logging never waits on the disk.
+    - Strings of at least `blob_min_chars` characters are written once per
+      file as {"event": "blob", "id", "text"} records and referenced as
+      {"$blob": id} afterwards. The system prompt, the user request and
+      unchanged conversation turns are therefore not rewritten on every
+      LLM call.
+    - When the file reaches `max_bytes` it is rotated to path.1 ... path.N
+      (`backups` files are kept). Every file carries the blobs it references.
+    - The writer thread stops when the log has been idle for a few seconds,
+      so logs of finished sessions hold no thread or open file.
+
+    Use `read_events(path)` to load a log with its references resolved.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=3, blob_min_chars=256):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.blob_min_chars = blob_min_chars
+        self.stats = {"events": 0, "blobs_written": 0, "blobs_reused": 0, "bytes": 0, "rotations": 0}
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._written = set()  # blob ids already in the current file
+        self._size = 0  # bytes in the current file
+        _LOGS.add(self)
+
+    def log(self, event, **fields):
+        """
+        Queues one record. Fields must be JSON-serializable (anything else
+        is written with str()).
+        """
+        blobs = {}
+        record = {"ts": round(time.time(), 3), "event": event, **_extract_blobs(fields, blobs, self.blob_min_chars)}
+        with self._lock:
+            if self._closed:
+                return
+            self._queue.put((record, blobs))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="bugout-event-log", daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """
+        Waits until every queued record has been written.
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Writes the remaining records and stops the writer thread.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+    def _write_loop(self):
+        f = None  # opened on the first write
+        try:
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=IDLE_SECONDS)]
+                except queue.Empty:
+                    with self._lock:
+                        if self._queue.empty():
+                            self._thread = None
+                            return
+                    continue
+                # Drain whatever else is queued into the same write
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    f = self._write_batch(f, batch)
+                except (OSError, ValueError):
+                    # A full or unwritable disk must not stop the agent; reopen
+                    # the file next time and write the lost records' blobs again
+                    if f is not None:
+                        f.close()
+                    f = None
+                    self._written = set()
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if _STOP in batch:
+                    return
+        finally:
+            if f is not None:
+                f.close()
+
+    def _write_batch(self, f, batch):
+        if f is None and any(item is not _STOP for item in batch):
+            f = self._open()
+        chunk, pending = [], 0
+        for item in batch:
+            if item is _STOP:
+                continue
+            record, blobs = item
+            lines = []
+            for blob, text in blobs.items():
+                if blob in self._written:
+                    self.stats["blobs_reused"] += 1
+                    continue
+                self._written.add(blob)
+                self.stats["blobs_written"] += 1
+                lines.append(self._dumps({"event": "blob", "id": blob, "text": text}))
+            lines.append(self._dumps(record))
+            self.stats["events"] += 1
+            chunk += lines
+            pending += sum(len(line) for line in lines)
+            if self._size + pending >= self.max_bytes:
+                # Rotate between records, so each file holds the blobs it references
+                self._write(f, chunk)
+                f.close()
+                self._rotate()
+                f = self._open()
+                chunk, pending = [], 0
+        if chunk:
+            self._write(f, chunk)
+        return f
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        f = open(self.path, "ab")
+        self._size = f.seek(0, os.SEEK_END)
+        if not self._size:
+            self._written = set()  # a new (or emptied) file has no blobs yet
+        return f
+
+    def _write(self, f, lines):
+        data = b"".join(lines)
+        f.write(data)
+        f.flush()
+        self._size += len(data)
+        self.stats["bytes"] += len(data)
+
+    @staticmethod
+    def _dumps(record):
+        return (json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+    def _rotate(self):
+        self.stats["rotations"] += 1
+        self._written = set()
+        if self.backups < 1:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+_LOGS = weakref.WeakSet()
+
+
+@atexit.register
+def _close_logs():
+    # Write what is still queued before the interpreter exits
+    for event_log in list(_LOGS):
+        event_log.close()
+
+
+######################################################################
+# 3) read_events: load a log back
+######################################################################
+def read_events(path):
+    """
+    Records of one log file, oldest first, with {"$blob": id} references
+    replaced by their text and the blob records themselves left out.
+    """
+    blobs = {}
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if record.get("event") == "blob":
+                blobs[record["id"]] = record["text"]
+            else:
+                events.append(_resolve_blobs(record, blobs))
+    return events
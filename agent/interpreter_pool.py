@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import signal
+import sys
+
+from agent.output_capture import OutputCapture, watch_output, DRAIN_SECONDS
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pool_worker.py")
+
+# Modules generated scripts almost always import
+DEFAULT_PRELOAD = (
+    "os", "sys", "re", "json", "time", "datetime", "collections", "subprocess",
+    "tempfile", "logging", "argparse", "unittest", "unittest.mock"
+)
+
+
+class _Worker:
+    def __init__(self, proc):
+        self.proc = proc
+
+    async def send(self, message):
+        self.proc.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+        await self.proc.stdin.drain()
+
+    async def receive(self):
+        line = await self.proc.stdout.readline()
+        if not line:
+            raise RuntimeError("Interpreter pool worker exited unexpectedly.")
+        return json.loads(line)
+
+    def kill(self):
+        if self.proc.returncode is None:
+            self.proc.kill()
+
+
+######################################################################
+# InterpreterPool: warm interpreters that fork a fresh child per script
+######################################################################
+class InterpreterPool:
+    """
+    Pool of pre-started interpreters (agent/pool_worker.py) that have already
+    imported `preload`. Each run forks a fresh child of a warm worker, so every
+    script still gets its own process, as with a cold `python script.py`, but
+    skips interpreter start-up and the preloaded imports.
+
+    POSIX only (needs os.fork). Workers start on first use or with `start()`;
+    a worker whose job goes wrong is discarded and replaced. Output is relayed
+    as it is produced, so timeouts, the inactivity timeout and the kill
+    pattern of agent/output_capture.py apply as for a cold subprocess.
+    """
+
+    def __init__(self, size=4, preload=DEFAULT_PRELOAD):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("InterpreterPool needs os.fork (POSIX only).")
+        self.size = size
+        self.preload = list(preload)
+        self._idle = None
+        self._spawned = 0
+
+        self.runs = 0
+        self.replaced_workers = 0
+
+    async def start(self):
+        """
+        Starts all workers now instead of on first use.
+        """
+        self._ensure_queue()
+        while self._spawned < self.size:
+            self._spawned += 1
+            self._idle.put_nowait(await self._spawn())
+        return self
+
+    async def run(self, script_path, timeout, cwd=None, env=None, capture=None, inactivity_timeout=None,
+                  kill_grace=1.0, sandbox=None):
+        """
+        Runs a script in a fresh forked child, streaming its output into
+        `capture` (an OutputCapture). Returns a dict with stdout, stderr,
+        returncode, seconds, stopped (see watch_output), peak_rss_mb,
+        cpu_seconds and limit; the child is also killed if the caller is
+        cancelled. `env` adds environment variables; with a `sandbox`, the
+        child runs under its limits.
+        """
+        capture = capture if capture is not None else OutputCapture()
+        job = {"script": script_path, "cwd": cwd, "env": env or {}}
+        cgroup = None
+        if sandbox is not None:
+            cgroup = sandbox.create_cgroup()
+            job.update(limits=sandbox.limits(), cgroup=cgroup)
+        worker = await self._acquire()
+        healthy = False
+        try:
+            await worker.send(job)
+            pid = (await worker.receive())["pid"]
+            queue = asyncio.Queue()
+            final = {"returncode": -signal.SIGKILL, "seconds": 0.0, "peak_rss_mb": None, "cpu_seconds": None}
+            relay = asyncio.create_task(self._relay(worker, queue, final))
+            try:
+                stopped = await watch_output(
+                    queue, lambda: _kill_group(pid), capture, timeout, inactivity_timeout, kill_grace
+                )
+            except asyncio.CancelledError:
+                _kill_group(pid)
+                # Let the worker finish reporting the killed child so it can be reused
+                healthy = await _finished(relay)
+                raise
+            healthy = await _finished(relay)
+        finally:
+            cgroup_stats = sandbox.collect_cgroup(cgroup) if cgroup else {}
+            if healthy:
+                self._idle.put_nowait(worker)
+            else:
+                # The job state of this worker is unknown; replace it
+                worker.kill()
+                self._spawned -= 1
+                self.replaced_workers += 1
+        self.runs += 1
+
+        result = {
+            "stdout": capture.text("stdout"),
+            "stderr": capture.text("stderr"),
+            "returncode": final["returncode"],
+            "seconds": final["seconds"],
+            "stopped": stopped,
+            "peak_rss_mb": final["peak_rss_mb"],
+            "cpu_seconds": final["cpu_seconds"],
+            "limit": None,
+        }
+        return sandbox.finish_result(result, cgroup_stats) if sandbox is not None else result
+
+    async def close(self):
+        while self._idle is not None and not self._idle.empty():
+            worker = self._idle.get_nowait()
+            worker.kill()
+            await worker.proc.wait()
+            self._spawned -= 1
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "workers": self._spawned,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "runs": self.runs,
+            "replaced_workers": self.replaced_workers,
+        }
+
+    def _ensure_queue(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+
+    async def _acquire(self):
+        self._ensure_queue()
+        if self._idle.empty() and self._spawned < self.size:
+            self._spawned += 1
+            try:
+                return await self._spawn()
+            except Exception:
+                self._spawned -= 1
+                raise
+        return await self._idle.get()
+
+    async def _relay(self, worker, queue, final):
+        """
+        Moves a job's output messages from the worker into `queue` until the
+        worker reports the child's exit.
+        """
+        try:
+            while True:
+                message = await worker.receive()
+                if "stream" in message:
+                    queue.put_nowait((message["stream"], message["data"].encode("latin-1")))
+                else:
+                    final.update(message)
+                    return
+        finally:
+            queue.put_nowait(None)
+
+    async def _spawn(self):
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT, *self.preload,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE
+        )
+        worker = _Worker(proc)
+        await worker.receive()  # {"ready": true} once the imports are loaded
+        return worker
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def _finished(relay):
+    """
+    Waits briefly for a job's relay to end; False if the worker never reported.
+    """
+    try:
+        await asyncio.wait_for(relay, DRAIN_SECONDS)
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,27 @@
+"""
+Applies sandbox limits inside a freshly started script process. Kept free of
+heavy imports because pool workers (agent/pool_worker.py) import it too.
+"""
+import os
+import resource
+
+
+def apply_limits(limits, cgroup=None):
+    """
+    Sets each {"RLIMIT_*": value} limit (soft and hard) on the current process
+    and moves it into the `cgroup` directory, if given.
+    """
+    for name, value in limits.items():
+        kind = getattr(resource, name)
+        _, hard = resource.getrlimit(kind)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        # The CPU soft limit sends SIGXCPU; keep the SIGKILL hard limit a second later
+        # so the run is reported as hitting its CPU limit
+        new_hard = value + 1 if kind == resource.RLIMIT_CPU else value
+        if hard != resource.RLIM_INFINITY:
+            new_hard = min(new_hard, hard)
+        resource.setrlimit(kind, (value, new_hard))
+    if cgroup:
+        with open(os.path.join(cgroup, "cgroup.procs"), "w") as f:
+            f.write(str(os.getpid()))
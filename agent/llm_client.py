@@ -0,0 +1,259 @@
+import asyncio
+import codecs
+import itertools
+import json
+import threading
+import weakref
+
+import aiohttp
+
+# Statuses worth retrying on another attempt/backend (503 = model still loading)
+RETRY_STATUSES = {502, 503, 504}
+
+# /tokenize calls in flight per backend; they have their own slots (and
+# connections), so prompt counting never queues behind long generations
+TOKENIZE_CONCURRENCY = 2
+
+
+def _encode_payload(payload):
+    # Serialize once; retries resend the same bytes
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _endpoint(url, name):
+    # "http://host:5000/generate" -> "http://host:5000/<name>"
+    url = url.rstrip("/")
+    base = url.rsplit("/", 1)[0] if url.endswith("/generate") else url
+    return f"{base}/{name}"
+
+
+######################################################################
+# 1) AsyncLLMClient: pooled, keep-alive access to one or more /generate backends
+######################################################################
+class AsyncLLMClient:
+    """
+    Shared asyncio HTTP client (aiohttp) for all agent-to-LLM traffic.
+
+    - Keep-alive connections are reused instead of opening a new TCP
+      connection per call.
+    - Connect and read timeouts (the read timeout is the longest silence
+      allowed between streamed chunks, not the total generation time).
+    - Retries with exponential backoff on connection errors and 502/503/504,
+      moving to the next backend on each retry. Nothing is retried once the
+      response body has started streaming.
+    - Routing across several URLs: "round_robin" or "least_loaded" (fewest
+      requests in flight from this process).
+
+    `max_concurrency` caps the requests in flight to each backend; further
+    requests wait for a slot, so dozens of agent sessions on one event loop
+    do not overrun a server's batch capacity. /tokenize calls have their own
+    TOKENIZE_CONCURRENCY slots.
+
+    aiohttp sessions belong to an event loop, so one session (and one set of
+    per-backend limiters) is kept per loop.
+    """
+
+    def __init__(self, urls, connect_timeout=5.0, read_timeout=300.0, max_retries=3,
+                 backoff=0.5, routing="round_robin", max_concurrency=8):
+        self.urls = [urls] if isinstance(urls, str) else list(urls)
+        if not self.urls:
+            raise ValueError("LLM client needs at least one backend URL.")
+        if routing not in ("round_robin", "least_loaded"):
+            raise ValueError(f"Unknown routing strategy: {routing}")
+
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.routing = routing
+        self.max_concurrency = max_concurrency
+
+        self._lock = threading.Lock()
+        self._round_robin = itertools.cycle(range(len(self.urls)))
+        self._in_flight = {url: 0 for url in self.urls}
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        self._loops = {}  # event loop -> (ClientSession, {url: Semaphore}, {url: Semaphore} for /tokenize)
+        self._without_tokenize = set()  # backends that answered /tokenize with 404/405
+        _ASYNC_CLIENTS.add(self)
+
+    def settings(self):
+        return dict(
+            urls=list(self.urls),
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            max_retries=self.max_retries,
+            backoff=self.backoff,
+            routing=self.routing,
+            max_concurrency=self.max_concurrency
+        )
+
+    def stats(self):
+        with self._lock:
+            return {"routing": self.routing, "in_flight": dict(self._in_flight)}
+
+    def _retry_delay(self, attempt):
+        return self.backoff * (2 ** (attempt - 1))
+
+    def _pick(self, exclude=()):
+        """
+        Chooses a backend (skipping ones already tried this call) and counts it as in flight.
+        """
+        with self._lock:
+            candidates = [url for url in self.urls if url not in exclude] or self.urls
+            if self.routing == "least_loaded":
+                url = min(candidates, key=lambda url: self._in_flight[url])
+            else:
+                url = candidates[0]
+                for _ in range(len(self.urls)):
+                    next_url = self.urls[next(self._round_robin)]
+                    if next_url in candidates:
+                        url = next_url
+                        break
+            self._in_flight[url] += 1
+            return url
+
+    def _done(self, url):
+        with self._lock:
+            self._in_flight[url] -= 1
+
+    def _next_excluded(self, tried, url):
+        tried.add(url)
+        if len(tried) == len(self.urls):
+            tried.clear()
+
+    async def generate(self, payload):
+        """
+        Sends a /generate request and returns the full response text.
+        """
+        return "".join([text async for text in self.stream_text(payload)])
+
+    async def stream_text(self, payload):
+        """
+        Sends a /generate request and yields decoded text chunks as they arrive.
+        """
+        session, limiters, _ = self._loop_state()
+        body = _encode_payload(payload)
+        last_error = None
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._retry_delay(attempt))
+            url = self._pick(exclude=tried)
+            try:
+                async with limiters[url]:
+                    try:
+                        response = await session.post(url, data=body)
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                        last_error = e
+                        continue
+                    async with response:
+                        if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                            last_error = aiohttp.ClientResponseError(
+                                response.request_info, response.history,
+                                status=response.status, message=f"{response.status} from {url}"
+                            )
+                            continue
+                        response.raise_for_status()
+
+                        # Streaming has started: from here on, errors are not retried
+                        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                        async for chunk in response.content.iter_any():
+                            text = decoder.decode(chunk)
+                            if text:
+                                yield text
+                        tail = decoder.decode(b"", final=True)
+                        if tail:
+                            yield tail
+                        return
+            finally:
+                self._done(url)
+                self._next_excluded(tried, url)
+        raise last_error
+
+    @property
+    def counts_tokens(self):
+        """
+        False once every backend has shown it has no /tokenize endpoint.
+        """
+        return len(self._without_tokenize) < len(self.urls)
+
+    async def count_tokens(self, messages, model=None):
+        """
+        Prompt length of `messages` in the server's own tokens (chat template
+        included), from its /tokenize endpoint; None if that call failed or
+        no backend has the endpoint (see `counts_tokens`).
+        """
+        if not self.counts_tokens:
+            return None
+        session, _, tokenize_limiters = self._loop_state()
+        payload = {"messages": messages}
+        if model:
+            payload["model"] = model
+        url = self._pick(exclude=self._without_tokenize)
+        try:
+            async with tokenize_limiters[url]:
+                async with session.post(_endpoint(url, "tokenize"), data=_encode_payload(payload)) as response:
+                    if response.status in (404, 405):
+                        self._without_tokenize.add(url)
+                    if response.status != 200:
+                        return None
+                    return int((await response.json(content_type=None))["tokens"])
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, TypeError, ValueError):
+            return None
+        finally:
+            self._done(url)
+
+    async def close(self):
+        """
+        Closes the aiohttp session of the running event loop.
+        """
+        state = self._loops.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state[0].close()
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        # Forget sessions of loops that have since been closed
+        for old_loop in [old for old in self._loops if old.is_closed()]:
+            del self._loops[old_loop]
+        if loop not in self._loops:
+            session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                headers={"Content-Type": "application/json"},
+                connector=aiohttp.TCPConnector(limit=0, limit_per_host=self.max_concurrency + TOKENIZE_CONCURRENCY)
+            )
+            limiters = {url: asyncio.Semaphore(self.max_concurrency) for url in self.urls}
+            tokenize_limiters = {url: asyncio.Semaphore(TOKENIZE_CONCURRENCY) for url in self.urls}
+            self._loops[loop] = (session, limiters, tokenize_limiters)
+        return self._loops[loop]
+
+
+######################################################################
+# 2) Shared clients
+######################################################################
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+_ASYNC_CLIENTS = weakref.WeakSet()
+
+
+def get_async_client(llm_url):
+    """
+    Returns the shared AsyncLLMClient for a URL (or list of URLs); an
+    AsyncLLMClient passed in is returned as-is.
+    """
+    if isinstance(llm_url, AsyncLLMClient):
+        return llm_url
+    urls = (llm_url,) if isinstance(llm_url, str) else tuple(llm_url)
+    with _CLIENTS_LOCK:
+        if urls not in _CLIENTS:
+            _CLIENTS[urls] = AsyncLLMClient(list(urls))
+        return _CLIENTS[urls]
+
+
+async def close_async_clients():
+    """
+    Closes every AsyncLLMClient session bound to the running event loop.
+    """
+    for client in list(_ASYNC_CLIENTS):
+        await client.close()
+
@@ -0,0 +1,214 @@
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SECONDS_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+ITERATION_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 30, 50)
+
+# Metrics recorded by AsyncBugOutAgent: name -> (type, help, buckets)
+AGENT_METRICS = {
+    "bugout_phase_seconds": (
+        "histogram", "Latency of agent phases (llm, execution, preflight, summarizer, digest, analyzer, iteration).",
+        SECONDS_BUCKETS
+    ),
+    "bugout_llm_ttft_seconds": ("histogram", "Time to the first streamed chunk of code requests.", SECONDS_BUCKETS),
+    "bugout_llm_output_tokens_per_second": (
+        "histogram", "Decode rate of code replies after the first chunk (tokens estimated from characters).",
+        RATE_BUCKETS
+    ),
+    "bugout_prompt_tokens": ("histogram", "Prompt size of each iteration's code request.", TOKEN_BUCKETS),
+    "bugout_execution_cpu_seconds": (
+        "histogram", "CPU time of script runs (sandboxed and pooled runs only).", SECONDS_BUCKETS
+    ),
+    "bugout_executions_total": ("counter", "Script runs by outcome (ok, error, timeout).", None),
+    "bugout_iterations_to_success": ("histogram", "Iterations sessions needed to pass.", ITERATION_BUCKETS),
+    "bugout_sessions_total": ("counter", "Finished sessions by outcome (success, failure).", None),
+}
+
+
+######################################################################
+# 1) HELPER: Prometheus text format
+######################################################################
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(pairs):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _summary(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def quantile(q):
+        # Nearest rank: the smallest value with at least q of the samples at or below it
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    return {
+        "count": len(ordered),
+        "total": round(sum(ordered), 6),
+        "mean": round(sum(ordered) / len(ordered), 6),
+        "p50": round(quantile(0.5), 6),
+        "p95": round(quantile(0.95), 6),
+        "max": round(ordered[-1], 6),
+    }
+
+
+######################################################################
+# 2) MetricsRegistry: process-wide counters, gauges and histograms
+######################################################################
+class MetricsRegistry:
+    """
+    In-process metrics shared by every session of the process (like a
+    Prometheus client registry, without the dependency).
+
+    Metrics are declared with `declare()` (declaring one again is a no-op)
+    and recorded per label set with `inc()`, `set()` and `observe()`.
+    `prometheus_text()` renders them in the Prometheus text exposition
+    format; `serve()` exposes that on http://host:port/metrics.
+    """
+
+    def __init__(self):
+        self._metrics = {}  # name -> {"type", "help", "buckets", "values": {labels: value}}
+        self._lock = threading.Lock()
+
+    def declare(self, name, kind, help_text, buckets=None):
+        if kind not in ("counter", "gauge", "histogram"):
+            raise ValueError(f"Unknown metric type: {kind}")
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = {
+                    "type": kind,
+                    "help": help_text,
+                    "buckets": tuple(buckets or SECONDS_BUCKETS) if kind == "histogram" else None,
+                    "values": {},
+                }
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            values = self._metrics[name]["values"]
+            key = tuple(sorted(labels.items()))
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._metrics[name]["values"][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            metric = self._metrics[name]
+            key = tuple(sorted(labels.items()))
+            state = metric["values"].get(key)
+            if state is None:
+                state = metric["values"][key] = {"buckets": [0] * len(metric["buckets"]), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(metric["buckets"], value)
+            if index < len(metric["buckets"]):
+                state["buckets"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            for name, metric in self._metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for key, value in metric["values"].items():
+                    if metric["type"] != "histogram":
+                        lines.append(f"{name}{_labels(key)} {_number(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(metric["buckets"], value["buckets"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(key + (('le', _number(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{_labels(key)} {_number(value['sum'])}")
+                    lines.append(f"{name}_count{_labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9100, host="127.0.0.1"):
+        """
+        Serves prometheus_text() on /metrics from a daemon thread; returns the
+        HTTP server (call shutdown() to stop it).
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="bugout-metrics", daemon=True).start()
+        return server
+
+
+# Registry used by sessions that are not given their own
+REGISTRY = MetricsRegistry()
+
+
+######################################################################
+# 3) SessionMetrics: one session's measurements
+######################################################################
+class SessionMetrics:
+    """
+    Records the measurements of one agent session into a MetricsRegistry
+    (AGENT_METRICS) and keeps them per session for `report()`.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else REGISTRY
+        for name, (kind, help_text, buckets) in AGENT_METRICS.items():
+            self.registry.declare(name, kind, help_text, buckets)
+        self._observations = {}  # (name, labels) -> [values]
+        self._counts = {}        # (name, labels) -> total
+
+    def observe(self, name, value, **labels):
+        self.registry.observe(name, value, **labels)
+        self._observations.setdefault((name, tuple(sorted(labels.items()))), []).append(value)
+
+    def inc(self, name, value=1, **labels):
+        self.registry.inc(name, value, **labels)
+        key = (name, tuple(sorted(labels.items())))
+        self._counts[key] = self._counts.get(key, 0) + value
+
+    def values(self, name, **labels):
+        """
+        This session's observations of a histogram, in recording order.
+        """
+        return list(self._observations.get((name, tuple(sorted(labels.items()))), []))
+
+    def report(self):
+        """
+        {metric: summary} for this session, where a summary is {count, total,
+        mean, p50, p95, max} (histograms) or a total (counters); labelled
+        metrics are nested by label value, e.g. report["phase_seconds"]["llm"].
+        """
+        report = {}
+        for source, summarize in ((self._observations, _summary), (self._counts, lambda total: total)):
+            for (name, labels), value in sorted(source.items()):
+                short = name[len("bugout_"):] if name.startswith("bugout_") else name
+                if labels:
+                    report.setdefault(short, {})["/".join(str(label) for _, label in labels)] = summarize(value)
+                else:
+                    report[short] = summarize(value)
+        return report
@@ -0,0 +1,148 @@
+import asyncio
+import re
+import time
+
+# Header of a Python traceback; pass as kill_pattern to stop scripts at their first error
+TRACEBACK_PATTERN = r"Traceback \(most recent call last\)"
+
+# How long to wait for output to close after a kill before giving up on it
+DRAIN_SECONDS = 2.0
+
+
+######################################################################
+# 1) HELPER: Head + tail of one output stream under a byte cap
+######################################################################
+class _HeadTail:
+    def __init__(self, max_bytes):
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    @property
+    def omitted(self):
+        return self.total - len(self.head) - len(self.tail)
+
+    def add(self, data):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    def text(self):
+        if not self.omitted:
+            return bytes(self.head + self.tail).decode("utf-8", errors="replace")
+        return (
+            bytes(self.head).decode("utf-8", errors="replace")
+            + f"\n\n... [{self.omitted} bytes of output omitted] ...\n\n"
+            + bytes(self.tail).decode("utf-8", errors="replace")
+        )
+
+
+######################################################################
+# 2) OutputCapture: bounded stdout/stderr with an optional kill pattern
+######################################################################
+class OutputCapture:
+    """
+    Keeps the first and last `max_bytes / 2` bytes of each stream, so a
+    script printing in a loop cannot grow agent memory or the log file.
+
+    `kill_pattern` (a regex, e.g. TRACEBACK_PATTERN) marks the run for early
+    termination the first time it appears on either stream.
+    """
+
+    def __init__(self, max_bytes=64 * 1024, kill_pattern=None):
+        self.streams = {"stdout": _HeadTail(max_bytes), "stderr": _HeadTail(max_bytes)}
+        self.kill_pattern = re.compile(kill_pattern.encode("utf-8")) if kill_pattern else None
+        self.matched = False
+        self.last_output = time.monotonic()
+        self._carry = {"stdout": b"", "stderr": b""}
+
+    def feed(self, stream, data):
+        """
+        Records a chunk; returns True once the kill pattern has been seen.
+        """
+        self.last_output = time.monotonic()
+        self.streams[stream].add(data)
+        if self.kill_pattern is not None and not self.matched:
+            # Keep a little of the previous chunk so matches across chunk borders are found
+            window = self._carry[stream] + data
+            self.matched = self.kill_pattern.search(window) is not None
+            self._carry[stream] = window[-256:]
+        return self.matched
+
+    def text(self, stream):
+        return self.streams[stream].text()
+
+    def stats(self):
+        return {
+            name: {"bytes": stream.total, "omitted": stream.omitted}
+            for name, stream in self.streams.items()
+        }
+
+
+######################################################################
+# 3) HELPER: Feed a running process into a capture until it ends or is stopped
+######################################################################
+async def pump_streams(readers, queue):
+    """
+    Copies chunks from {"stdout": StreamReader, "stderr": StreamReader} into
+    `queue` as (stream, bytes) pairs, then puts None.
+    """
+    async def pump(name, reader):
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            queue.put_nowait((name, data))
+
+    try:
+        await asyncio.gather(*(pump(name, reader) for name, reader in readers.items()))
+    finally:
+        queue.put_nowait(None)
+
+
+async def watch_output(queue, kill, capture, timeout, inactivity_timeout=None, kill_grace=1.0):
+    """
+    Consumes (stream, bytes) chunks from `queue` (None = output closed) into
+    `capture` and calls `kill()` when the run must stop:
+      - "timeout": `timeout` seconds have passed,
+      - "inactivity": no output for `inactivity_timeout` seconds,
+      - "pattern": the kill pattern appeared and the script is still running
+        `kill_grace` seconds later (so the rest of a traceback is captured).
+    Returns the reason, or None if the output closed on its own.
+    """
+    started = time.monotonic()
+    matched_at = None
+    stopped = None
+    killed_at = None
+    while True:
+        if stopped is None:
+            deadlines = [(started + timeout, "timeout")]
+            if inactivity_timeout:
+                deadlines.append((capture.last_output + inactivity_timeout, "inactivity"))
+            if matched_at is not None:
+                deadlines.append((matched_at + kill_grace, "pattern"))
+            deadline, reason = min(deadlines)
+        else:
+            deadline = killed_at + DRAIN_SECONDS
+
+        try:
+            item = await asyncio.wait_for(queue.get(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            if stopped is not None:
+                return stopped  # output still open after the kill
+            stopped, killed_at = reason, time.monotonic()
+            kill()
+            continue
+
+        if item is None:
+            return stopped
+        if capture.feed(*item) and matched_at is None:
+            matched_at = time.monotonic()
@@ -0,0 +1,157 @@
+import re
+
+# Search/replace edit blocks, one or more per ```edits fence:
+#   <<<<<<< SEARCH
+#   lines to find (exactly once)
+#   =======
+#   lines to put there instead
+#   >>>>>>> REPLACE
+_EDIT_BLOCK = re.compile(r"^<{5,} SEARCH\n(.*?)^={5,}\n(.*?)^>{5,} REPLACE$", re.M | re.S)
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+# Fenced edit and diff blocks of an edit-mode reply
+_EDITS_FENCE = re.compile(r"```edits[ \t]*\n(.*?)```", re.S)
+_DIFF_FENCE = re.compile(r"```diff[ \t]*\n(.*?)```", re.S)
+
+
+class PatchError(ValueError):
+    """The edits or diff do not apply to the code."""
+
+
+######################################################################
+# 1) HELPER: Locate a block of lines
+######################################################################
+def _matches(lines, block):
+    """
+    Indexes where `block` occurs in `lines`: exact matches if there are any,
+    else matches ignoring trailing whitespace.
+    """
+    for normalize in (lambda line: line, str.rstrip):
+        wanted = [normalize(line) for line in block]
+        matches = [
+            index for index in range(len(lines) - len(block) + 1)
+            if [normalize(line) for line in lines[index:index + len(block)]] == wanted
+        ]
+        if matches:
+            return matches
+    return []
+
+
+def _find_lines(lines, block, near=0):
+    """
+    Index where `block` occurs in `lines` (see _matches). With several
+    matches the one closest to `near` wins; None if there is none.
+    """
+    matches = _matches(lines, block)
+    return min(matches, key=lambda index: abs(index - near)) if matches else None
+
+
+######################################################################
+# 2) Search/replace edits
+######################################################################
+def parse_edits(text):
+    """
+    [(search, replace)] from the SEARCH/REPLACE blocks in `text`.
+    """
+    return [(search, replace) for search, replace in _EDIT_BLOCK.findall(text)]
+
+
+def apply_edits(code, edits):
+    """
+    Applies (search, replace) pairs in order. Each search text must occur
+    exactly once (ignoring trailing whitespace if there is no exact match).
+    """
+    if not edits:
+        raise PatchError("No SEARCH/REPLACE blocks found.")
+    lines = code.split("\n")
+    for number, (search, replace) in enumerate(edits, 1):
+        block = search.rstrip("\n").split("\n")
+        if not search.strip():
+            raise PatchError(f"Edit {number}: the SEARCH part is empty.")
+        matches = _matches(lines, block)
+        if len(matches) > 1:
+            raise PatchError(f"Edit {number}: the SEARCH text occurs {len(matches)} times; include more context.")
+        if not matches:
+            raise PatchError(f"Edit {number}: the SEARCH text was not found:\n{search.rstrip()}")
+        index = matches[0]
+        new_block = replace.rstrip("\n").split("\n") if replace.strip() else []
+        lines[index:index + len(block)] = new_block
+    return "\n".join(lines)
+
+
+######################################################################
+# 3) Unified diffs
+######################################################################
+def apply_unified_diff(code, diff):
+    """
+    Applies the hunks of a unified diff. Hunks are located by their context
+    and removed lines (line numbers only break ties), so diffs against
+    slightly renumbered code still apply.
+    """
+    hunks = []
+    for line in diff.split("\n"):
+        if line.startswith(("--- ", "+++ ")) and not hunks:
+            continue
+        header = _HUNK_HEADER.match(line)
+        if header:
+            hunks.append({"start": int(header.group(1)) - 1, "old": [], "new": []})
+        elif hunks and line.startswith(" "):
+            hunks[-1]["old"].append(line[1:])
+            hunks[-1]["new"].append(line[1:])
+        elif hunks and line.startswith("-"):
+            hunks[-1]["old"].append(line[1:])
+        elif hunks and line.startswith("+"):
+            hunks[-1]["new"].append(line[1:])
+        elif hunks and line == "":
+            hunks[-1]["old"].append("")  # context lines whose leading space was stripped
+            hunks[-1]["new"].append("")
+    if not hunks:
+        raise PatchError("No @@ hunks found in the diff.")
+
+    lines = code.split("\n")
+    offset = 0
+    for number, hunk in enumerate(hunks, 1):
+        old, new = hunk["old"], hunk["new"]
+        while old and new and old[-1] == "" and new[-1] == "":
+            old, new = old[:-1], new[:-1]  # trailing blank lines of the fence
+        if not old:
+            index = min(max(hunk["start"] + 1 + offset, 0), len(lines))  # pure insertion after that line
+        else:
+            index = _find_lines(lines, old, near=hunk["start"] + offset)
+            if index is None:
+                raise PatchError(f"Hunk {number} does not match the code:\n" + "\n".join(old))
+        lines[index:index + len(old)] = new
+        offset += len(new) - len(old)
+    return "\n".join(lines)
+
+
+######################################################################
+# 4) apply_reply: code from an edit-mode reply
+######################################################################
+def apply_reply(code, reply):
+    """
+    Patched code from the ```edits or ```diff blocks of an LLM reply, or
+    None if the reply has neither. Raises PatchError when they do not apply
+    or the result does not compile.
+    """
+    edit_blocks = _EDITS_FENCE.findall(reply)
+    diff_blocks = _DIFF_FENCE.findall(reply)
+    if not edit_blocks and not diff_blocks:
+        return None
+    patched = code
+    if edit_blocks:
+        patched = apply_edits(patched, parse_edits("\n".join(edit_blocks)))
+    for diff in diff_blocks:
+        patched = apply_unified_diff(patched, diff)
+    try:
+        compile(patched, "<patched>", "exec")
+    except SyntaxError as e:
+        raise PatchError(f"The patched code does not compile: {e.msg} (line {e.lineno}).")
+    return patched
+
+
+def is_patch(reply):
+    """
+    True if an LLM reply answers with ```edits or ```diff blocks rather than
+    a complete script.
+    """
+    return bool(_EDITS_FENCE.search(reply) or _DIFF_FENCE.search(reply))
@@ -0,0 +1,139 @@
+"""
+Warm interpreter for agent/interpreter_pool.py.
+
+Started as `python pool_worker.py module ...`: imports the given modules once,
+then reads one JSON job per line on stdin. Each job's script runs in a fresh
+forked child, so scripts never share state, but they skip interpreter start-up
+and the preloaded imports.
+
+Protocol (one JSON object per line on stdout):
+  -> {"ready": true}                                   after preloading
+  <- {"script": path, "cwd": dir or null, "env": {},
+      "limits": {"RLIMIT_*": n}, "cgroup": dir}        a job (env/limits/cgroup optional)
+  -> {"pid": child_pid}                                right after forking
+  -> {"stream": "stdout" | "stderr", "data": text}     output as it arrives
+                                                       (bytes as latin-1 text)
+  -> {"returncode": int, "seconds": float,
+      "peak_rss_mb": float, "cpu_seconds": float}      once the child has exited
+"""
+import importlib
+import json
+import os
+import runpy
+import selectors
+import sys
+import time
+import traceback
+
+from limits import apply_limits
+from crash_report import REPORT_ENV, write_report
+
+# The worker's own modules, imported by their bare names (agent/ is sys.path[0]);
+# forgotten in each child so the script's `import limits` finds its own module
+_OWN_MODULES = ("limits", "crash_report")
+
+
+def _run_child(job, pipes, protocol):
+    """
+    Runs the script as `python script.py` would; never returns.
+    """
+    os.setpgid(0, 0)
+    protocol.close()
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(pipes["stdout"][1], 1)
+    os.dup2(pipes["stderr"][1], 2)
+    for read_fd, write_fd in pipes.values():
+        os.close(read_fd)
+        os.close(write_fd)
+    # The interpreter started long ago, so PYTHONUNBUFFERED cannot take effect;
+    # flush every line so output reaches the pool as it is printed
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.stderr.reconfigure(line_buffering=True)
+    if job.get("limits") or job.get("cgroup"):
+        apply_limits(job.get("limits") or {}, job.get("cgroup"))
+
+    script = os.path.abspath(job["script"])
+    os.environ.update(job.get("env") or {})
+    if job.get("cwd"):
+        os.chdir(job["cwd"])
+    sys.argv = [script]
+    sys.path[0] = os.path.dirname(script)
+    for name in _OWN_MODULES:
+        sys.modules.pop(name, None)
+
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit:
+        raise
+    except BaseException as e:
+        if os.environ.get(REPORT_ENV):
+            write_report(e, script, os.environ[REPORT_ENV])
+        # Print the traceback from the script's first frame on, as the interpreter would
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != script:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        sys.exit(1)
+    # Normal interpreter shutdown: joins threads, runs atexit handlers, flushes output
+    sys.exit(0)
+
+
+def main():
+    for module in sys.argv[1:]:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+    # Protocol messages go to a private copy of stdout; fd 1 becomes each child's output
+    protocol = os.fdopen(os.dup(1), "w")
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+
+    def send(message):
+        protocol.write(json.dumps(message) + "\n")
+        protocol.flush()
+
+    send({"ready": True})
+    for line in sys.stdin:
+        job = json.loads(line)
+        pipes = {"stdout": os.pipe(), "stderr": os.pipe()}
+        started = time.time()
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            _run_child(job, pipes, protocol)
+        try:
+            os.setpgid(pid, pid)  # also set here so the pool can kill the group right away
+        except OSError:
+            pass
+        send({"pid": pid})
+
+        # Relay output as it arrives; the pool decides what to keep and when to kill
+        selector = selectors.DefaultSelector()
+        for name, (read_fd, write_fd) in pipes.items():
+            os.close(write_fd)
+            selector.register(read_fd, selectors.EVENT_READ, name)
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fd, 65536)
+                if data:
+                    send({"stream": key.data, "data": data.decode("latin-1")})
+                else:
+                    selector.unregister(key.fd)
+                    os.close(key.fd)
+        selector.close()
+
+        _, status, usage = os.wait4(pid, 0)
+        send({
+            "returncode": os.waitstatus_to_exitcode(status),
+            "seconds": time.time() - started,
+            "peak_rss_mb": usage.ru_maxrss / 1024,  # KB on Linux
+            "cpu_seconds": usage.ru_utime + usage.ru_stime
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import ast
+import builtins
+import importlib.util
+import sys
+
+# Names a module can use without binding them itself
+_MODULE_NAMES = set(dir(builtins)) | {"__file__", "__name__", "__doc__", "__spec__", "__loader__", "__package__",
+                                      "__builtins__", "__path__", "__annotations__"}
+# Names only a class body defines, and the one functions nested in a class see
+# (the cell behind zero-argument super())
+_CLASS_BODY_NAMES = frozenset({"__qualname__", "__module__"})
+_METHOD_NAMES = frozenset({"__class__"})
+
+# Calls that bind names at runtime, which makes an undefined-name check unreliable
+_DYNAMIC_CALLS = {"exec", "eval", "globals", "locals", "vars", "__import__"}
+
+# Test frameworks whose calls can run the script's tests
+_TEST_MODULES = {"unittest", "pytest"}
+# Calls that run the tests by themselves: unittest.main(), pytest.main(), unittest.TestProgram()
+_TEST_MAIN_CALLS = {"main", "TestProgram"}
+# Calls that build a runner or suite; a .run(...) call then runs the tests
+_SUITE_BUILDERS = {"TextTestRunner", "TestSuite", "TestLoader", "makeSuite", "discover", "loadTestsFromTestCase",
+                   "loadTestsFromModule", "loadTestsFromName", "loadTestsFromNames"}
+
+
+######################################################################
+# 1) HELPER: Individual checks, each returning a list of issues
+######################################################################
+def _issue(check, line, message):
+    return {"check": check, "line": line, "message": message}
+
+
+def _bound_names(tree):
+    """
+    Every name the code binds anywhere (any scope); None if it star-imports.
+    """
+    bound = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            bound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, ast.Import):
+            bound.update(alias.asname or alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if any(alias.name == "*" for alias in node.names):
+                return None
+            bound.update(alias.asname or alias.name for alias in node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            bound.add(node.rest)
+    return bound
+
+
+def _class_scope_names(tree):
+    """
+    ids of the Name nodes that read _CLASS_BODY_NAMES in a class body or
+    _METHOD_NAMES in a function nested in a class, where they are defined.
+    """
+    defined = set()
+    stack = [(tree, frozenset())]
+    while stack:
+        node, extra = stack.pop()
+        if isinstance(node, ast.Name) and node.id in extra:
+            defined.add(id(node))
+        if isinstance(node, ast.ClassDef):
+            # Decorators and bases are evaluated in the enclosing scope
+            stack.extend((child, extra) for child in node.decorator_list + node.bases + node.keywords)
+            stack.extend((child, _CLASS_BODY_NAMES | (extra & _METHOD_NAMES)) for child in node.body)
+            continue
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)) and extra:
+            extra = _METHOD_NAMES
+        stack.extend((child, extra) for child in ast.iter_child_nodes(node))
+    return defined
+
+
+def _undefined_names(tree):
+    """
+    Names that are read but never bound anywhere in the code, nor builtins.
+    Scope-insensitive on purpose: it only reports names that fail in every
+    scope, so it has no false positives on valid code.
+    """
+    calls = {node.func.id for node in ast.walk(tree) if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)}
+    bound = _bound_names(tree)
+    if bound is None or calls & _DYNAMIC_CALLS:
+        return []
+    class_scope = _class_scope_names(tree)
+    issues = []
+    reported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in bound \
+                and node.id not in _MODULE_NAMES and id(node) not in class_scope and node.id not in reported:
+            reported.add(node.id)
+            issues.append(_issue("undefined-name", node.lineno, f"name '{node.id}' is not defined"))
+    return issues
+
+
+def _installs_packages(tree):
+    # Code that runs pip itself is expected to import what it just installed
+    return any(
+        isinstance(node, ast.Constant) and isinstance(node.value, str) and "pip" in node.value.split()
+        for node in ast.walk(tree)
+    )
+
+
+def _unresolved_imports(tree):
+    """
+    Module-level imports (outside try blocks) of modules this interpreter
+    cannot find. These fail the moment the script starts.
+    """
+    if _installs_packages(tree):
+        return []
+    issues = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            top = module.split(".")[0]
+            try:
+                found = top in sys.modules or importlib.util.find_spec(top) is not None
+            except (ImportError, ValueError):
+                found = False
+            if not found:
+                issues.append(_issue("unresolved-import", node.lineno, f"module '{top}' cannot be imported here"))
+    return issues
+
+
+def _runs_tests(tree):
+    """
+    True if the code calls something that runs its tests: unittest.main(...),
+    pytest.main(...), or .run(...) next to a TextTestRunner, suite or loader.
+    """
+    modules = set()  # local names of the unittest / pytest modules
+    imported = {}    # local name -> name imported from unittest / pytest
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.asname or alias.name for alias in node.names if alias.name in _TEST_MODULES)
+        elif isinstance(node, ast.ImportFrom) and node.module in _TEST_MODULES:
+            imported.update({alias.asname or alias.name: alias.name for alias in node.names})
+
+    def test_api(func):
+        # The unittest / pytest name a call refers to, or None
+        if isinstance(func, ast.Name):
+            return imported.get(func.id)
+        if isinstance(func, ast.Attribute):
+            if isinstance(func.value, ast.Name) and func.value.id in modules:
+                return func.attr
+            # Loader methods, e.g. unittest.TestLoader().loadTestsFromTestCase(...)
+            return func.attr if func.attr in _SUITE_BUILDERS else None
+        return None
+
+    calls = [node for node in ast.walk(tree) if isinstance(node, ast.Call)]
+    apis = {test_api(call.func) for call in calls}
+    if apis & _TEST_MAIN_CALLS:
+        return True
+    return bool(apis & _SUITE_BUILDERS) and any(
+        isinstance(call.func, ast.Attribute) and call.func.attr == "run" for call in calls
+    )
+
+
+def _missing_calls(tree):
+    """
+    What SYSTEM_PROMPT requires to actually run: unittest tests, their
+    invocation, and a call of any top-level main().
+    """
+    issues = []
+    names_read = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)}
+    test_classes = [
+        node for node in ast.walk(tree)
+        if isinstance(node, ast.ClassDef) and any(
+            (isinstance(base, ast.Attribute) and base.attr == "TestCase")
+            or (isinstance(base, ast.Name) and base.id == "TestCase")
+            for base in node.bases
+        )
+    ]
+    if not test_classes:
+        issues.append(_issue("missing-tests", None, "no unittest.TestCase classes found; unit tests are required"))
+    elif not _runs_tests(tree):
+        issues.append(_issue(
+            "tests-not-run", test_classes[0].lineno,
+            "unit tests are defined but never run (call unittest.main(...) or a TextTestRunner)"
+        ))
+
+    main = next(
+        (node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == "main"),
+        None
+    )
+    if main is not None and "main" not in names_read:
+        issues.append(_issue("main-not-called", main.lineno, "main() is defined but never called"))
+    return issues
+
+
+######################################################################
+# 2) preflight: cheap in-process checks before spending a subprocess
+######################################################################
+def preflight(code):
+    """
+    Checks generated code without running it and returns a list of issues
+    ({"check", "line", "message"}); an empty list means it is worth running.
+
+    Checks: compile() (syntax), names that are never bound, module-level
+    imports that cannot be resolved, and the unittest tests and main() call
+    that SYSTEM_PROMPT asks for.
+    """
+    try:
+        compile(code, "<generated>", "exec")
+    except SyntaxError as e:
+        text = (e.text or "").rstrip()
+        message = f"{e.__class__.__name__}: {e.msg}" + (f"\n    {text}" if text else "")
+        return [_issue("syntax", e.lineno, message)]
+    except ValueError as e:  # e.g. null bytes in the source
+        return [_issue("syntax", None, str(e))]
+
+    tree = ast.parse(code)
+    issues = _undefined_names(tree) + _unresolved_imports(tree) + _missing_calls(tree)
+    return sorted(issues, key=lambda issue: issue["line"] or 0)
+
+
+def format_issues(issues):
+    """
+    Feedback for the LLM listing every issue with its line.
+    """
+    lines = ["The code was not run because a pre-flight check found these problems:"]
+    for issue in issues:
+        where = f"line {issue['line']}" if issue["line"] else "code"
+        lines.append(f"- {where} [{issue['check']}]: {issue['message']}")
+    lines.append("Fix all of them and return the complete corrected code.")
+    return "\n".join(lines)
@@ -1,4 +1,4 @@
-
+from agent.test_results import JSON_RESULTS_EXAMPLE
 
 
 def error_prompt(error_msg):
@@ -56,8 +56,27 @@ Explain how you will investigate and correct the error. Consider different appro
     return ERROR_MSG
 
 
+# Appended to the debugging instructions when the agent runs in edit mode
+EDIT_MODE_PROMPT = """
+
+**EDIT MODE:** Instead of re-sending the whole script, reply with only your changes to `Last Code Generated with Errors`, as search/replace edits:
+
+```edits
+<<<<<<< SEARCH
+exact lines from the last code
+=======
+the lines that replace them
+>>>>>>> REPLACE
+```
+
+- Each SEARCH part must match the last code exactly (including indentation) and only once; include surrounding lines if needed.
+- Use as many edit blocks as needed, in order. A unified diff in a ```diff block is also accepted.
+- For extensive rewrites, send the complete script in a ```python block instead.
+"""
+
+
 
-SYSTEM_PROMPT = """
+SYSTEM_PROMPT = f"""
 You are BugOut, an AI coding agent which can **execute code in a live environment** as part of your core functionality.
 
 **DEPENDENCY MANAGEMENT INSTRUCTIONS:**
@@ -86,6 +105,8 @@ You are BugOut, an AI coding agent which can **execute code in a live environmen
 - You must create unit tests for the code you generate.
 - Unit tests must output test results to **output/test.txt**
 - You must load those unit test results from **output/test.txt** and verify for yourself the code is good.
+- Write the unittest runner's own output to that file (e.g. `unittest.TextTestRunner(stream=f, verbosity=2)`), or JSON like `{JSON_RESULTS_EXAMPLE}`.
+- The full path of that file is also in the `BUGOUT_TEST_RESULTS` environment variable; prefer `os.environ.get("BUGOUT_TEST_RESULTS", "output/test.txt")`.
 - **READ THOROUGHLY THE SUMMARY OF PREVIOUS ATTEMPTS:** If your current debugging approach resembles any previously attempted solution that failed, you must adopt an entirely new and fundamentally different strategy.
 - Ultimately, your job is to generate correct Python code that solves the user’s task.
 
@@ -0,0 +1,107 @@
+import ast
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+######################################################################
+# 1) HELPER: Hash code by what it does, not how it is formatted
+######################################################################
+def _strip_docstrings(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                    and isinstance(body[0].value.value, str):
+                node.body = body[1:]
+    return tree
+
+
+def code_key(code):
+    """
+    SHA-256 of the code's AST with docstrings removed, so attempts that only
+    differ in whitespace, comments or docstrings share a key. Code that does
+    not parse is hashed with its whitespace collapsed instead.
+    """
+    try:
+        normalized = ast.dump(_strip_docstrings(ast.parse(code)), annotate_fields=False)
+    except (SyntaxError, ValueError):
+        normalized = " ".join(code.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+######################################################################
+# 2) ResultCache: outcomes of earlier attempts, LRU, optionally on disk
+######################################################################
+class ResultCache:
+    """
+    Remembers how earlier attempts ended: {"passed", "error", "result"}, where
+    `error` is the execution error or the unit-test analyzer's verdict.
+    AsyncBugOutAgent looks code up before running it and skips attempts that
+    are known to fail.
+
+    Holds at most `max_entries` attempts, evicting the least recently used.
+    With `path`, entries are loaded from and saved to that JSON file, so one
+    cache can serve later sessions too.
+    """
+
+    def __init__(self, max_entries=256, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries.update(json.load(f))
+            except (OSError, ValueError):
+                pass  # unreadable cache file: start empty, it is rewritten on the next put
+            self._evict()
+
+    def get(self, code):
+        """
+        The recorded outcome of `code` (or equivalent code), or None.
+        """
+        key = code_key(code)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, code, passed, error=None, result=None):
+        key = code_key(code)
+        with self._lock:
+            self.entries[key] = {"passed": passed, "error": error, "result": result}
+            self.entries.move_to_end(key)
+            self._evict()
+            if self.path:
+                self._save()
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _save(self):
+        # Write a temporary file and rename it, so a crash never leaves half a cache
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".result-cache-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,301 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from agent.output_capture import OutputCapture, pump_streams, watch_output
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+MB = 1024 * 1024
+
+# Started as `python -c` in place of the script: applies the rlimits
+# ("RLIMIT_X=n ...") and joins the run's cgroup with agent/limits.py, then
+# execs the script, which keeps both. Unlike a preexec_fn (unsafe in a process
+# with threads), nothing but fork+exec runs in the agent process. Only cheap
+# imports, as it adds an interpreter start to every run.
+_LIMITS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "limits.py")
+_EXEC_WRAPPER = (
+    "import os, sys; "
+    "namespace = {}; exec(open(sys.argv[1]).read(), namespace); "
+    "namespace['apply_limits']({name: int(value) for name, value in (item.split('=') for item in sys.argv[2].split())}, "
+    "sys.argv[3] or None); "
+    "os.execv(sys.executable, [sys.executable] + sys.argv[4:])"
+)
+
+
+######################################################################
+# 1) HELPER: cgroup v2 discovery
+######################################################################
+def _own_cgroup():
+    """
+    This process's cgroup v2 directory, or None without a unified hierarchy.
+    """
+    if not os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers")):
+        return None
+    try:
+        with open("/proc/self/cgroup") as f:
+            relative = next(line[3:].strip() for line in f if line.startswith("0::"))
+    except (OSError, StopIteration):
+        return None
+    return os.path.join(CGROUP_ROOT, relative.lstrip("/"))
+
+
+def _cgroup_parent(cgroup_root=None):
+    """
+    Returns a cgroup v2 directory under which per-run cgroups with memory and
+    pids control can be created, or None if there is none we may use.
+    """
+    if not os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers")):
+        return None  # no unified (v2) hierarchy
+    parent = cgroup_root if cgroup_root is not None else _own_cgroup()
+    if parent is None:
+        return None
+    try:
+        with open(os.path.join(parent, "cgroup.subtree_control")) as f:
+            enabled = f.read().split()
+        missing = [c for c in ("memory", "pids") if c not in enabled]
+        if missing:
+            # Fails unless the cgroup is delegated to us and holds no processes itself
+            with open(os.path.join(parent, "cgroup.subtree_control"), "w") as f:
+                f.write(" ".join(f"+{c}" for c in missing))
+    except OSError:
+        return None
+    return parent
+
+
+def _read(path, default=None):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return default
+
+
+def _user_tasks():
+    """
+    Processes and threads currently owned by this user (what RLIMIT_NPROC
+    counts): pids.current of the user's systemd slice or, failing that, of
+    this process's cgroup (a container's own); all of /proc is only scanned
+    without a cgroup v2 pids controller.
+    """
+    cgroup = _own_cgroup()
+    if cgroup is not None:
+        slice_name = f"user-{os.getuid()}.slice"
+        parts = os.path.relpath(cgroup, CGROUP_ROOT).split(os.sep)
+        if slice_name in parts:
+            cgroup = os.path.join(CGROUP_ROOT, *parts[:parts.index(slice_name) + 1])
+        current = _read(os.path.join(cgroup, "pids.current"))
+        if current:
+            return int(current)
+
+    uid = str(os.getuid())
+    count = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        status = _read(f"/proc/{pid}/status", "")
+        fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+        if fields.get("Uid", "").split()[:1] == [uid]:
+            count += int(fields.get("Threads", "1"))
+    return count
+
+
+######################################################################
+# 2) Sandbox: rlimits + optional cgroup v2 per run
+######################################################################
+class Sandbox:
+    """
+    Resource limits for generated scripts:
+      - rlimits: address space (`memory_mb`), CPU seconds, open files and,
+        without a cgroup, processes (RLIMIT_NPROC counts all of the user's
+        processes, so `processes` is allowed on top of what already runs);
+      - where a usable cgroup v2 hierarchy exists, each run also gets its own
+        cgroup with memory.max, memory.swap.max = 0 and pids.max, which covers
+        every process the script starts and gives exact peak memory.
+
+    Each run reports peak RSS (MB) and CPU time (s), and which limit stopped
+    it, if any. Used by AsyncBugOutAgent for cold runs and passed on to the
+    InterpreterPool for warm ones. POSIX only.
+    """
+
+    def __init__(self, memory_mb=4096, cpu_seconds=120, open_files=1024, processes=64, cgroup=True,
+                 cgroup_root=None):
+        if os.name != "posix":
+            raise RuntimeError("Sandbox needs POSIX rlimits.")
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.open_files = open_files
+        self.processes = processes
+        self.cgroup_parent = _cgroup_parent(cgroup_root) if cgroup else None
+
+    def limits(self):
+        """
+        rlimits for one run as {"RLIMIT_*": value}.
+        """
+        limits = {}
+        if self.memory_mb:
+            limits["RLIMIT_AS"] = self.memory_mb * MB
+        if self.cpu_seconds:
+            limits["RLIMIT_CPU"] = self.cpu_seconds
+        if self.open_files:
+            limits["RLIMIT_NOFILE"] = self.open_files
+        if self.processes and self.cgroup_parent is None:
+            limits["RLIMIT_NPROC"] = _user_tasks() + self.processes
+        return limits
+
+    def create_cgroup(self):
+        """
+        Creates the cgroup for one run; None without cgroup support.
+        """
+        if self.cgroup_parent is None:
+            return None
+        path = os.path.join(self.cgroup_parent, f"bugout-{uuid.uuid4().hex[:12]}")
+        try:
+            os.mkdir(path)
+            settings = {"memory.swap.max": "0"}
+            if self.memory_mb:
+                settings["memory.max"] = str(self.memory_mb * MB)
+            if self.processes:
+                settings["pids.max"] = str(self.processes)
+            for name, value in settings.items():
+                if os.path.exists(os.path.join(path, name)):
+                    with open(os.path.join(path, name), "w") as f:
+                        f.write(value)
+        except OSError:
+            self.remove_cgroup(path)
+            return None
+        return path
+
+    def collect_cgroup(self, path):
+        """
+        Reads peak memory, CPU time and OOM kills of a finished run's cgroup,
+        kills anything left in it and removes it.
+        """
+        peak = _read(os.path.join(path, "memory.peak"))
+        cpu_stat = dict(line.split() for line in _read(os.path.join(path, "cpu.stat"), "").splitlines() if line)
+        events = dict(line.split() for line in _read(os.path.join(path, "memory.events"), "").splitlines() if line)
+        self.remove_cgroup(path)
+        return {
+            "peak_rss_mb": int(peak) / MB if peak else None,
+            "cpu_seconds": int(cpu_stat["usage_usec"]) / 1e6 if "usage_usec" in cpu_stat else None,
+            "oom_killed": int(events.get("oom_kill", 0)) > 0,
+        }
+
+    def remove_cgroup(self, path):
+        if not os.path.isdir(path):
+            return
+        try:
+            with open(os.path.join(path, "cgroup.kill"), "w") as f:
+                f.write("1")
+        except OSError:
+            for pid in _read(os.path.join(path, "cgroup.procs"), "").split():
+                try:
+                    os.kill(int(pid), signal.SIGKILL)
+                except OSError:
+                    pass
+        for _ in range(50):
+            try:
+                os.rmdir(path)
+                return
+            except OSError:
+                time.sleep(0.01)  # processes still exiting
+
+    def limit_hit(self, returncode, oom_killed=False):
+        """
+        Names the limit that ended a run ("memory" or "cpu"), or None.
+        """
+        if oom_killed:
+            return "memory"
+        if returncode == -signal.SIGXCPU:
+            return "cpu"
+        return None
+
+    async def run(self, script_path, timeout, cwd=None, env=None, capture=None, inactivity_timeout=None,
+                  kill_grace=1.0):
+        """
+        Runs `python script.py` under the limits, in its own session so the
+        whole process group can be killed. Returns the same dict as
+        InterpreterPool.run plus peak_rss_mb, cpu_seconds and limit.
+        """
+        capture = capture if capture is not None else OutputCapture()
+        loop = asyncio.get_running_loop()
+        limits = self.limits()
+        cgroup = self.create_cgroup()
+        started = time.time()
+        try:
+            proc = subprocess.Popen(
+                [sys.executable, "-I", "-S", "-c", _EXEC_WRAPPER, _LIMITS_PATH,
+                 " ".join(f"{name}={value}" for name, value in limits.items()), cgroup or "", script_path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=cwd,
+                env={**os.environ, **env} if env else None,
+                start_new_session=True
+            )
+
+            # Reap with wait4 (not waitpid) to get the child's resource usage
+            exited = loop.create_future()
+
+            def wait():
+                _, status, usage = os.wait4(proc.pid, 0)
+                loop.call_soon_threadsafe(exited.set_result, (status, usage))
+
+            threading.Thread(target=wait, daemon=True).start()
+
+            def kill():
+                if not exited.done():
+                    try:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+
+            readers = {}
+            transports = []
+            for name, pipe in (("stdout", proc.stdout), ("stderr", proc.stderr)):
+                reader = asyncio.StreamReader()
+                transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+                readers[name] = reader
+                transports.append(transport)
+
+            queue = asyncio.Queue()
+            pump = asyncio.create_task(pump_streams(readers, queue))
+            try:
+                stopped = await watch_output(queue, kill, capture, timeout, inactivity_timeout, kill_grace)
+                status, usage = await exited
+            except asyncio.CancelledError:
+                kill()
+                await exited
+                raise
+            finally:
+                pump.cancel()
+                for transport in transports:
+                    transport.close()
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        finally:
+            usage_stats = self.collect_cgroup(cgroup) if cgroup else {}
+
+        result = {
+            "stdout": capture.text("stdout"),
+            "stderr": capture.text("stderr"),
+            "returncode": proc.returncode,
+            "seconds": time.time() - started,
+            "stopped": stopped,
+            "peak_rss_mb": usage.ru_maxrss / 1024,  # KB on Linux
+            "cpu_seconds": usage.ru_utime + usage.ru_stime,
+        }
+        return self.finish_result(result, usage_stats)
+
+    def finish_result(self, result, cgroup_stats):
+        """
+        Prefers the cgroup's numbers (they cover every process of the run)
+        and records which limit, if any, ended the run.
+        """
+        for key in ("peak_rss_mb", "cpu_seconds"):
+            if cgroup_stats.get(key) is not None:
+                result[key] = cgroup_stats[key]
+        result["limit"] = self.limit_hit(result["returncode"], cgroup_stats.get("oom_killed", False))
+        return result
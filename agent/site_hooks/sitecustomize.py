@@ -0,0 +1,41 @@
+"""
+Imported at startup by scripts the agent runs cold (agent/site_hooks is put
+on their PYTHONPATH): installs the crash report hook from
+agent/crash_report.py without putting the agent's modules on sys.path.
+
+Being first on PYTHONPATH shadows any sitecustomize of the interpreter
+(distro, venv, conda), so that one is found and run here too, as it would
+be for a plain `python script.py`.
+"""
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+
+def _run_next_sitecustomize():
+    here = os.path.dirname(os.path.abspath(__file__))
+    entries = [os.path.abspath(entry or os.getcwd()) for entry in sys.path]
+    if here not in entries:
+        return
+    spec = importlib.machinery.PathFinder.find_spec("sitecustomize", sys.path[entries.index(here) + 1:])
+    if spec is None or spec.loader is None:
+        return
+    module = importlib.util.module_from_spec(spec)
+    # `import sitecustomize` then returns the interpreter's module, not this hook
+    sys.modules["sitecustomize"] = module
+    spec.loader.exec_module(module)
+
+
+try:
+    _run_next_sitecustomize()
+finally:
+    # Installed last so the report hook wraps any excepthook set above
+    if os.environ.get("BUGOUT_CRASH_REPORT"):
+        _spec = importlib.util.spec_from_file_location(
+            "_bugout_crash_report",
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "crash_report.py")
+        )
+        _module = importlib.util.module_from_spec(_spec)
+        _spec.loader.exec_module(_module)
+        _module.install()
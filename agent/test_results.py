@@ -0,0 +1,162 @@
+import json
+import re
+
+# unittest: "Ran 5 tests in 0.012s" followed by "OK (skipped=1)" or "FAILED (failures=1, errors=2)"
+_UNITTEST_RAN = re.compile(r"^Ran (\d+) tests? in [\d.]+s\s*\n+\s*(OK|FAILED|NO TESTS RAN)(?: \(([^)]*)\))?", re.M)
+# "FAIL: test_add (__main__.TestMath.test_add)" headers of failure/error reports
+_UNITTEST_REPORT = re.compile(r"^(FAIL|ERROR|UNEXPECTED SUCCESS): (\S+) \(([^)]*)\)", re.M)
+# verbosity=2 lines: "test_add (__main__.TestMath.test_add) ... ok"
+_UNITTEST_LINE = re.compile(
+    r"^(\w+) \(([\w.]+)\)(?:\n.*?)? \.\.\. (ok|FAIL|ERROR|skipped|expected failure|unexpected success)", re.M
+)
+
+# pytest: "==== 2 failed, 3 passed, 1 skipped in 0.12s ====" (or the same without the rule in -q mode)
+_PYTEST_KINDS = r"(?:passed|failed|errors?|skipped|xfailed|xpassed|warnings?|deselected|rerun)"
+_PYTEST_SUMMARY = re.compile(
+    rf"^=*\s*((?:\d+ {_PYTEST_KINDS}(?:, )?)+) in [\d.]+s(?: \([^)]*\))?\s*=*\s*$", re.M
+)
+_PYTEST_COUNT = re.compile(rf"(\d+) ({_PYTEST_KINDS})")
+# "FAILED test_x.py::test_add - AssertionError: ..." from the short test summary
+_PYTEST_RESULT = re.compile(r"^(FAILED|ERROR) (\S+::\S+)(?: - (.*))?$", re.M)
+_PYTEST_NO_TESTS = re.compile(r"^=+ no tests ran in [\d.]+s =+$", re.M)
+
+# Statuses that do not fail a run
+_OK_STATUSES = {"passed", "skipped", "xfailed"}
+
+# How much of the failure reports to quote back to the LLM
+MAX_DETAIL_CHARS = 2000
+
+# JSON results format scripts may write instead of runner output (see SYSTEM_PROMPT)
+JSON_RESULTS_EXAMPLE = (
+    '{"tests": [{"name": "test_add", "status": "passed"}, '
+    '{"name": "test_div", "status": "failed", "message": "ZeroDivisionError"}]}'
+)
+
+
+######################################################################
+# 1) HELPER: One parser per result format; None = not this format
+######################################################################
+def _parse_json(content):
+    """
+    {"tests": [{"name", "status": passed|failed|error|skipped, "message"}]}
+    with an optional overall "passed".
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("tests"), list):
+        return None
+    tests = []
+    for test in data["tests"]:
+        if not isinstance(test, dict) or "status" not in test:
+            return None
+        status = str(test["status"]).lower()
+        status = {"ok": "passed", "pass": "passed", "fail": "failed", "skip": "skipped"}.get(status, status)
+        tests.append({"name": str(test.get("name", "?")), "status": status, "message": test.get("message")})
+    passed = bool(tests) and all(test["status"] in _OK_STATUSES for test in tests)
+    if isinstance(data.get("passed"), bool) and data["passed"] != passed:
+        return None  # contradicts its own test list
+    details = "\n".join(
+        f"{test['name']}: {test['message']}" for test in tests
+        if test["status"] not in _OK_STATUSES and test["message"]
+    )
+    return {"format": "json", "passed": passed, "total": len(tests), "tests": tests, "details": details}
+
+
+def _test_id(name, where):
+    # Python 3.11+ prints "(module.Class.test)", older versions "(module.Class)"
+    return where if where.endswith("." + name) else f"{where}.{name}"
+
+
+def _parse_unittest(content):
+    runs = _UNITTEST_RAN.findall(content)
+    if not runs:
+        return None
+    total = sum(int(count) for count, _, _ in runs)
+    passed = total > 0 and all(status == "OK" for _, status, _ in runs)
+
+    statuses = {"ok": "passed", "FAIL": "failed", "ERROR": "error", "skipped": "skipped",
+                "expected failure": "xfailed", "unexpected success": "failed"}
+    tests = {}
+    for name, where, status in _UNITTEST_LINE.findall(content):
+        tests[_test_id(name, where)] = statuses[status]
+    for kind, name, where in _UNITTEST_REPORT.findall(content):
+        tests[_test_id(name, where)] = "error" if kind == "ERROR" else "failed"
+
+    # The reports between the "FAIL:"/"ERROR:" header and the next rule are the useful part
+    reports = re.findall(r"^(?:FAIL|ERROR): .*?(?=^=+$|^-+\nRan )", content, re.M | re.S)
+    details = "\n".join(report.strip() for report in reports)
+    return {
+        "format": "unittest",
+        "passed": passed,
+        "total": total,
+        "tests": [{"name": name, "status": status, "message": None} for name, status in tests.items()],
+        "details": details,
+    }
+
+
+def _parse_pytest(content):
+    summaries = _PYTEST_SUMMARY.findall(content)
+    if not summaries:
+        if _PYTEST_NO_TESTS.search(content):
+            return {"format": "pytest", "passed": False, "total": 0, "tests": [], "details": ""}
+        return None
+    counts = {}
+    for summary in summaries:
+        for count, kind in _PYTEST_COUNT.findall(summary):
+            kind = {"errors": "error", "warning": "warnings"}.get(kind, kind)
+            counts[kind] = counts.get(kind, 0) + int(count)
+    total = sum(count for kind, count in counts.items() if kind not in ("warnings", "deselected"))
+    passed = total > 0 and not counts.get("failed") and not counts.get("error")
+    tests = [
+        {"name": name, "status": "failed" if kind == "FAILED" else "error", "message": message or None}
+        for kind, name, message in _PYTEST_RESULT.findall(content)
+    ]
+    details = "\n".join(f"{test['name']}: {test['message']}" for test in tests if test["message"])
+    return {"format": "pytest", "passed": passed, "total": total, "tests": tests, "details": details}
+
+
+######################################################################
+# 2) parse_test_results: deterministic verdict for a results file
+######################################################################
+def parse_test_results(content):
+    """
+    Reads the verdict from unit-test output without an LLM: the JSON results
+    format, unittest runner output ("Ran N tests ... OK" / "FAILED (...)") or
+    pytest's summary line.
+
+    Returns {"format", "passed", "total", "tests": [{"name", "status",
+    "message"}], "details", "summary"}, or None when the content matches none
+    of them (or is contradictory), in which case the LLM has to judge it.
+    """
+    content = content.strip()
+    if not content:
+        return None
+    verdict = _parse_json(content) or _parse_unittest(content) or _parse_pytest(content)
+    if verdict is None:
+        return None
+    verdict["summary"] = _summarize(verdict)
+    return verdict
+
+
+def _summarize(verdict):
+    """
+    Feedback naming every failing test, plus the quoted failure reports.
+    """
+    if verdict["passed"]:
+        return f"Unit tests passed ({verdict['format']}: {verdict['total']} tests)."
+    if not verdict["total"]:
+        return f"No unit tests ran ({verdict['format']} output reports 0 tests)."
+    failing = [test for test in verdict["tests"] if test["status"] not in _OK_STATUSES]
+    lines = [f"Unit tests failed ({verdict['format']}: {verdict['total']} tests, {len(failing) or 'some'} failing)."]
+    for status in ("failed", "error"):
+        names = [test["name"] for test in failing if test["status"] == status]
+        if names:
+            lines.append(f"{status.capitalize()}: " + ", ".join(names))
+    if verdict["details"]:
+        details = verdict["details"]
+        if len(details) > MAX_DETAIL_CHARS:
+            details = details[:MAX_DETAIL_CHARS] + "\n... [truncated]"
+        lines.append("Details:\n" + details)
+    return "\n".join(lines)
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+
+# Memory-backed filesystem used when a workspace asks for tmpfs
+TMPFS_ROOT = "/dev/shm"
+
+
+class Workspace:
+    """
+    Private working directory for one script run.
+
+    The script runs with this directory as its cwd, so the relative
+    `output/test.txt` the prompts ask for lands in `<workspace>/output/`
+    instead of a directory shared with other runs and sessions. The paths
+    are also passed to the script as BUGOUT_OUTPUT_DIR and BUGOUT_TEST_RESULTS.
+
+    With `tmpfs=True` the directory is created under /dev/shm (when present),
+    so test I/O stays in memory. `close()` removes the directory, or moves it
+    into an archive directory first.
+    """
+
+    def __init__(self, label, root=None, tmpfs=False):
+        if root is None:
+            root = TMPFS_ROOT if tmpfs and os.path.isdir(TMPFS_ROOT) else tempfile.gettempdir()
+        self.label = label
+        self.path = tempfile.mkdtemp(prefix="bugout-run-", dir=root)
+        self.output_dir = os.path.join(self.path, "output")
+        self.test_results_path = os.path.join(self.output_dir, "test.txt")
+        os.makedirs(self.output_dir)
+
+    def env(self):
+        """
+        Environment variables telling the script where its results go.
+        """
+        return {"BUGOUT_OUTPUT_DIR": self.output_dir, "BUGOUT_TEST_RESULTS": self.test_results_path}
+
+    def write(self, name, text):
+        path = os.path.join(self.path, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def close(self, archive_dir=None):
+        """
+        Moves the workspace to `archive_dir/<label>` (returning that path), or
+        deletes it when no archive directory is given.
+        """
+        if not os.path.isdir(self.path):
+            return None
+        if archive_dir is None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            return None
+        os.makedirs(archive_dir, exist_ok=True)
+        destination = os.path.join(archive_dir, self.label)
+        if os.path.exists(destination):
+            shutil.rmtree(destination, ignore_errors=True)
+        shutil.move(self.path, destination)
+        return destination
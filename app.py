@@ -12,10 +12,9 @@ def delete_file(file_path):
 
 
 if __name__ == "__main__":
-    log_file = "logs/agent_log.txt"
+    log_file = "logs/agent_log.jsonl"
     code_out = "output/generated_code.py"
     delete_file(log_file)
-    delete_file("output/test.txt")
 
     agent = BugOutAgent("http://127.0.0.1:5000/generate", log_file)
 
@@ -0,0 +1,219 @@
+"""
+Benchmark tasks: a user request, the code replies the stand-in server sends
+for it (one per code request, in order) and the iteration the session must
+pass on. Helper requests (summaries, digests, the unit-test analyzer) get
+canned replies from the server instead.
+
+The built-in corpus covers the main paths of the agent loop: passing first
+time, crash -> fix, failing tests -> fix, pre-flight rejection -> fix, a
+known failure served from the result cache, and an edit-mode fix.
+"""
+import json
+
+from agent.event_log import read_events
+
+_SCRIPT = '''import os
+import unittest
+
+
+{functions}
+
+
+class Tests(unittest.TestCase):
+{tests}
+
+
+def main():
+{main}
+
+
+if __name__ == "__main__":
+    main()
+    with open(os.environ.get("BUGOUT_TEST_RESULTS", "test_results.txt"), "w") as results:
+        unittest.main(argv=["tests"], exit=False, testRunner=unittest.TextTestRunner(stream=results, verbosity=2))
+'''
+
+_REASONING = (
+    "Plan: implement the requested function, cover it with unit tests, call main() and write the "
+    "unittest results to BUGOUT_TEST_RESULTS so they can be verified. {note}\n\n"
+)
+
+
+def script(functions, tests, main="    print('done')"):
+    return _SCRIPT.format(functions=functions.strip("\n"), tests=tests.rstrip("\n"), main=main)
+
+
+def code_reply(code, note=""):
+    return _REASONING.format(note=note) + f"```python\n{code}```"
+
+
+def edits_reply(search, replace, note=""):
+    return _REASONING.format(note=note) + (
+        f"```edits\n<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE\n```"
+    )
+
+
+######################################################################
+# 1) Built-in tasks
+######################################################################
+_MEAN = script(
+    "def mean(values):\n    return sum(values) / len(values)\n",
+    "    def test_mean(self):\n        self.assertEqual(mean([1, 2, 3]), 2)\n\n"
+    "    def test_empty(self):\n        self.assertEqual(mean([]), 0)\n",
+    "    print(mean([1, 2, 3]))\n    print(mean([]))"
+)
+_MEAN_FIXED = _MEAN.replace(
+    "    return sum(values) / len(values)", "    return sum(values) / len(values) if values else 0"
+)
+
+_SLUG = script(
+    "def slugify(text):\n    return text.lower().replace(' ', '_')\n",
+    "    def test_slugify(self):\n        self.assertEqual(slugify('Hello World'), 'hello-world')\n",
+    "    print(slugify('Hello World'))"
+)
+_SLUG_FIXED = _SLUG.replace("replace(' ', '_')", "replace(' ', '-')")
+
+_PARSE = script(
+    "def parse_pairs(text):\n"
+    "    pairs = {}\n"
+    "    for item in text.split(','):\n"
+    "        try:\n"
+    "            key, value = item.split('=')\n"
+    "        except ValueError as e:\n"
+    "            raise KeyError(item) from e\n"
+    "        pairs[key.strip()] = int(value)\n"
+    "    return pairs\n",
+    "    def test_parse(self):\n        self.assertEqual(parse_pairs('a=1, b=2'), {'a': 1, 'b': 2})\n",
+    "    print(parse_pairs('a=1, b=2, c'))"
+)
+_PARSE_FIXED = _PARSE.replace("print(parse_pairs('a=1, b=2, c'))", "print(parse_pairs('a=1, b=2'))")
+
+_COUNT = script(
+    "def word_counts(text):\n"
+    "    counts = {}\n"
+    "    for word in text.split():\n"
+    "        counts[word] = counts.get(word, 0) + 1\n"
+    "    return counts\n",
+    "    def test_counts(self):\n        self.assertEqual(word_counts('a b a'), {'a': 2, 'b': 1})\n",
+    "    print(word_counts('a b a'))"
+)
+_COUNT_NO_TESTS = (
+    "def word_counts(text):\n"
+    "    counts = {}\n"
+    "    for word in text.split():\n"
+    "        counts[word] = counts.get(word, 0) + 1\n"
+    "    return counts\n\n\n"
+    "print(word_counts('a b a'))\n"
+)
+
+_PRIMES = script(
+    "def primes(limit):\n"
+    "    sieve = [True] * (limit + 1)\n"
+    "    sieve[0:2] = [False, False]\n"
+    "    for number in range(2, int(limit ** 0.5) + 1):\n"
+    "        if sieve[number]:\n"
+    "            sieve[number * number::number] = [False] * len(sieve[number * number::number])\n"
+    "    return [number for number, is_prime in enumerate(sieve) if is_prime]\n",
+    "    def test_primes(self):\n        self.assertEqual(primes(20), [2, 3, 5, 7, 11, 13, 17, 19])\n",
+    "    print(len(primes(200000)))\n    print(primes(10)[10])"
+)
+_PRIMES_FIXED = _PRIMES.replace("    print(primes(10)[10])", "    print(primes(10)[-1])")
+
+BUILTIN_TASKS = [
+    {
+        "name": "first-try",
+        "request": "Write mean(values) that returns 0 for an empty list, with unit tests.",
+        "replies": [code_reply(_MEAN_FIXED)],
+        "expected_iterations": 1,
+    },
+    {
+        "name": "crash-then-fix",
+        "request": "Write mean(values) that returns 0 for an empty list, with unit tests.",
+        "replies": [code_reply(_MEAN), code_reply(_MEAN_FIXED, "Guard against empty input.")],
+        "expected_iterations": 2,
+    },
+    {
+        "name": "failing-tests-then-fix",
+        "request": "Write slugify(text) that lowercases and joins words with dashes, with unit tests.",
+        "replies": [code_reply(_SLUG), code_reply(_SLUG_FIXED, "Use dashes, as the test expects.")],
+        "expected_iterations": 2,
+    },
+    {
+        "name": "chained-exception-then-fix",
+        "request": "Write parse_pairs(text) for 'k=v, ...' strings with int values, with unit tests.",
+        "replies": [code_reply(_PARSE), code_reply(_PARSE_FIXED, "Only parse well-formed input in main().")],
+        "expected_iterations": 2,
+    },
+    {
+        "name": "preflight-then-fix",
+        "request": "Write word_counts(text) returning a dict of word frequencies, with unit tests.",
+        "replies": [code_reply(_COUNT_NO_TESTS), code_reply(_COUNT, "Add the unit tests.")],
+        "expected_iterations": 2,
+    },
+    {
+        "name": "known-failure-then-fix",
+        "request": "Write mean(values) that returns 0 for an empty list, with unit tests.",
+        "replies": [
+            code_reply(_MEAN),
+            # Same code with different comments: answered from the result cache, not run
+            code_reply(_MEAN.replace("import os\n", "# Computes the mean\nimport os\n")),
+            code_reply(_MEAN_FIXED, "Guard against empty input."),
+        ],
+        "expected_iterations": 3,
+    },
+    {
+        "name": "edit-mode-fix",
+        "request": "Print the number of primes below 200000 and the largest prime below 10, with unit tests.",
+        "replies": [
+            code_reply(_PRIMES),
+            edits_reply("    print(primes(10)[10])", "    print(primes(10)[-1])", "Index the last prime."),
+        ],
+        "expected_iterations": 2,
+        "options": {"edit_mode": True},
+    },
+]
+
+
+######################################################################
+# 2) Corpus files and recorded sessions
+######################################################################
+def load_corpus(path):
+    """
+    Tasks from a JSON file: a list of {"name", "request", "replies",
+    "expected_iterations" (optional), "options" (optional AsyncBugOutAgent
+    keyword arguments)}.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        tasks = json.load(f)
+    for task in tasks:
+        missing = {"name", "request", "replies"} - set(task)
+        if missing:
+            raise ValueError(f"Task {task.get('name', '?')} lacks {sorted(missing)}.")
+    return tasks
+
+
+def tasks_from_log(path):
+    """
+    One task per session recorded in an event log (agent/event_log.py): the
+    original request, the code replies in order and, for sessions that
+    passed, the iteration they passed on.
+    """
+    sessions = {}
+    for event in read_events(path):
+        session = sessions.setdefault(event.get("session"), {"request": None, "replies": [], "iterations": None})
+        if event["event"] == "llm_request" and session["request"] is None:
+            user_messages = [message for message in event["messages"] if message["role"] == "user"]
+            session["request"] = user_messages[0]["content"] if user_messages else ""
+        elif event["event"] == "llm_response":
+            session["replies"].append(event["text"])
+        elif event["event"] == "session_report" and event["report"]["outcome"] == "success":
+            session["iterations"] = event["report"]["iterations"]
+    return [
+        {
+            "name": f"recorded-{index + 1}",
+            "request": session["request"],
+            "replies": session["replies"],
+            "expected_iterations": session["iterations"],
+        }
+        for index, session in enumerate(sessions.values()) if session["request"] and session["replies"]
+    ]
@@ -0,0 +1,244 @@
+"""
+Offline benchmark of the agent loop: runs a task corpus through
+AsyncBugOutAgent sessions against the stand-in server
+(benchmark/standin_api.py) at several concurrency levels and reports
+iterations/sec, end-to-end latency percentiles, subprocess overhead, LLM
+streaming times and log volume.
+
+A run fails (exit code 1) when a session does not pass on its task's
+expected iteration, or, with --baseline, when iterations/sec, p95 latency
+or log bytes per iteration regress by more than --tolerance against an
+earlier --json report. Subprocess overhead is reported but not compared:
+scripts compete for CPU at higher concurrency, which makes it too noisy.
+
+    python -m benchmark.run --concurrency 1,4,16 --repeat 2 --json bench.json
+    python -m benchmark.run --baseline bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from agent.agent import AsyncBugOutAgent
+from agent.event_log import EventLog
+from agent.interpreter_pool import InterpreterPool
+from agent.llm_client import close_async_clients
+from agent.metrics import MetricsRegistry, _summary
+from benchmark.corpus import BUILTIN_TASKS, load_corpus, tasks_from_log
+from benchmark.standin_api import StandInLLM, StandInServer, tag_request
+
+# Sessions that have not passed after this many iterations are stopped (a regression)
+MAX_ITERATIONS = 8
+
+
+######################################################################
+# 1) One session and one concurrency level
+######################################################################
+async def _run_session(url, task, run, work_dir, registry, semaphore, agent_options):
+    async with semaphore:
+        log_path = os.path.join(work_dir, "logs", f"{task['name']}-{run}.jsonl")
+        agent = AsyncBugOutAgent(
+            url, EventLog(log_path), archive_dir=None, workspace_root=os.path.join(work_dir, "workspaces"),
+            metrics=registry, **{**agent_options, **task.get("options", {})}
+        )
+        agent.max_iterations = MAX_ITERATIONS
+        started = time.time()
+        code, _ = await agent.generate_and_refine(tag_request(task["request"], task["name"], run))
+        seconds = time.time() - started
+        agent.events.close()
+        expected = task.get("expected_iterations")
+        return {
+            "task": task["name"],
+            "run": run,
+            "passed": code is not None,
+            "iterations": agent.iterations,
+            "expected_iterations": expected,
+            "ok": code is not None and (expected is None or agent.iterations == expected),
+            "seconds": seconds,
+            "execution_seconds": agent.metrics.values("bugout_phase_seconds", phase="execution"),
+            "llm_seconds": agent.metrics.values("bugout_phase_seconds", phase="llm"),
+            "ttft_seconds": agent.metrics.values("bugout_llm_ttft_seconds"),
+            "log_bytes": os.path.getsize(log_path) if os.path.exists(log_path) else 0,
+        }
+
+
+async def run_level(url, tasks, concurrency, repeat, work_dir, agent_options=None, pool_size=0):
+    """
+    Runs every task `repeat` times with at most `concurrency` sessions at
+    once; returns the level's summary.
+    """
+    registry = MetricsRegistry()
+    semaphore = asyncio.Semaphore(concurrency)
+    options = dict(agent_options or {})
+    os.makedirs(os.path.join(work_dir, "workspaces"), exist_ok=True)
+    pool = None
+    if pool_size:
+        pool = InterpreterPool(size=pool_size)
+        await pool.start()
+        options["interpreter_pool"] = pool
+    started = time.time()
+    try:
+        sessions = await asyncio.gather(*(
+            _run_session(url, task, run, work_dir, registry, semaphore, options)
+            for run in range(repeat) for task in tasks
+        ))
+    finally:
+        if pool is not None:
+            await pool.close()
+        await close_async_clients()
+    wall = time.time() - started
+
+    iterations = sum(session["iterations"] for session in sessions)
+    log_bytes = sum(session["log_bytes"] for session in sessions)
+    return {
+        "concurrency": concurrency,
+        "sessions": len(sessions),
+        "passed": sum(session["passed"] for session in sessions),
+        "unexpected": [
+            {key: session[key] for key in ("task", "run", "passed", "iterations", "expected_iterations")}
+            for session in sessions if not session["ok"]
+        ],
+        "wall_seconds": round(wall, 3),
+        "iterations": iterations,
+        "iterations_per_second": round(iterations / wall, 3) if wall else 0.0,
+        "sessions_per_second": round(len(sessions) / wall, 3) if wall else 0.0,
+        "latency_seconds": _summary([session["seconds"] for session in sessions]),
+        "subprocess_seconds": _summary([value for session in sessions for value in session["execution_seconds"]]),
+        "llm_seconds": _summary([value for session in sessions for value in session["llm_seconds"]]),
+        "ttft_seconds": _summary([value for session in sessions for value in session["ttft_seconds"]]),
+        "log_bytes": log_bytes,
+        "log_bytes_per_iteration": round(log_bytes / iterations, 1) if iterations else 0.0,
+        "prometheus": registry.prometheus_text(),
+    }
+
+
+######################################################################
+# 2) Whole benchmark and baseline comparison
+######################################################################
+def run_benchmark(tasks, concurrency_levels=(1, 4), repeat=1, token_rate=200.0, ttft=0.05, slots=0,
+                  pool_size=0, agent_options=None, quiet=True):
+    """
+    Starts the stand-in server, runs each concurrency level and returns the report.
+    """
+    standin = StandInLLM(tasks, token_rate=token_rate, ttft=ttft, slots=slots)
+    server = StandInServer(standin).start()
+    work_dir = tempfile.mkdtemp(prefix="bugout-bench-")
+    levels = []
+    try:
+        for concurrency in concurrency_levels:
+            standin.reset()
+            # The agent prints every streamed token; keep the benchmark's own output readable
+            with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+                level = asyncio.run(run_level(
+                    server.url, tasks, concurrency, repeat, os.path.join(work_dir, f"c{concurrency}"),
+                    agent_options, pool_size
+                ))
+            levels.append(level)
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "settings": {
+            "tasks": [task["name"] for task in tasks], "repeat": repeat, "token_rate": token_rate, "ttft": ttft,
+            "slots": slots, "interpreter_pool": pool_size, "python": sys.version.split()[0],
+        },
+        "levels": levels,
+        "server": standin.stats(),
+    }
+
+
+def compare(report, baseline, tolerance=0.25):
+    """
+    Regressions of `report` against `baseline` (matched by concurrency), as messages.
+    """
+    regressions = []
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    checks = (
+        # (metric, lower is better)
+        (("iterations_per_second",), False),
+        (("latency_seconds", "p95"), True),
+        (("log_bytes_per_iteration",), True),
+    )
+    for level in report["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        for path, lower_is_better in checks:
+            old, new = before, level
+            for key in path:
+                old, new = (old or {}).get(key), (new or {}).get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > tolerance) if lower_is_better else (change < -tolerance):
+                regressions.append(
+                    f"concurrency {level['concurrency']}: {'.'.join(path)} {old} -> {new} ({change:+.0%})"
+                )
+    return regressions
+
+
+######################################################################
+# 3) Command line
+######################################################################
+def _print_report(report):
+    print(f"{'conc':>4} {'sessions':>8} {'passed':>6} {'it/s':>7} {'p50 s':>7} {'p95 s':>7} "
+          f"{'subproc p50':>11} {'ttft p50':>8} {'log B/it':>8}")
+    for level in report["levels"]:
+        print(
+            f"{level['concurrency']:>4} {level['sessions']:>8} {level['passed']:>6} "
+            f"{level['iterations_per_second']:>7.2f} {level['latency_seconds'].get('p50', 0):>7.2f} "
+            f"{level['latency_seconds'].get('p95', 0):>7.2f} {level['subprocess_seconds'].get('p50', 0):>11.3f} "
+            f"{level['ttft_seconds'].get('p50', 0):>8.3f} {level['log_bytes_per_iteration']:>8.0f}"
+        )
+        for session in level["unexpected"]:
+            print(f"     UNEXPECTED: {session}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the BugOut agent loop against a stand-in LLM server.")
+    parser.add_argument("--concurrency", default="1,4", help="comma-separated concurrency levels")
+    parser.add_argument("--repeat", type=int, default=1, help="runs of each task per level")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="streamed tokens per second per request")
+    parser.add_argument("--ttft", type=float, default=0.05, help="seconds to the first token")
+    parser.add_argument("--slots", type=int, default=0, help="requests the server streams at once (0 = no cap)")
+    parser.add_argument("--pool", type=int, default=0, help="run scripts in an InterpreterPool of this size")
+    parser.add_argument("--corpus", help="JSON task file (default: the built-in tasks)")
+    parser.add_argument("--recorded", help="replay the sessions of an agent event log")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare against an earlier --json report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    if args.recorded:
+        tasks = tasks_from_log(args.recorded)
+    elif args.corpus:
+        tasks = load_corpus(args.corpus)
+    else:
+        tasks = BUILTIN_TASKS
+    report = run_benchmark(
+        tasks, [int(level) for level in args.concurrency.split(",")], repeat=args.repeat,
+        token_rate=args.token_rate, ttft=args.ttft, slots=args.slots, pool_size=args.pool
+    )
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failed = any(level["unexpected"] for level in report["levels"])
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# standin_api.py
+"""
+Stand-in for the /generate servers in llm/: the same routes and chunked
+text streaming as llm/deepseek_lite_api.py, but replies are replayed from a
+task corpus (benchmark/corpus.py) at a configurable time to first token and
+token rate, so the agent loop can be benchmarked without a GPU or model.
+
+Each session's user request carries a "[benchmark session <task>#<run>]"
+tag (see tag_request); its code requests get that task's replies in order
+(the last one repeats). Helper requests get canned replies.
+
+Run standalone: python -m benchmark.standin_api (BUGOUT_STANDIN_* settings below).
+"""
+import os
+import re
+import threading
+import time
+
+from flask import Flask, request, Response, stream_with_context, jsonify
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+SESSION_TAG = re.compile(r"\n*\[benchmark session ([^\]\s]+)\]")
+# Average characters per streamed token
+CHARS_PER_TOKEN = 4
+
+ANALYZER_REPLY = "[BOOL] TRUE [/BOOL]\n[SUMMARY]The unit tests ran and passed.[/SUMMARY]"
+SUMMARY_SENTENCE = "The attempt failed with the error shown; the next version must handle that case. "
+
+
+def tag_request(request_text, task_name, run):
+    """
+    The user request for run `run` of a task, tagged so the server knows
+    which replies to send.
+    """
+    return f"{SESSION_TAG.sub('', request_text)}\n\n[benchmark session {task_name}#{run}]"
+
+
+def split_tokens(text):
+    """
+    Splits text into token-sized pieces of about CHARS_PER_TOKEN characters.
+    """
+    return [text[index:index + CHARS_PER_TOKEN] for index in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+######################################################################
+# 1) StandInLLM: reply selection and paced streaming
+######################################################################
+class StandInLLM:
+    """
+    Replays `tasks` with a time to first token of `ttft` seconds and
+    `token_rate` tokens per second per request. `slots` > 0 caps the
+    requests streaming at once (like a server's batch size); the rest queue.
+    """
+
+    def __init__(self, tasks, token_rate=100.0, ttft=0.2, summary_tokens=100, slots=0):
+        self.tasks = {task["name"]: task for task in tasks}
+        self.token_rate = token_rate
+        self.ttft = ttft
+        self.summary_tokens = summary_tokens
+        self._slots = threading.BoundedSemaphore(slots) if slots > 0 else None
+
+        self._lock = threading.Lock()
+        self._next_reply = {}  # session key -> index of its next code reply
+        self.counters = {
+            "code_requests": 0, "helper_requests": 0, "unknown_sessions": 0, "tokens": 0,
+            "queued": 0, "streaming": 0,
+        }
+
+    def reply_for(self, data):
+        """
+        The text to stream for a /generate body.
+        """
+        constraint = data.get("constraint") or ""
+        if constraint.startswith("[BOOL]"):
+            self._count("helper_requests")
+            return ANALYZER_REPLY
+        if "```" not in constraint:
+            self._count("helper_requests")
+            sentences = max(1, self.summary_tokens * CHARS_PER_TOKEN // len(SUMMARY_SENTENCE))
+            return SUMMARY_SENTENCE * sentences
+
+        self._count("code_requests")
+        key = self._session_key(data["messages"])
+        task = self.tasks.get(key.split("#", 1)[0]) if key else None
+        if task is None:
+            self._count("unknown_sessions")
+            return "No scripted reply for this session.\n```python\nraise SystemExit('unknown benchmark session')\n```"
+        with self._lock:
+            index = self._next_reply.get(key, 0)
+            self._next_reply[key] = index + 1
+        return task["replies"][min(index, len(task["replies"]) - 1)]
+
+    def stream(self, text):
+        """
+        Yields `text` token by token on the configured schedule.
+        """
+        self._count("queued")
+        if self._slots is not None:
+            self._slots.acquire()
+        self._count("queued", -1)
+        self._count("streaming")
+        try:
+            started = time.time() + self.ttft
+            for index, token in enumerate(split_tokens(text)):
+                # Token i is due at ttft + i / token_rate; a late thread catches up without sleeping
+                delay = started + index / self.token_rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                self._count("tokens")
+                yield token
+        finally:
+            self._count("streaming", -1)
+            if self._slots is not None:
+                self._slots.release()
+
+    def reset(self):
+        with self._lock:
+            self._next_reply.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, sessions=len(self._next_reply), token_rate=self.token_rate, ttft=self.ttft)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    @staticmethod
+    def _session_key(messages):
+        for message in messages:
+            if message.get("role") == "user":
+                match = SESSION_TAG.search(message.get("content", ""))
+                if match:
+                    return match.group(1)
+        return None
+
+
+######################################################################
+# 2) Flask app with the servers' routes
+######################################################################
+def create_app(standin):
+    app = Flask(__name__)
+
+    @app.route('/generate', methods=['POST'])
+    def generate():
+        """
+        Returns a chunked stream of the scripted reply.
+        """
+        data = request.get_json()
+        if "messages" not in data or not isinstance(data["messages"], list):
+            return jsonify({"error": "Invalid input format. 'messages' must be a list."}), 400
+        return Response(stream_with_context(standin.stream(standin.reply_for(data))), mimetype="text/plain")
+
+    @app.route('/tokenize', methods=['POST'])
+    def tokenize():
+        """
+        Prompt length estimate (the stand-in has no tokenizer).
+        """
+        data = request.get_json()
+        if "messages" not in data or not isinstance(data["messages"], list):
+            return jsonify({"error": "Invalid input format. 'messages' must be a list."}), 400
+        characters = sum(len(message.get("content", "")) for message in data["messages"])
+        return jsonify({"tokens": characters // CHARS_PER_TOKEN + 4 * len(data["messages"])})
+
+    @app.route('/health', methods=['GET'])
+    def health():
+        return jsonify({"state": "ready", "error": None}), 200
+
+    @app.route('/ready', methods=['GET'])
+    def ready():
+        return jsonify({"state": "ready"}), 200
+
+    @app.route('/stats', methods=['GET'])
+    def stats():
+        return jsonify(standin.stats())
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        stats = standin.stats()
+        lines = []
+        for name, key, kind in (
+            ("bugout_server_queue_depth", "queued", "gauge"),
+            ("bugout_server_batch_size", "streaming", "gauge"),
+            ("bugout_server_decode_tokens_total", "tokens", "counter"),
+        ):
+            lines += [f"# TYPE {name} {kind}", f'{name}{{model="standin"}} {stats[key]}']
+        return Response("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    return app
+
+
+######################################################################
+# 3) StandInServer: the app on a background thread
+######################################################################
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class StandInServer:
+    """
+    Serves a StandInLLM on host:port (0 = any free port) from a background
+    thread; `url` is its /generate endpoint.
+    """
+
+    def __init__(self, standin, host="127.0.0.1", port=0):
+        self.standin = standin
+        self._server = make_server(host, port, create_app(standin), threaded=True, request_handler=_QuietHandler)
+        self.url = f"http://{host}:{self._server.server_port}/generate"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="standin-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+
+
+if __name__ == '__main__':
+    from benchmark.corpus import BUILTIN_TASKS, load_corpus
+
+    corpus = os.environ.get("BUGOUT_STANDIN_CORPUS")
+    standin = StandInLLM(
+        load_corpus(corpus) if corpus else BUILTIN_TASKS,
+        token_rate=float(os.environ.get("BUGOUT_STANDIN_TOKEN_RATE", "100")),
+        ttft=float(os.environ.get("BUGOUT_STANDIN_TTFT", "0.2")),
+        slots=int(os.environ.get("BUGOUT_STANDIN_SLOTS", "0"))
+    )
+    create_app(standin).run(host='0.0.0.0', port=int(os.environ.get("BUGOUT_STANDIN_PORT", "5000")), threaded=True)
@@ -0,0 +1,229 @@
+# constraints.py
+"""
+Template-constrained decoding for the /generate API.
+
+A request may send a `constraint` template that its output must follow:
+  - plain text must appear verbatim,
+  - `{A|B}` must be exactly one of the listed options,
+  - `{*}` is free text, `{*N}` free text of at most N characters,
+  - `{{` and `}}` stand for literal braces.
+
+Free text must be followed by plain text (or end the template): the model
+writes freely until it produces that text itself, or is forced to once the
+character limit is reached. End-of-sequence is only allowed once the whole
+template is complete, and is forced right after it.
+
+Example: "[BOOL] {TRUE|FALSE} [/BOOL]\n[SUMMARY]{*800}[/SUMMARY]"
+"""
+import threading
+import weakref
+
+import torch
+from transformers import LogitsProcessor, LogitsProcessorList
+
+
+######################################################################
+# 1) HELPER: Parse a constraint template
+######################################################################
+def parse_template(template):
+    """
+    Splits a template into ("literal", text), ("choice", [options]) and
+    ("free", max_chars or None) parts. Raises ValueError on a malformed template.
+    """
+    if not isinstance(template, str) or not template:
+        raise ValueError("'constraint' must be a non-empty string.")
+
+    parts = []
+    literal = []
+    i = 0
+    while i < len(template):
+        char = template[i]
+        if template.startswith("{{", i) or template.startswith("}}", i):
+            literal.append(char)
+            i += 2
+            continue
+        if char == "}":
+            raise ValueError("Unbalanced '}' in constraint template.")
+        if char != "{":
+            literal.append(char)
+            i += 1
+            continue
+
+        end = template.find("}", i)
+        if end < 0:
+            raise ValueError("Unbalanced '{' in constraint template.")
+        if literal:
+            parts.append(("literal", "".join(literal)))
+            literal = []
+        body = template[i + 1:end]
+        if body.startswith("*"):
+            limit = body[1:]
+            if limit and not limit.isdigit():
+                raise ValueError(f"Invalid free-text limit '{{{body}}}' in constraint template.")
+            parts.append(("free", int(limit) if limit else None))
+        else:
+            options = body.split("|")
+            if not all(options):
+                raise ValueError(f"Empty option in '{{{body}}}' of constraint template.")
+            parts.append(("choice", options))
+        i = end + 1
+    if literal:
+        parts.append(("literal", "".join(literal)))
+
+    for index, (kind, _) in enumerate(parts):
+        if kind == "free" and index + 1 < len(parts) and parts[index + 1][0] != "literal":
+            raise ValueError("Free text in a constraint template must be followed by plain text.")
+    return parts
+
+
+######################################################################
+# 2) HELPER: Work out what may come next after the text generated so far
+######################################################################
+def next_allowed(parts, text):
+    """
+    Returns (mode, continuations):
+      - ("force", [strings]): the output must continue with a prefix of one of these
+      - ("free", allow_eos): anything may follow; EOS only if allow_eos
+      - ("end", None): the template is complete, only EOS may follow
+    """
+    pos = 0
+    for index, (kind, value) in enumerate(parts):
+        rest = text[pos:]
+        if kind == "literal":
+            if rest.startswith(value):
+                pos += len(value)
+                continue
+            if value.startswith(rest):
+                return "force", [value[len(rest):]]
+            return "free", True  # diverged (should not happen); stop constraining
+
+        if kind == "choice":
+            complete = [option for option in value if rest.startswith(option)]
+            if complete:
+                pos += len(max(complete, key=len))
+                continue
+            live = [option[len(rest):] for option in value if option.startswith(rest)]
+            if live:
+                return "force", live
+            return "free", True
+
+        # Free text runs until the following literal shows up
+        if index + 1 == len(parts):
+            return "free", True
+        terminator = parts[index + 1][1]
+        found = rest.find(terminator)
+        if found >= 0:
+            pos += found
+            continue
+        if value is not None and len(rest) >= value:
+            written = _partial_suffix(rest, terminator)
+            return "force", [terminator[written:]]
+        return "free", False
+
+    return "end", None
+
+
+def _partial_suffix(text, terminator):
+    """Length of the longest suffix of text that is a prefix of terminator."""
+    for length in range(min(len(text), len(terminator) - 1), 0, -1):
+        if terminator.startswith(text[-length:]):
+            return length
+    return 0
+
+
+######################################################################
+# 3) HELPER: Token text index (built once per tokenizer)
+######################################################################
+# Weakly keyed, so an index goes away with its tokenizer (e.g. an evicted model)
+_TOKEN_INDEXES = weakref.WeakKeyDictionary()
+_TOKEN_INDEX_LOCK = threading.Lock()
+
+
+def _token_index(tokenizer):
+    """
+    Maps decoded token text -> token ids, skipping special and partial-byte tokens.
+    """
+    with _TOKEN_INDEX_LOCK:
+        if tokenizer not in _TOKEN_INDEXES:
+            special_ids = set(tokenizer.all_special_ids)
+            index = {}
+            for token_id in range(len(tokenizer)):
+                if token_id in special_ids:
+                    continue
+                text = tokenizer.decode([token_id], clean_up_tokenization_spaces=False)
+                if not text or "\ufffd" in text:
+                    continue
+                index.setdefault(text, []).append(token_id)
+            max_len = max((len(text) for text in index), default=1)
+            _TOKEN_INDEXES[tokenizer] = (index, max_len)
+        return _TOKEN_INDEXES[tokenizer]
+
+
+######################################################################
+# 4) TemplateLogitsProcessor: mask every token that would break the template
+######################################################################
+class TemplateLogitsProcessor(LogitsProcessor):
+    """
+    Applies a parsed constraint template to each row of `input_ids`.
+
+    The generated text is decoded incrementally per row, so long free-text
+    segments do not re-decode the whole output on every step.
+    """
+
+    def __init__(self, tokenizer, parts, eos_token_ids, prompt_length=0):
+        self.tokenizer = tokenizer
+        self.parts = parts
+        self.eos_token_ids = list(eos_token_ids)
+        self.prompt_length = prompt_length
+        self.index, self.max_token_len = _token_index(tokenizer)
+        self._decoded = {}  # row -> (ids decoded so far, text)
+
+    def __call__(self, input_ids, scores):
+        scores = scores.clone()
+        for row in range(input_ids.shape[0]):
+            mode, value = next_allowed(self.parts, self._generated_text(row, input_ids[row]))
+            if mode == "free":
+                if not value:
+                    scores[row, self.eos_token_ids] = float("-inf")
+                continue
+
+            if mode == "end":
+                allowed = self.eos_token_ids
+            else:
+                allowed = set()
+                for continuation in value:
+                    for length in range(1, min(len(continuation), self.max_token_len) + 1):
+                        allowed.update(self.index.get(continuation[:length], ()))
+                allowed = sorted(allowed)
+            if not allowed:
+                continue  # nothing in the vocabulary fits; leave the row unconstrained
+
+            mask = torch.full_like(scores[row], float("-inf"))
+            mask[allowed] = 0
+            scores[row] = scores[row] + mask
+        return scores
+
+    def _generated_text(self, row, row_ids):
+        generated = row_ids[self.prompt_length:].tolist()
+        done_ids, text = self._decoded.get(row, (0, ""))
+        if done_ids > len(generated):
+            done_ids, text = 0, ""
+        tail = self.tokenizer.decode(
+            generated[done_ids:],
+            skip_special_tokens=True,
+            clean_up_tokenization_spaces=False
+        )
+        # Only commit text that does not end in a partially decoded character
+        if "\ufffd" not in tail:
+            self._decoded[row] = (len(generated), text + tail)
+        return text + tail
+
+
+def build_logits_processor(tokenizer, constraint, eos_token_ids, prompt_length=0):
+    """
+    Returns a LogitsProcessorList enforcing the constraint template, or None without one.
+    """
+    if not constraint:
+        return None
+    parts = parse_template(constraint)
+    return LogitsProcessorList([TemplateLogitsProcessor(tokenizer, parts, eos_token_ids, prompt_length)])
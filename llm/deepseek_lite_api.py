@@ -1,19 +1,43 @@
 # deepseek_lite_api.py
 from flask import Flask, request, Response, stream_with_context, jsonify
-from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer
 import torch
-import threading
+import os
+from worker import ModelWorker, stream_tokens
+from metrics import render_metrics, CONTENT_TYPE
 
-# Initialize tokenizer + model as before
-tokenizer = AutoTokenizer.from_pretrained(
-    "deepseek-ai/DeepSeek-Coder-V2-Lite-Instruct",
-    trust_remote_code=True
+# Continuous batching knobs
+MAX_BATCH_SIZE = int(os.environ.get("BUGOUT_MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.environ.get("BUGOUT_MAX_WAIT_MS", "10"))
+
+# Defaults for any generation field a request leaves out
+GENERATION_DEFAULTS = dict(
+    max_new_tokens=8192,
+    do_sample=True,
+    top_k=50,
+    top_p=0.95
 )
-model = AutoModelForCausalLM.from_pretrained(
+MAX_NEW_TOKENS = int(os.environ.get("BUGOUT_MAX_NEW_TOKENS", "8192"))
+
+# Prefix KV-cache memory cap (0 disables reuse of shared prompt prefixes)
+PREFIX_CACHE_MB = int(os.environ.get("BUGOUT_PREFIX_CACHE_MB", "2048"))
+
+# Placement: "auto" uses the GPU when there is one; BUGOUT_INT8=1 quantizes on CPU-only hosts
+DEVICE = os.environ.get("BUGOUT_DEVICE", "auto")
+INT8 = os.environ.get("BUGOUT_INT8", "0") == "1"
+
+# Load tokenizer + model in the background so the server binds immediately
+worker = ModelWorker(
     "deepseek-ai/DeepSeek-Coder-V2-Lite-Instruct",
+    generation_defaults=GENERATION_DEFAULTS,
     trust_remote_code=True,
-    torch_dtype=torch.bfloat16
-).cuda()
+    torch_dtype=torch.bfloat16,
+    device=DEVICE,
+    quantize_int8=INT8,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_WAIT_MS,
+    prefix_cache_mb=PREFIX_CACHE_MB,
+    max_new_tokens=MAX_NEW_TOKENS
+).start()
 
 app = Flask(__name__)
 
@@ -28,52 +52,71 @@ def generate():
         data = request.get_json()
         if "messages" not in data or not isinstance(data["messages"], list):
             return jsonify({"error": "Invalid input format. 'messages' must be a list."}), 400
-        
-        messages = data["messages"]
-
-        # Prepare the model inputs
-        inputs = tokenizer.apply_chat_template(
-            messages,
-            add_generation_prompt=True,
-            return_tensors="pt"
-        ).to(model.device)
-
-        # Create the streamer
-        streamer = TextIteratorStreamer(
-            tokenizer=tokenizer,
-            skip_prompt=True,
-            skip_special_tokens=True
-        )
-
-        # Our generation kwargs
-        generation_kwargs = dict(
-            inputs=inputs,
-            max_new_tokens=8192,
-            do_sample=True,
-            top_k=50,
-            top_p=0.95,
-            num_return_sequences=1,
-            eos_token_id=tokenizer.eos_token_id,
-            streamer=streamer
-        )
-
-        # We'll generate in a separate thread
-        generation_thread = threading.Thread(target=model.generate, kwargs=generation_kwargs)
-        generation_thread.start()
-
-        def token_stream():
-            # As tokens appear in the streamer, yield them to the client
-            for new_token in streamer:
-                # You can encode each token as needed; here we just yield raw text
-                yield new_token
-            # Make sure generation is done
-            generation_thread.join()
+
+        if not worker.ready:
+            return jsonify({"error": f"Model is not ready (state: {worker.state})."}), 503
+
+        # Queue the sequence; optional fields: max_new_tokens, sampling, stop, constraint
+        try:
+            gen_request = worker.generate(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         # Return a streaming response so the client sees tokens in real time
-        return Response(stream_with_context(token_stream()), mimetype="text/plain")
+        return Response(stream_with_context(stream_tokens(gen_request)), mimetype="text/plain")
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/tokenize', methods=['POST'])
+def tokenize():
+    """
+    Returns the prompt length in tokens of a /generate body's messages
+    (chat template included), so clients can keep prompts within a budget.
+    """
+    try:
+        data = request.get_json()
+        if "messages" not in data or not isinstance(data["messages"], list):
+            return jsonify({"error": "Invalid input format. 'messages' must be a list."}), 400
+
+        # The tokenizer loads before the weights, so this works while the model is loading
+        if worker.tokenizer is None:
+            return jsonify({"error": f"Tokenizer is not loaded (state: {worker.state})."}), 503
+
+        return jsonify({"tokens": len(worker.encode(data["messages"]))})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/health', methods=['GET'])
+def health():
+    """
+    Liveness: the process is up (and the model has not failed to load).
+    """
+    status = 500 if worker.state == "failed" else 200
+    return jsonify({"state": worker.state, "error": worker.error}), status
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness: the model is loaded and warmed up.
+    """
+    return jsonify({"state": worker.state}), 200 if worker.ready else 503
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Returns load/warm-up timings plus scheduler and prefix-cache counters.
+    """
+    return jsonify(worker.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text exposition of queue depth, batch size, prefill/decode
+    throughput and process/GPU memory.
+    """
+    return Response(render_metrics({worker.model_name: worker}), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
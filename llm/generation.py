@@ -0,0 +1,110 @@
+# generation.py
+"""
+Per-request generation parameters for the /generate API.
+
+Clients may send `max_new_tokens`, `do_sample`, `temperature`, `top_k`,
+`top_p`, `stop` and `constraint` next to `messages`; anything omitted falls
+back to the server's defaults.
+"""
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+from constraints import parse_template
+
+
+######################################################################
+# 1) HELPER: Validate the optional generation fields of a request body
+######################################################################
+def parse_generation_params(data, defaults, max_new_tokens_limit=8192):
+    """
+    Merges the optional generation fields of a JSON request body over the
+    server defaults. Raises ValueError with a client-facing message on bad input.
+    """
+    params = dict(defaults)
+
+    if "max_new_tokens" in data:
+        value = data["max_new_tokens"]
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ValueError("'max_new_tokens' must be a positive integer.")
+        params["max_new_tokens"] = value
+    params["max_new_tokens"] = min(params.get("max_new_tokens", max_new_tokens_limit), max_new_tokens_limit)
+
+    if "do_sample" in data:
+        if not isinstance(data["do_sample"], bool):
+            raise ValueError("'do_sample' must be a boolean.")
+        params["do_sample"] = data["do_sample"]
+
+    if "temperature" in data:
+        value = data["temperature"]
+        if not _is_number(value) or value <= 0:
+            raise ValueError("'temperature' must be a positive number.")
+        params["temperature"] = float(value)
+
+    if "top_k" in data:
+        value = data["top_k"]
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError("'top_k' must be a non-negative integer.")
+        params["top_k"] = value
+
+    if "top_p" in data:
+        value = data["top_p"]
+        if not _is_number(value) or not 0 < value <= 1:
+            raise ValueError("'top_p' must be a number in (0, 1].")
+        params["top_p"] = float(value)
+
+    stop = data.get("stop", [])
+    if isinstance(stop, str):
+        stop = [stop]
+    if not isinstance(stop, list) or not all(isinstance(s, str) and s for s in stop):
+        raise ValueError("'stop' must be a non-empty string or a list of non-empty strings.")
+    params["stop"] = stop
+
+    # Validated here so a bad template is a 400, built per request later
+    constraint = data.get("constraint")
+    if constraint is not None:
+        parse_template(constraint)
+    params["constraint"] = constraint
+
+    return params
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+######################################################################
+# 2) StopStringCriteria: halt as soon as a stop string is generated
+######################################################################
+class StopStringCriteria(StoppingCriteria):
+    """
+    Stops a sequence once its generated text contains one of `stop_strings`.
+    The stop string itself is kept in the output (the client has usually
+    already received it while streaming).
+
+    Only the tail of the generated tokens is decoded on each step, so the
+    check stays cheap for long generations.
+    """
+
+    def __init__(self, tokenizer, stop_strings, prompt_length=0):
+        self.tokenizer = tokenizer
+        self.stop_strings = list(stop_strings)
+        self.prompt_length = prompt_length
+        # Every token decodes to at least one character (special tokens aside),
+        # so this many tokens always cover the longest stop string.
+        self.window = max(len(s) for s in self.stop_strings) + 2
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = []
+        for row in input_ids:
+            tail_ids = row[self.prompt_length:][-self.window:]
+            tail = self.tokenizer.decode(tail_ids, skip_special_tokens=True)
+            done.append(any(stop in tail for stop in self.stop_strings))
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+def build_stopping_criteria(tokenizer, stop_strings, prompt_length=0):
+    """
+    Returns a StoppingCriteriaList for the given stop strings, or None if there are none.
+    """
+    if not stop_strings:
+        return None
+    return StoppingCriteriaList([StopStringCriteria(tokenizer, stop_strings, prompt_length)])
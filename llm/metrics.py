@@ -0,0 +1,138 @@
+# metrics.py
+"""
+Prometheus text exposition (GET /metrics) of the servers' worker counters:
+queue depth, batch size, prefill/decode tokens and throughput, prefix-cache
+and speculative-decoding counters, plus process and GPU memory.
+"""
+import os
+import sys
+
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+######################################################################
+# 1) HELPER: Collect samples grouped by metric name
+######################################################################
+def _escape(label):
+    return str(label).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class _Samples:
+    def __init__(self):
+        self.metrics = {}  # name -> (type, help, [(labels, value)])
+
+    def add(self, name, kind, help_text, value, **labels):
+        if value is None:
+            return
+        self.metrics.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+
+    def render(self):
+        lines = []
+        for name, (kind, help_text, samples) in self.metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {float(value)!r}" if labels else f"{name} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+######################################################################
+# 2) HELPER: Per-model and process samples
+######################################################################
+def _add_worker(samples, name, worker):
+    stats = worker.stats()
+    samples.add("bugout_server_model_ready", "gauge", "1 when the model is loaded and warmed up.",
+                1 if stats["state"] == "ready" else 0, model=name)
+    samples.add("bugout_server_model_memory_bytes", "gauge", "Weights plus prefix-cache cap of the model.",
+                stats["memory_bytes"], model=name)
+    samples.add("bugout_server_load_seconds", "gauge", "Time to load the model.", stats["load_seconds"], model=name)
+
+    if "pending" in stats:
+        for key, metric, kind, help_text in (
+            ("pending", "queue_depth", "gauge", "Requests queued for the batch scheduler."),
+            ("active", "batch_size", "gauge", "Sequences in the running decode batch."),
+            ("max_batch_size", "max_batch_size", "gauge", "Cap on concurrently decoding sequences."),
+            ("mean_batch_size", "mean_batch_size", "gauge", "Mean decode batch size since start."),
+            ("prefill_tokens", "prefill_tokens_total", "counter", "Prompt tokens prefilled (cached prefixes excluded)."),
+            ("prefill_seconds", "prefill_seconds_total", "counter", "Time spent prefilling prompts."),
+            ("prefill_tokens_per_second", "prefill_tokens_per_second", "gauge", "Prefill throughput since start."),
+            ("decode_tokens", "decode_tokens_total", "counter", "Tokens produced by batched decode steps."),
+            ("decode_steps", "decode_steps_total", "counter", "Batched decode steps."),
+            ("decode_seconds", "decode_seconds_total", "counter", "Time spent in decode steps."),
+            ("decode_tokens_per_second", "decode_tokens_per_second", "gauge", "Decode throughput since start."),
+            ("cancelled_requests", "cancelled_requests_total", "counter", "Requests dropped after their client left."),
+        ):
+            samples.add("bugout_server_" + metric, kind, help_text, stats.get(key), model=name)
+
+    prefix_cache = stats.get("prefix_cache")
+    if prefix_cache:
+        samples.add("bugout_server_prefix_cache_hits_total", "counter", "Prefix-cache lookups that reused KV.",
+                    prefix_cache["hits"], model=name)
+        samples.add("bugout_server_prefix_cache_misses_total", "counter", "Prefix-cache lookups without reuse.",
+                    prefix_cache["misses"], model=name)
+        samples.add("bugout_server_prefix_cache_bytes", "gauge", "Memory held by cached prefixes.",
+                    prefix_cache["bytes"], model=name)
+
+    speculative = stats.get("speculative")
+    if speculative:
+        samples.add("bugout_server_speculative_tokens_total", "counter", "Tokens produced by speculative decoding.",
+                    speculative["tokens"], model=name)
+        samples.add("bugout_server_speculative_acceptance_rate", "gauge", "Share of draft tokens accepted.",
+                    speculative["acceptance_rate"], model=name)
+
+
+def _add_memory(samples):
+    # Current RSS from /proc where available; peak RSS everywhere (ru_maxrss is KiB on Linux, bytes on macOS)
+    try:
+        with open("/proc/self/statm", "r") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        samples.add("bugout_server_process_resident_memory_bytes", "gauge", "Resident memory of the server.", rss)
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        samples.add("bugout_server_process_peak_resident_memory_bytes", "gauge", "Peak resident memory of the server.",
+                    peak if sys.platform == "darwin" else peak * 1024)
+
+    if torch.cuda.is_available():
+        for index in range(torch.cuda.device_count()):
+            device = str(index)
+            samples.add("bugout_server_gpu_memory_allocated_bytes", "gauge", "GPU memory held by tensors.",
+                        torch.cuda.memory_allocated(index), device=device)
+            samples.add("bugout_server_gpu_memory_reserved_bytes", "gauge", "GPU memory reserved by the allocator.",
+                        torch.cuda.memory_reserved(index), device=device)
+            samples.add("bugout_server_gpu_memory_total_bytes", "gauge", "Total memory of the GPU.",
+                        torch.cuda.get_device_properties(index).total_memory, device=device)
+
+
+######################################################################
+# 3) render_metrics: the /metrics body
+######################################################################
+def render_metrics(workers, registry=None):
+    """
+    Prometheus text for {model name: ModelWorker}, plus the ModelRegistry's
+    counters when given.
+    """
+    samples = _Samples()
+    for name, worker in workers.items():
+        _add_worker(samples, name, worker)
+    if registry is not None:
+        stats = registry.stats()
+        samples.add("bugout_server_registry_resident_bytes", "gauge", "Memory of the resident models.",
+                    stats["resident_bytes"])
+        samples.add("bugout_server_registry_loads_total", "counter", "Model loads.", stats["loads"])
+        samples.add("bugout_server_registry_evictions_total", "counter", "Models unloaded to make room.",
+                    stats["evictions"])
+        for name, model in stats["models"].items():
+            samples.add("bugout_server_in_flight_requests", "gauge", "Requests holding the model.",
+                        model["in_flight"], model=name)
+    _add_memory(samples)
+    return samples.render()
@@ -0,0 +1,199 @@
+# multi_model_api.py
+from flask import Flask, request, Response, stream_with_context, jsonify
+import torch
+import json
+import os
+import threading
+from transformers import AutoTokenizer
+from registry import ModelRegistry
+from worker import encode_messages, stream_tokens
+from metrics import render_metrics, CONTENT_TYPE
+
+# Shared knobs (same meaning as in deepseek_lite_api.py / qwen_api.py)
+MAX_BATCH_SIZE = int(os.environ.get("BUGOUT_MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.environ.get("BUGOUT_MAX_WAIT_MS", "10"))
+MAX_NEW_TOKENS = int(os.environ.get("BUGOUT_MAX_NEW_TOKENS", "8192"))
+PREFIX_CACHE_MB = int(os.environ.get("BUGOUT_PREFIX_CACHE_MB", "2048"))
+DEVICE = os.environ.get("BUGOUT_DEVICE", "auto")
+INT8 = os.environ.get("BUGOUT_INT8", "0") == "1"
+
+# Registry knobs: summed memory of resident models (0 = no cap), models to load at
+# startup, and how long a request waits for an on-demand load
+MEMORY_BUDGET_MB = int(os.environ.get("BUGOUT_MEMORY_BUDGET_MB", "0"))
+PRELOAD = [name for name in os.environ.get("BUGOUT_PRELOAD", "").split(",") if name]
+LOAD_TIMEOUT_S = float(os.environ.get("BUGOUT_LOAD_TIMEOUT_S", "600"))
+
+# Models served by name; BUGOUT_MODELS_CONFIG may point to a JSON file with the
+# same structure ("torch_dtype" given as a string such as "bfloat16")
+MODELS = {
+    "deepseek-coder-v2-lite": dict(
+        model_name="deepseek-ai/DeepSeek-Coder-V2-Lite-Instruct",
+        trust_remote_code=True,
+        torch_dtype="bfloat16",
+        generation_defaults=dict(max_new_tokens=8192, do_sample=True, top_k=50, top_p=0.95),
+        memory_mb=34000
+    ),
+    "qwen2.5-coder-32b": dict(
+        model_name="Qwen/Qwen2.5-Coder-32B-Instruct",
+        torch_dtype="auto",
+        generation_defaults=dict(max_new_tokens=8192, do_sample=False),
+        memory_mb=68000
+    ),
+}
+if os.environ.get("BUGOUT_MODELS_CONFIG"):
+    with open(os.environ["BUGOUT_MODELS_CONFIG"], "r", encoding="utf-8") as f:
+        MODELS = json.load(f)
+DEFAULT_MODEL = os.environ.get("BUGOUT_DEFAULT_MODEL", next(iter(MODELS)))
+
+
+def build_specs(models):
+    """
+    Fills each model entry with the shared knobs and resolves dtype names.
+    """
+    specs = {}
+    for name, spec in models.items():
+        spec = dict(spec)
+        dtype = spec.get("torch_dtype", "auto")
+        spec["torch_dtype"] = dtype if dtype == "auto" else getattr(torch, dtype)
+        spec.setdefault("device", DEVICE)
+        spec.setdefault("quantize_int8", INT8)
+        spec.setdefault("max_batch_size", MAX_BATCH_SIZE)
+        spec.setdefault("max_wait_ms", MAX_WAIT_MS)
+        spec.setdefault("prefix_cache_mb", PREFIX_CACHE_MB)
+        spec.setdefault("max_new_tokens", MAX_NEW_TOKENS)
+        specs[name] = spec
+    return specs
+
+
+registry = ModelRegistry(build_specs(MODELS), memory_budget_mb=MEMORY_BUDGET_MB, load_timeout=LOAD_TIMEOUT_S)
+registry.preload(PRELOAD)
+
+# Tokenizers for /tokenize, loaded on their own so counting tokens never
+# loads (or evicts) a model
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_tokenizer(name):
+    """
+    The tokenizer of the named model, loaded on first use. Raises KeyError
+    for an unknown name.
+    """
+    spec = registry.specs[name]
+    with _tokenizers_lock:
+        if name not in _tokenizers:
+            _tokenizers[name] = AutoTokenizer.from_pretrained(
+                spec["model_name"], trust_remote_code=spec.get("trust_remote_code", False)
+            )
+        return _tokenizers[name]
+
+
+app = Flask(__name__)
+
+@app.route('/generate', methods=['POST'])
+def generate():
+    """
+    Returns a chunked stream of tokens from the model named in the body's
+    "model" field (DEFAULT_MODEL if omitted). Loads the model on first use.
+    """
+    try:
+        data = request.get_json()
+        if "messages" not in data or not isinstance(data["messages"], list):
+            return jsonify({"error": "Invalid input format. 'messages' must be a list."}), 400
+
+        name = data.get("model", DEFAULT_MODEL)
+        try:
+            worker = registry.acquire(name)
+        except KeyError:
+            return jsonify({"error": f"Unknown model '{name}'. Available: {registry.names()}"}), 404
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 503
+
+        try:
+            gen_request = worker.generate(data)
+        except ValueError as e:
+            registry.release(name)
+            return jsonify({"error": str(e)}), 400
+        except Exception:
+            registry.release(name)
+            raise
+
+        def token_stream():
+            # The model stays resident until this stream ends
+            try:
+                yield from stream_tokens(gen_request)
+            finally:
+                registry.release(name)
+
+        return Response(stream_with_context(token_stream()), mimetype="text/plain")
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/tokenize', methods=['POST'])
+def tokenize():
+    """
+    Returns the prompt length in tokens of a /generate body's messages for
+    the model it names (chat template included), so clients can keep
+    prompts within a budget.
+    """
+    try:
+        data = request.get_json()
+        if "messages" not in data or not isinstance(data["messages"], list):
+            return jsonify({"error": "Invalid input format. 'messages' must be a list."}), 400
+
+        name = data.get("model", DEFAULT_MODEL)
+        try:
+            tokenizer = get_tokenizer(name)
+        except KeyError:
+            return jsonify({"error": f"Unknown model '{name}'. Available: {registry.names()}"}), 404
+        return jsonify({"tokens": len(encode_messages(tokenizer, data["messages"]))})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/models', methods=['GET'])
+def models():
+    """
+    Lists the served models with their residency, state and memory use.
+    """
+    listing = {
+        name: {key: model.get(key) for key in ("resident", "state", "in_flight", "memory_bytes")}
+        for name, model in registry.stats()["models"].items()
+    }
+    return jsonify(listing)
+
+@app.route('/health', methods=['GET'])
+def health():
+    """
+    Liveness: the process is up.
+    """
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness: every model listed in BUGOUT_PRELOAD is loaded and warmed up.
+    """
+    states = {name: model["state"] if model["resident"] else "unloaded"
+              for name, model in registry.stats()["models"].items() if name in PRELOAD}
+    is_ready = all(state == "ready" for state in states.values())
+    return jsonify({"preload": states}), 200 if is_ready else 503
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Returns registry counters plus every resident model's worker stats.
+    """
+    return jsonify(registry.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text exposition of queue depth, batch size, prefill/decode
+    throughput and process/GPU memory.
+    """
+    return Response(render_metrics(registry.workers(), registry), content_type=CONTENT_TYPE)
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000)
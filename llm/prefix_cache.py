@@ -0,0 +1,158 @@
+# prefix_cache.py
+"""
+LRU cache of prompt `past_key_values`, keyed by token-prefix hash.
+
+Every agent call starts with the same SYSTEM_PROMPT and original user request,
+so the scheduler looks up the longest cached prefix of a new prompt and only
+prefills the remaining suffix.
+"""
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+
+class _Entry:
+    def __init__(self, token_ids, cache, size_bytes):
+        self.token_ids = token_ids
+        self.cache = cache
+        self.size_bytes = size_bytes
+        self.keys = set()
+
+
+class PrefixKVCache:
+    """
+    Stores KV caches of previously seen prompts.
+
+    - Prompts are split into `block_size` token blocks and every block boundary
+      is indexed by a chained hash, so any shared prefix (down to one block)
+      can be found with dictionary lookups only.
+    - One stored entry serves all of its prefixes; lookups slice it.
+    - Entries are evicted least-recently-used first once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, max_bytes, block_size=16):
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+
+        self._entries = OrderedDict()  # entry id -> _Entry, oldest first
+        self._index = {}               # prefix hash -> (entry id, prefix length)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_tokens = 0
+
+    def lookup(self, token_ids):
+        """
+        Returns (prefix_length, cache) for the longest cached prefix of token_ids,
+        or (0, None) on a miss. At least one token is always left to prefill.
+        """
+        with self._lock:
+            hashes = self._block_hashes(token_ids, len(token_ids) - 1)
+            for prefix_len, key in reversed(hashes):
+                found = self._index.get(key)
+                if found is None:
+                    continue
+                entry_id, _ = found
+                entry = self._entries[entry_id]
+                # Guard against hash collisions before trusting the entry
+                if entry.token_ids[:prefix_len] != tuple(token_ids[:prefix_len]):
+                    continue
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                self.reused_tokens += prefix_len
+                return prefix_len, _slice_cache(entry.cache, prefix_len)
+
+            self.misses += 1
+            return 0, None
+
+    def insert(self, token_ids, cache):
+        """
+        Stores the KV cache computed for token_ids (a tuple of (key, value) per layer).
+        """
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            hashes = self._block_hashes(token_ids, len(token_ids))
+            if not hashes:
+                return
+            cover_len, last_key = hashes[-1]
+            found = self._index.get(last_key)
+            if found is not None and found[1] == cover_len:
+                self._entries.move_to_end(found[0])
+                return
+
+            if cover_len < len(token_ids):
+                cache = tuple((k[:, :, :cover_len].clone(), v[:, :, :cover_len].clone()) for k, v in cache)
+            size_bytes = sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in cache)
+            if size_bytes > self.max_bytes:
+                return
+
+            entry_id = self._next_id
+            self._next_id += 1
+            entry = _Entry(tuple(token_ids[:cover_len]), cache, size_bytes)
+            self._entries[entry_id] = entry
+            self.total_bytes += size_bytes
+
+            # Newest entry takes over every prefix it covers
+            for prefix_len, key in hashes:
+                previous = self._index.get(key)
+                if previous is not None:
+                    self._release_key(previous[0], key)
+                self._index[key] = (entry_id, prefix_len)
+                entry.keys.add(key)
+
+            while self.total_bytes > self.max_bytes and self._entries:
+                oldest_id = next(iter(self._entries))
+                self._drop(oldest_id)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "reused_tokens": self.reused_tokens,
+            }
+
+    def _block_hashes(self, token_ids, max_len):
+        """
+        Returns [(prefix_length, hash)] for every full block boundary <= max_len.
+        """
+        hashes = []
+        digest = b""
+        for end in range(self.block_size, max_len + 1, self.block_size):
+            block = array("q", token_ids[end - self.block_size:end]).tobytes()
+            digest = hashlib.blake2b(digest + block, digest_size=16).digest()
+            hashes.append((end, digest))
+        return hashes
+
+    def _release_key(self, entry_id, key):
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return
+        entry.keys.discard(key)
+        if not entry.keys:
+            self._drop(entry_id)
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        self.total_bytes -= entry.size_bytes
+        for key in entry.keys:
+            if self._index.get(key, (None,))[0] == entry_id:
+                del self._index[key]
+
+
+def _slice_cache(cache, length):
+    """Views the first `length` positions of a (batch, heads, seq, dim) KV cache."""
+    return tuple((k[:, :, :length], v[:, :, :length]) for k, v in cache)
@@ -1,19 +1,47 @@
 # qwen_api.py
 from flask import Flask, request, Response, stream_with_context, jsonify
-from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer
-import torch
-import threading
+import os
+from worker import ModelWorker, stream_tokens
+from metrics import render_metrics, CONTENT_TYPE
+
+# Continuous batching knobs
+MAX_BATCH_SIZE = int(os.environ.get("BUGOUT_MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.environ.get("BUGOUT_MAX_WAIT_MS", "10"))
+
+# Defaults for any generation field a request leaves out (greedy for Qwen)
+GENERATION_DEFAULTS = dict(
+    max_new_tokens=8192,
+    do_sample=False
+)
+MAX_NEW_TOKENS = int(os.environ.get("BUGOUT_MAX_NEW_TOKENS", "8192"))
+
+# Optional draft model for speculative decoding, e.g. Qwen/Qwen2.5-Coder-0.5B-Instruct
+# (shares Qwen's tokenizer) or deepseek-ai/DeepSeek-Coder-V2-Lite-Instruct
+DRAFT_MODEL = os.environ.get("BUGOUT_DRAFT_MODEL", "")
+
+# Prefix KV-cache memory cap (0 disables reuse of shared prompt prefixes)
+PREFIX_CACHE_MB = int(os.environ.get("BUGOUT_PREFIX_CACHE_MB", "2048"))
+
+# Placement: "auto" uses the GPU when there is one; BUGOUT_INT8=1 quantizes on CPU-only hosts
+DEVICE = os.environ.get("BUGOUT_DEVICE", "auto")
+INT8 = os.environ.get("BUGOUT_INT8", "0") == "1"
 
 # Define the Qwen model name
 model_name = "Qwen/Qwen2.5-Coder-32B-Instruct"
 
-# Load tokenizer and model using device_map="auto" and torch_dtype="auto"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForCausalLM.from_pretrained(
+# Load tokenizer and model in the background so the server binds immediately
+worker = ModelWorker(
     model_name,
+    generation_defaults=GENERATION_DEFAULTS,
     torch_dtype="auto",
-    device_map="auto"
-)
+    device=DEVICE,
+    quantize_int8=INT8,
+    draft_model_name=DRAFT_MODEL or None,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_WAIT_MS,
+    prefix_cache_mb=PREFIX_CACHE_MB,
+    max_new_tokens=MAX_NEW_TOKENS
+).start()
 
 app = Flask(__name__)
 
@@ -27,52 +55,71 @@ def generate():
         data = request.get_json()
         if "messages" not in data or not isinstance(data["messages"], list):
             return jsonify({"error": "Invalid input format. 'messages' must be a list."}), 400
-        
-        messages = data["messages"]
-
-        # Create the prompt text using Qwen's chat template
-        prompt_text = tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True
-        )
-
-        # Tokenize the prompt text and move tensors to the model device
-        model_inputs = tokenizer([prompt_text], return_tensors="pt").to(model.device)
-
-        # Create the streamer for real-time token generation
-        streamer = TextIteratorStreamer(
-            tokenizer=tokenizer,
-            skip_prompt=True,
-            skip_special_tokens=True
-        )
-
-        # Set up generation parameters (adjusted for Qwen)
-        generation_kwargs = dict(
-            **model_inputs,
-            max_new_tokens=8192,
-            #do_sample=True,
-            #top_k=50,
-            #top_p=0.95,
-            num_return_sequences=1,
-            eos_token_id=tokenizer.eos_token_id,
-            streamer=streamer
-        )
-
-        # Generate tokens in a separate thread for streaming response
-        generation_thread = threading.Thread(target=model.generate, kwargs=generation_kwargs)
-        generation_thread.start()
-
-        def token_stream():
-            # Yield tokens as they are generated
-            for new_token in streamer:
-                yield new_token
-            generation_thread.join()
-
-        return Response(stream_with_context(token_stream()), mimetype="text/plain")
+
+        if not worker.ready:
+            return jsonify({"error": f"Model is not ready (state: {worker.state})."}), 503
+
+        # Queue the sequence with the batch scheduler or the speculative generator
+        try:
+            gen_request = worker.generate(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return Response(stream_with_context(stream_tokens(gen_request)), mimetype="text/plain")
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/tokenize', methods=['POST'])
+def tokenize():
+    """
+    Returns the prompt length in tokens of a /generate body's messages
+    (chat template included), so clients can keep prompts within a budget.
+    """
+    try:
+        data = request.get_json()
+        if "messages" not in data or not isinstance(data["messages"], list):
+            return jsonify({"error": "Invalid input format. 'messages' must be a list."}), 400
+
+        # The tokenizer loads before the weights, so this works while the model is loading
+        if worker.tokenizer is None:
+            return jsonify({"error": f"Tokenizer is not loaded (state: {worker.state})."}), 503
+
+        return jsonify({"tokens": len(worker.encode(data["messages"]))})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/health', methods=['GET'])
+def health():
+    """
+    Liveness: the process is up (and the model has not failed to load).
+    """
+    status = 500 if worker.state == "failed" else 200
+    return jsonify({"state": worker.state, "error": worker.error}), status
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness: the model is loaded and warmed up.
+    """
+    return jsonify({"state": worker.state}), 200 if worker.ready else 503
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Returns load/warm-up timings plus scheduler, prefix-cache and
+    speculative-decoding counters.
+    """
+    return jsonify(worker.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text exposition of queue depth, batch size, prefill/decode
+    throughput and process/GPU memory.
+    """
+    return Response(render_metrics({worker.model_name: worker}), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
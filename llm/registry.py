@@ -0,0 +1,143 @@
+# registry.py
+"""
+ModelRegistry: several named models served from one process.
+
+Models are loaded on first use and kept resident; when loading another model
+would exceed the memory budget, the least recently used idle models are
+unloaded first.
+"""
+import threading
+from collections import OrderedDict
+
+from worker import ModelWorker
+
+
+class ModelRegistry:
+    """
+    Maps model names to ModelWorkers.
+
+    - `specs` maps each name to ModelWorker keyword arguments, plus an optional
+      `memory_mb` estimate used before the model has been loaded once.
+    - `memory_budget_mb` caps the summed memory of resident models (0 = no cap).
+    - Callers `acquire()` a worker for the duration of a request and
+      `release()` it afterwards; workers with requests in flight are never evicted.
+    """
+
+    def __init__(self, specs, memory_budget_mb=0, load_timeout=600):
+        self.specs = {name: dict(spec) for name, spec in specs.items()}
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.load_timeout = load_timeout
+
+        self._workers = OrderedDict()  # name -> ModelWorker, least recently used first
+        self._leases = {name: 0 for name in self.specs}
+        self._measured = {}            # name -> bytes seen on the last load
+        self._lock = threading.Lock()
+
+        self.loads = 0
+        self.evictions = 0
+
+    def names(self):
+        return list(self.specs)
+
+    def acquire(self, name):
+        """
+        Returns a ready worker for `name`, loading it (and evicting others) if needed.
+        Raises KeyError for unknown names and RuntimeError if loading fails or times out.
+        """
+        if name not in self.specs:
+            raise KeyError(name)
+
+        with self._lock:
+            worker = self._workers.get(name)
+            if worker is None:
+                self._make_room(name, self._estimate(name))
+                spec = {key: value for key, value in self.specs[name].items() if key != "memory_mb"}
+                worker = ModelWorker(**spec).start()
+                self._workers[name] = worker
+                self.loads += 1
+            self._workers.move_to_end(name)
+            self._leases[name] += 1
+
+        if not worker.wait_until_ready(self.load_timeout):
+            state, error = worker.state, worker.error
+            self.release(name)
+            if state == "failed":
+                with self._lock:
+                    if self._workers.get(name) is worker:
+                        del self._workers[name]
+                raise RuntimeError(f"Model '{name}' failed to load: {error}")
+            raise RuntimeError(f"Model '{name}' is not ready yet (state: {state}).")
+
+        with self._lock:
+            if worker.memory_bytes is not None:
+                self._measured[name] = worker.memory_bytes
+            # The estimate may have been low; trim other idle models if now over budget
+            self._make_room(name, 0)
+        return worker
+
+    def release(self, name):
+        with self._lock:
+            self._leases[name] = max(0, self._leases[name] - 1)
+
+    def preload(self, names):
+        """
+        Starts loading the given models in the background without waiting.
+        """
+        for name in names:
+            threading.Thread(target=self._preload_one, args=(name,), daemon=True).start()
+
+    def workers(self):
+        """
+        Snapshot of the resident workers, by model name.
+        """
+        with self._lock:
+            return dict(self._workers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_budget_bytes": self.memory_budget,
+                "resident_bytes": self._resident_bytes(),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "models": {
+                    name: {
+                        "resident": name in self._workers,
+                        "in_flight": self._leases[name],
+                        **(self._workers[name].stats() if name in self._workers else {}),
+                    }
+                    for name in self.specs
+                },
+            }
+
+    def _preload_one(self, name):
+        try:
+            self.acquire(name)
+        except RuntimeError:
+            return
+        self.release(name)
+
+    def _estimate(self, name):
+        if name in self._measured:
+            return self._measured[name]
+        return int(self.specs[name].get("memory_mb", 0) * 1024 * 1024)
+
+    def _resident_bytes(self):
+        return sum(
+            worker.memory_bytes if worker.memory_bytes is not None else self._estimate(name)
+            for name, worker in self._workers.items()
+        )
+
+    def _make_room(self, keep, needed):
+        """
+        Unloads idle models, least recently used first, until `needed` more bytes fit.
+        """
+        if self.memory_budget <= 0:
+            return
+        for name in list(self._workers):
+            if self._resident_bytes() + needed <= self.memory_budget:
+                return
+            if name == keep or self._leases[name] > 0:
+                continue
+            self._workers.pop(name).unload()
+            self.evictions += 1
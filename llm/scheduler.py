@@ -0,0 +1,496 @@
+# scheduler.py
+"""
+Continuous batching scheduler shared by the /generate servers.
+
+Incoming requests are queued and admitted into a running decode batch between
+steps, so several agents hitting one server share every forward pass instead of
+contending for the model with one `model.generate` thread each. Every sequence
+streams its own text back through a `GenerationRequest.stream()` iterator.
+"""
+import queue
+import threading
+import time
+
+import torch
+import torch.nn.functional as F
+from transformers import DynamicCache
+
+
+######################################################################
+# 1) HELPER: Convert between legacy KV tuples and Cache objects
+######################################################################
+def to_legacy_cache(past_key_values):
+    """
+    Returns past_key_values as a tuple of (key, value) tensors per layer,
+    whatever Cache class the installed transformers version handed back.
+    """
+    if isinstance(past_key_values, (tuple, list)):
+        return tuple((layer[0], layer[1]) for layer in past_key_values)
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return tuple((layer.keys, layer.values) for layer in past_key_values.layers)
+
+
+def from_legacy_cache(legacy):
+    """
+    Builds a DynamicCache from a tuple of (key, value) tensors per layer.
+    """
+    cache = DynamicCache()
+    for layer_idx, (key, value) in enumerate(legacy):
+        cache.update(key, value, layer_idx)
+    return cache
+
+
+######################################################################
+# 2) HELPER: Sample the next token for one sequence
+######################################################################
+def sample_next_token(logits, do_sample=False, temperature=1.0, top_k=0, top_p=1.0):
+    """
+    Picks the next token id from a 1-D logits vector, either greedily or by
+    temperature / top-k / top-p sampling (same semantics as `model.generate`).
+    """
+    if not do_sample:
+        return int(torch.argmax(logits))
+
+    logits = logits.float() / max(temperature, 1e-5)
+    if top_k and top_k > 0:
+        kth_value = torch.topk(logits, min(top_k, logits.size(-1))).values[-1]
+        logits = logits.masked_fill(logits < kth_value, float("-inf"))
+    if top_p < 1.0:
+        sorted_logits, sorted_idx = torch.sort(logits, descending=True)
+        cumulative = torch.softmax(sorted_logits, dim=-1).cumsum(dim=-1)
+        # Drop tokens once the cumulative mass (excluding themselves) passes top_p
+        remove = cumulative - torch.softmax(sorted_logits, dim=-1) > top_p
+        logits[sorted_idx[remove]] = float("-inf")
+    probs = torch.softmax(logits, dim=-1)
+    return int(torch.multinomial(probs, num_samples=1))
+
+
+######################################################################
+# 3) GenerationRequest: one sequence travelling through the scheduler
+######################################################################
+class GenerationRequest:
+    """
+    Holds the prompt ids and sampling settings of a single request, plus the
+    queue its generated text is streamed through.
+    """
+
+    _FINISHED = object()
+
+    def __init__(self, input_ids, max_new_tokens=8192, do_sample=False,
+                 temperature=1.0, top_k=0, top_p=1.0, stopping_criteria=None,
+                 logits_processor=None):
+        self.input_ids = list(input_ids)
+        self.max_new_tokens = max_new_tokens
+        self.do_sample = do_sample
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        # Optional StoppingCriteriaList / LogitsProcessorList, called with the generated ids only
+        self.stopping_criteria = stopping_criteria
+        self.logits_processor = logits_processor
+
+        self.output_ids = []
+        self.next_token = None
+        self.finished = False
+        self.cancelled = threading.Event()
+        self.error = None
+        self.submitted_at = time.time()
+
+        self._chunks = queue.Queue()
+        self._token_cache = []
+        self._print_len = 0
+
+    def push_token(self, tokenizer, token_id):
+        """
+        Records a generated token and emits whatever text became printable.
+        """
+        self.output_ids.append(token_id)
+        self.next_token = token_id
+        self._token_cache.append(token_id)
+        text = tokenizer.decode(self._token_cache, skip_special_tokens=True)
+        # Hold back incomplete multi-byte characters until the next token
+        if text.endswith("\ufffd"):
+            return
+        if text.endswith("\n"):
+            self._emit(text[self._print_len:])
+            self._token_cache = []
+            self._print_len = 0
+        else:
+            self._emit(text[self._print_len:])
+            self._print_len = len(text)
+
+    def cancel(self):
+        """
+        Flags the request as abandoned; the scheduler drops it before its next step.
+        """
+        self.cancelled.set()
+
+    def finish(self, tokenizer=None, error=None):
+        """
+        Flushes any held-back text and closes the stream.
+        """
+        if self.finished:
+            return
+        if tokenizer is not None and self._token_cache:
+            text = tokenizer.decode(self._token_cache, skip_special_tokens=True)
+            self._emit(text[self._print_len:])
+        self.finished = True
+        self.error = error
+        self._chunks.put(self._FINISHED)
+
+    def stream(self):
+        """
+        Yields text chunks as the scheduler produces them.
+        """
+        while True:
+            chunk = self._chunks.get()
+            if chunk is self._FINISHED:
+                break
+            yield chunk
+        if self.error is not None:
+            raise RuntimeError(f"Generation failed: {self.error}")
+
+    def _emit(self, text):
+        if text:
+            self._chunks.put(text)
+
+
+######################################################################
+# 4) BatchScheduler: request queue + continuous decode batch
+######################################################################
+class BatchScheduler:
+    """
+    Runs a single decode loop over all active sequences.
+
+    - New requests are prefilled on their own, then their KV cache is
+      left-padded and concatenated into the running batch.
+    - Finished sequences are dropped from the batch after every step.
+    - `max_batch_size` caps the number of concurrently decoding sequences.
+    - `max_wait_ms` is how long an idle scheduler waits to gather more requests
+      before starting a new batch; a busy one admits new requests immediately.
+    - An optional PrefixKVCache lets prompts sharing a prefix prefill only
+      their new suffix.
+    - Cancelled requests (client disconnected) are dropped before the next
+      step; the decode budget they leave unused is counted as saved.
+    - Prefill and decode tokens and time are counted for /stats and /metrics.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=8, max_wait_ms=10, eos_token_id=None,
+                 prefix_cache=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.prefix_cache = prefix_cache
+        self.prefill_tokens = 0
+        self.prefill_seconds = 0.0
+        self.decode_tokens = 0     # one per active sequence per step, so / decode_steps = mean batch size
+        self.decode_steps = 0
+        self.decode_seconds = 0.0
+        self.cancelled_requests = 0
+        # Unused max_new_tokens of cancelled requests: an upper bound on the tokens
+        # cancellation saved, since most would have stopped at EOS earlier
+        self.tokens_budget_released = 0
+
+        if eos_token_id is None:
+            eos_token_id = tokenizer.eos_token_id
+        if isinstance(eos_token_id, int):
+            eos_token_id = [eos_token_id]
+        self.eos_token_ids = set(eos_token_id or [])
+
+        self.pending = queue.Queue()
+        self.active = []
+        self._cache = None           # tuple of (key, value) per layer, batch-first
+        self._attention_mask = None  # (batch, cache_len), 0 marks left padding
+
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name="batch-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Ends the scheduler loop; requests still queued or decoding are failed.
+        """
+        self._stopped = True
+        self.pending.put(None)  # wake an idle loop
+
+    def submit(self, gen_request):
+        """
+        Queues a GenerationRequest and returns it so the caller can stream it.
+        """
+        self.pending.put(gen_request)
+        return gen_request
+
+    def stats(self):
+        stats = {
+            "active": len(self.active),
+            "pending": self.pending.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "prefill_tokens": self.prefill_tokens,
+            "prefill_seconds": self.prefill_seconds,
+            "prefill_tokens_per_second": self.prefill_tokens / self.prefill_seconds if self.prefill_seconds else 0.0,
+            "decode_tokens": self.decode_tokens,
+            "decode_steps": self.decode_steps,
+            "decode_seconds": self.decode_seconds,
+            "decode_tokens_per_second": self.decode_tokens / self.decode_seconds if self.decode_seconds else 0.0,
+            "mean_batch_size": self.decode_tokens / self.decode_steps if self.decode_steps else 0.0,
+            "cancelled_requests": self.cancelled_requests,
+            "tokens_budget_released": self.tokens_budget_released,
+        }
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = self.prefix_cache.stats()
+        return stats
+
+    # ------------------------------------------------------------------
+    # Scheduler loop
+    # ------------------------------------------------------------------
+    def _loop(self):
+        while not self._stopped:
+            new_requests = self._collect_new_requests()
+            try:
+                with torch.no_grad():
+                    for gen_request in new_requests:
+                        self._admit(gen_request)
+                    self._drop_cancelled()
+                    if self.active:
+                        self._decode_step()
+            except Exception as e:
+                for gen_request in self.active + new_requests:
+                    gen_request.finish(self.tokenizer, error=str(e))
+                self._reset_batch()
+
+        leftover = list(self.active)
+        while not self.pending.empty():
+            leftover.append(self.pending.get_nowait())
+        for gen_request in leftover:
+            if gen_request is not None:
+                gen_request.finish(self.tokenizer, error="Scheduler stopped.")
+        self._reset_batch()
+
+    def _collect_new_requests(self):
+        """
+        Blocks while idle; otherwise takes whatever is queued without waiting.
+        """
+        free_slots = self.max_batch_size - len(self.active)
+        collected = []
+        if free_slots <= 0:
+            return collected
+
+        if not self.active:
+            first = self.pending.get()
+            if first is None:
+                return collected
+            collected.append(first)
+            deadline = time.time() + self.max_wait
+            while len(collected) < free_slots:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    collected.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        else:
+            while len(collected) < free_slots:
+                try:
+                    collected.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+        # Drop stop() wake-ups
+        return [gen_request for gen_request in collected if gen_request is not None]
+
+    def _admit(self, gen_request):
+        """
+        Prefills one request (reusing a cached prefix when possible) and merges
+        its KV cache into the running batch.
+        """
+        if gen_request.cancelled.is_set():
+            self._record_cancellation(gen_request)
+            return
+
+        started = time.time()
+        device = self.model.device
+        prompt_len = len(gen_request.input_ids)
+        prefix_len, prefix = 0, None
+        if self.prefix_cache is not None:
+            prefix_len, prefix = self.prefix_cache.lookup(gen_request.input_ids)
+
+        input_ids = torch.tensor([gen_request.input_ids[prefix_len:]], dtype=torch.long, device=device)
+        if prefix is not None:
+            outputs = self.model(
+                input_ids=input_ids,
+                attention_mask=torch.ones((1, prompt_len), dtype=torch.long, device=device),
+                position_ids=torch.arange(prefix_len, prompt_len, device=device).unsqueeze(0),
+                past_key_values=from_legacy_cache(prefix),
+                use_cache=True
+            )
+        else:
+            outputs = self.model(input_ids=input_ids, use_cache=True)
+        self.prefill_tokens += prompt_len - prefix_len
+
+        cache = to_legacy_cache(outputs.past_key_values)
+        if self.prefix_cache is not None:
+            self.prefix_cache.insert(gen_request.input_ids, cache)
+
+        # Sampling the first token waits for the forward pass, so this covers the whole prefill
+        accepted = self._accept_token(gen_request, outputs.logits[0, -1])
+        self.prefill_seconds += time.time() - started
+        if not accepted:
+            return
+
+        attention_mask = torch.ones((1, prompt_len), dtype=torch.long, device=device)
+        self._merge_into_batch(gen_request, cache, attention_mask)
+
+    def _decode_step(self):
+        """
+        Runs one forward pass over the whole batch and samples a token per sequence.
+        """
+        started = time.time()
+        device = self.model.device
+        input_ids = torch.tensor(
+            [[gen_request.next_token] for gen_request in self.active],
+            dtype=torch.long,
+            device=device
+        )
+        # Positions count only real (non-padding) tokens of each sequence
+        position_ids = self._attention_mask.sum(dim=1, keepdim=True)
+        attention_mask = torch.cat(
+            [self._attention_mask, torch.ones((len(self.active), 1), dtype=torch.long, device=device)],
+            dim=1
+        )
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=from_legacy_cache(self._cache),
+            use_cache=True
+        )
+        self._cache = to_legacy_cache(outputs.past_key_values)
+        self._attention_mask = attention_mask
+
+        keep = []
+        for row, gen_request in enumerate(self.active):
+            if self._accept_token(gen_request, outputs.logits[row, -1]):
+                keep.append(row)
+        self.decode_steps += 1
+        self.decode_tokens += len(self.active)
+        self.decode_seconds += time.time() - started
+        if len(keep) != len(self.active):
+            self._select_rows(keep)
+
+    def _drop_cancelled(self):
+        """
+        Removes sequences whose client has gone away from the running batch.
+        """
+        keep = []
+        for row, gen_request in enumerate(self.active):
+            if gen_request.cancelled.is_set():
+                self._record_cancellation(gen_request)
+            else:
+                keep.append(row)
+        if len(keep) != len(self.active):
+            self._select_rows(keep)
+
+    def _record_cancellation(self, gen_request):
+        self.cancelled_requests += 1
+        self.tokens_budget_released += max(0, gen_request.max_new_tokens - len(gen_request.output_ids))
+        gen_request.finish(self.tokenizer)
+
+    def _accept_token(self, gen_request, logits):
+        """
+        Samples and streams the next token; returns False once the sequence is done.
+        """
+        if gen_request.logits_processor is not None:
+            output_ids = torch.tensor([gen_request.output_ids], dtype=torch.long, device=logits.device)
+            logits = gen_request.logits_processor(output_ids, logits.unsqueeze(0))[0]
+        token_id = sample_next_token(
+            logits,
+            do_sample=gen_request.do_sample,
+            temperature=gen_request.temperature,
+            top_k=gen_request.top_k,
+            top_p=gen_request.top_p
+        )
+        if token_id in self.eos_token_ids:
+            gen_request.finish(self.tokenizer)
+            return False
+
+        gen_request.push_token(self.tokenizer, token_id)
+        if len(gen_request.output_ids) >= gen_request.max_new_tokens or _criteria_met(gen_request):
+            gen_request.finish(self.tokenizer)
+            return False
+        return True
+
+    # ------------------------------------------------------------------
+    # Batch KV-cache bookkeeping
+    # ------------------------------------------------------------------
+    def _merge_into_batch(self, gen_request, cache, attention_mask):
+        if not self.active:
+            self.active = [gen_request]
+            self._cache = cache
+            self._attention_mask = attention_mask
+            return
+
+        batch_len = self._attention_mask.shape[1]
+        new_len = attention_mask.shape[1]
+        target_len = max(batch_len, new_len)
+
+        merged = []
+        for (batch_k, batch_v), (new_k, new_v) in zip(self._cache, cache):
+            merged.append((
+                torch.cat([_left_pad(batch_k, target_len), _left_pad(new_k, target_len)], dim=0),
+                torch.cat([_left_pad(batch_v, target_len), _left_pad(new_v, target_len)], dim=0)
+            ))
+        self._cache = tuple(merged)
+        self._attention_mask = torch.cat(
+            [F.pad(self._attention_mask, (target_len - batch_len, 0)),
+             F.pad(attention_mask, (target_len - new_len, 0))],
+            dim=0
+        )
+        self.active.append(gen_request)
+
+    def _select_rows(self, keep):
+        """
+        Drops finished rows and trims padding columns no sequence needs anymore.
+        """
+        if not keep:
+            self._reset_batch()
+            return
+
+        index = torch.tensor(keep, dtype=torch.long, device=self._attention_mask.device)
+        attention_mask = self._attention_mask.index_select(0, index)
+        first_used = int(torch.nonzero(attention_mask.sum(dim=0))[0])
+
+        self._attention_mask = attention_mask[:, first_used:]
+        self._cache = tuple(
+            (k.index_select(0, index.to(k.device))[:, :, first_used:],
+             v.index_select(0, index.to(v.device))[:, :, first_used:])
+            for k, v in self._cache
+        )
+        self.active = [self.active[row] for row in keep]
+
+    def _reset_batch(self):
+        self.active = []
+        self._cache = None
+        self._attention_mask = None
+
+
+def _criteria_met(gen_request):
+    """Evaluates the request's StoppingCriteriaList over its generated tokens."""
+    if gen_request.stopping_criteria is None:
+        return False
+    output_ids = torch.tensor([gen_request.output_ids], dtype=torch.long)
+    done = gen_request.stopping_criteria(output_ids, None)
+    return bool(done.any()) if torch.is_tensor(done) else bool(done)
+
+
+def _left_pad(tensor, target_len):
+    """Zero-pads a (batch, heads, seq, dim) cache tensor on the left of the seq axis."""
+    pad = target_len - tensor.shape[-2]
+    if pad == 0:
+        return tensor
+    return F.pad(tensor, (0, 0, pad, 0))
@@ -0,0 +1,240 @@
+# speculative.py
+"""
+Speculative (assisted) generation with a small draft model.
+
+The draft model proposes a few tokens per step and the target model verifies
+them in one forward pass; every verified chunk is streamed to the client as
+soon as `model.generate` hands it to the streamer. Acceptance rate and
+tokens/sec are recorded for every request.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+import torch
+from transformers import TextStreamer, StoppingCriteria, StoppingCriteriaList, LogitsProcessor, LogitsProcessorList
+
+
+######################################################################
+# 1) HELPER: Streamer / criteria adapters for a GenerationRequest
+######################################################################
+class _RequestStreamer(TextStreamer):
+    """
+    TextStreamer that forwards finalized text into a GenerationRequest and
+    counts verification steps and verified tokens along the way.
+    """
+
+    def __init__(self, tokenizer, gen_request):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.gen_request = gen_request
+        self.steps = 0
+        self.tokens = 0
+
+    def put(self, value):
+        if not (self.skip_prompt and self.next_tokens_are_prompt):
+            # Each put after the prompt is one target verification step
+            self.steps += 1
+            self.tokens += value.numel()
+        super().put(value)
+
+    def on_finalized_text(self, text, stream_end=False):
+        self.gen_request._emit(text)
+
+
+class _CancelledCriteria(StoppingCriteria):
+    """Stops generation once the client of the request has disconnected."""
+
+    def __init__(self, gen_request):
+        self.gen_request = gen_request
+
+    def __call__(self, input_ids, scores, **kwargs):
+        cancelled = self.gen_request.cancelled.is_set()
+        return torch.full((input_ids.shape[0],), cancelled, dtype=torch.bool, device=input_ids.device)
+
+
+class _GeneratedOnlyCriteria(StoppingCriteria):
+    """Hands only the generated ids to criteria written for the batch scheduler."""
+
+    def __init__(self, criteria, prompt_length):
+        self.criteria = criteria
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.criteria(input_ids[:, self.prompt_length:], scores, **kwargs)
+
+
+class _GeneratedOnlyProcessor(LogitsProcessor):
+    """Hands only the generated ids to processors written for the batch scheduler."""
+
+    def __init__(self, processor, prompt_length):
+        self.processor = processor
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores):
+        return self.processor(input_ids[:, self.prompt_length:], scores)
+
+
+######################################################################
+# 2) SpeculativeGenerator: assisted generation with per-request stats
+######################################################################
+class SpeculativeGenerator:
+    """
+    Runs GenerationRequests through `model.generate(assistant_model=...)`
+    one at a time on a single worker thread; the rest wait in a queue.
+
+    Assisted generation decodes one sequence per call and adapts the draft
+    model's generation_config between steps, so requests must not share it
+    concurrently. Servers send only opted-in requests here and batch the rest.
+
+    If the draft tokenizer differs from the target's, transformers' universal
+    assisted generation re-tokenizes between the two models.
+    """
+
+    def __init__(self, model, tokenizer, draft_model, draft_tokenizer=None, history=100):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.draft_model = draft_model
+        self.draft_tokenizer = draft_tokenizer
+        self.shared_tokenizer = draft_tokenizer is None or draft_tokenizer.get_vocab() == tokenizer.get_vocab()
+
+        # Every draft forward pass proposes one candidate token
+        self._draft_forwards = 0
+        self.draft_model.register_forward_hook(self._count_draft_forward)
+
+        self.pending = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name="speculative-generator", daemon=True)
+
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=history)
+        self.requests = 0
+        self.total_tokens = 0
+        self.total_proposed = 0
+        self.total_accepted = 0
+        self.cancelled_requests = 0
+        # Unused max_new_tokens of cancelled requests: an upper bound on the tokens
+        # cancellation saved, since most would have stopped at EOS earlier
+        self.tokens_budget_released = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Ends the worker thread after the current request; queued requests are failed.
+        """
+        self._stopped = True
+        self.pending.put(None)
+
+    def submit(self, gen_request):
+        """
+        Queues a GenerationRequest and returns it for streaming.
+        """
+        self.pending.put(gen_request)
+        return gen_request
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self.pending.qsize(),
+                "requests": self.requests,
+                "tokens": self.total_tokens,
+                "acceptance_rate": (self.total_accepted / self.total_proposed) if self.total_proposed else 0.0,
+                "cancelled_requests": self.cancelled_requests,
+                "tokens_budget_released": self.tokens_budget_released,
+                "recent": list(self.recent),
+            }
+
+    def _count_draft_forward(self, module, inputs, outputs):
+        self._draft_forwards += 1
+
+    def _loop(self):
+        while not self._stopped:
+            gen_request = self.pending.get()
+            if gen_request is None:
+                continue
+            if gen_request.cancelled.is_set():
+                # The client left while the request was queued
+                gen_request.finish()
+                with self._lock:
+                    self.cancelled_requests += 1
+                    self.tokens_budget_released += gen_request.max_new_tokens
+                continue
+            self._run(gen_request)
+
+        while not self.pending.empty():
+            gen_request = self.pending.get_nowait()
+            if gen_request is not None:
+                gen_request.finish(error="Speculative generator stopped.")
+
+    def _run(self, gen_request):
+        prompt_length = len(gen_request.input_ids)
+        streamer = _RequestStreamer(self.tokenizer, gen_request)
+
+        stopping_criteria = StoppingCriteriaList([_CancelledCriteria(gen_request)])
+        if gen_request.stopping_criteria is not None:
+            stopping_criteria.append(_GeneratedOnlyCriteria(gen_request.stopping_criteria, prompt_length))
+        logits_processor = LogitsProcessorList()
+        if gen_request.logits_processor is not None:
+            logits_processor.append(_GeneratedOnlyProcessor(gen_request.logits_processor, prompt_length))
+
+        generation_kwargs = dict(
+            input_ids=self._tensor(gen_request.input_ids),
+            attention_mask=self._tensor([1] * prompt_length),
+            assistant_model=self.draft_model,
+            max_new_tokens=gen_request.max_new_tokens,
+            do_sample=gen_request.do_sample,
+            num_return_sequences=1,
+            eos_token_id=self.tokenizer.eos_token_id,
+            pad_token_id=self.tokenizer.pad_token_id or self.tokenizer.eos_token_id,
+            stopping_criteria=stopping_criteria,
+            logits_processor=logits_processor,
+            streamer=streamer
+        )
+        if gen_request.do_sample:
+            generation_kwargs.update(
+                temperature=gen_request.temperature,
+                top_k=gen_request.top_k,
+                top_p=gen_request.top_p
+            )
+        if not self.shared_tokenizer:
+            generation_kwargs.update(tokenizer=self.tokenizer, assistant_tokenizer=self.draft_tokenizer)
+
+        self._draft_forwards = 0
+        started = time.time()
+        error = None
+        try:
+            self.model.generate(**generation_kwargs)
+        except Exception as e:
+            error = str(e)
+        finally:
+            gen_request.finish(error=error)
+            self._record(gen_request, streamer, time.time() - started)
+
+    def _record(self, gen_request, streamer, elapsed):
+        proposed = self._draft_forwards
+        # Each verification step yields the accepted draft tokens plus one target token
+        accepted = min(max(streamer.tokens - streamer.steps, 0), proposed)
+        request_stats = {
+            "tokens": streamer.tokens,
+            "target_steps": streamer.steps,
+            "draft_proposed": proposed,
+            "draft_accepted": accepted,
+            "acceptance_rate": (accepted / proposed) if proposed else 0.0,
+            "tokens_per_sec": (streamer.tokens / elapsed) if elapsed > 0 else 0.0,
+            "seconds": elapsed,
+        }
+        with self._lock:
+            self.recent.append(request_stats)
+            self.requests += 1
+            self.total_tokens += streamer.tokens
+            self.total_proposed += proposed
+            self.total_accepted += accepted
+            if gen_request.cancelled.is_set():
+                self.cancelled_requests += 1
+                self.tokens_budget_released += max(0, gen_request.max_new_tokens - streamer.tokens)
+
+    def _tensor(self, ids):
+        return torch.tensor([ids], dtype=torch.long, device=self.model.device)
@@ -0,0 +1,275 @@
+# worker.py
+"""
+ModelWorker: one model and everything that serves it.
+
+The servers create a worker and bind Flask right away; the worker loads its
+weights in a background thread (memory-mapped from safetensors), optionally
+int8-quantizes them on CPU-only hosts, runs a warm-up generation and only
+then reports ready.
+"""
+import gc
+import threading
+import time
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+from scheduler import BatchScheduler, GenerationRequest
+from prefix_cache import PrefixKVCache
+from generation import parse_generation_params, build_stopping_criteria
+from constraints import build_logits_processor
+from speculative import SpeculativeGenerator
+
+WARMUP_MESSAGES = [{"role": "user", "content": "Reply with TRUE."}]
+
+
+######################################################################
+# 1) HELPER: Load a model for the current host
+######################################################################
+def load_model(model_name, device="auto", torch_dtype="auto", trust_remote_code=False, quantize_int8=False):
+    """
+    Loads a causal LM memory-mapped from safetensors.
+
+    - On GPU hosts the weights are placed with device_map="auto".
+    - On CPU-only hosts (or device="cpu") they stay in float32 on the CPU and
+      can be int8 dynamically quantized, which roughly halves memory and
+      speeds up the Linear layers.
+    """
+    use_cuda = torch.cuda.is_available() if device == "auto" else device == "cuda"
+    load_kwargs = dict(
+        trust_remote_code=trust_remote_code,
+        use_safetensors=True,
+        low_cpu_mem_usage=True
+    )
+    if use_cuda:
+        load_kwargs.update(torch_dtype=torch_dtype, device_map="auto")
+    else:
+        load_kwargs.update(torch_dtype=torch.float32)
+
+    model = AutoModelForCausalLM.from_pretrained(model_name, **load_kwargs)
+    model.eval()
+
+    if quantize_int8 and not use_cuda:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def model_memory_bytes(model):
+    """
+    Bytes held by a model's parameters and buffers.
+    """
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def encode_messages(tokenizer, messages):
+    """
+    Applies the chat template and returns the prompt token ids.
+    """
+    prompt_text = tokenizer.apply_chat_template(
+        messages,
+        tokenize=False,
+        add_generation_prompt=True
+    )
+    # The chat template already contains any BOS text
+    return tokenizer(prompt_text, add_special_tokens=False)["input_ids"]
+
+
+######################################################################
+# 2) HELPER: Stream a request back to Flask, cancelling on disconnect
+######################################################################
+def stream_tokens(gen_request):
+    """
+    Yields a request's text chunks; if the client goes away first (the
+    generator is closed early), the request is cancelled.
+    """
+    try:
+        for new_token in gen_request.stream():
+            yield new_token
+    finally:
+        # Closed before the end: the client disconnected, so stop decoding for it
+        if not gen_request.finished:
+            gen_request.cancel()
+
+
+######################################################################
+# 3) ModelWorker
+######################################################################
+class ModelWorker:
+    """
+    Owns the tokenizer, model, batch scheduler, prefix cache and optional
+    speculative generator of one model.
+
+    States: "created" -> "loading" -> "warming_up" -> "ready" (or "failed"),
+    and "unloaded" after `unload()`; `start()` may be called again to reload.
+    """
+
+    def __init__(self, model_name, generation_defaults, trust_remote_code=False, torch_dtype="auto",
+                 device="auto", quantize_int8=False, draft_model_name=None, max_batch_size=8,
+                 max_wait_ms=10, prefix_cache_mb=2048, max_new_tokens=8192):
+        self.model_name = model_name
+        self.generation_defaults = generation_defaults
+        self.trust_remote_code = trust_remote_code
+        self.torch_dtype = torch_dtype
+        self.device = device
+        self.quantize_int8 = quantize_int8
+        self.draft_model_name = draft_model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.prefix_cache_mb = prefix_cache_mb
+        self.max_new_tokens = max_new_tokens
+
+        self.tokenizer = None
+        self.model = None
+        self.scheduler = None
+        self.speculative = None
+
+        self.state = "created"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.memory_bytes = None
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        """
+        Loads and warms up the model in a background thread; returns immediately.
+        """
+        threading.Thread(target=self._load_and_warm_up, name=f"load-{self.model_name}", daemon=True).start()
+        return self
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Blocks until the worker is ready or has failed; returns True when ready.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while not self._ready.wait(0.1):
+            if self.state == "failed":
+                return False
+            if deadline is not None and time.time() > deadline:
+                return False
+        return True
+
+    def unload(self):
+        """
+        Stops the scheduler and drops the weights so their memory can be reclaimed.
+        """
+        self._ready.clear()
+        self.state = "unloaded"
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.speculative is not None:
+            self.speculative.stop()
+        self.model = None
+        self.scheduler = None
+        self.speculative = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def encode(self, messages):
+        """
+        Applies the chat template and returns the prompt token ids.
+        """
+        return encode_messages(self.tokenizer, messages)
+
+    def generate(self, data):
+        """
+        Builds a GenerationRequest from a validated /generate body and queues it.
+        Raises ValueError for bad optional fields.
+        """
+        params = parse_generation_params(data, self.generation_defaults, self.max_new_tokens)
+        stop = params.pop("stop")
+        constraint = params.pop("constraint")
+
+        # Speculative decoding is opt-in: it runs one request at a time, outside the batch
+        use_speculative = data.get("speculative", False)
+        if not isinstance(use_speculative, bool):
+            raise ValueError("'speculative' must be a boolean.")
+        runner = self.speculative if (use_speculative and self.speculative is not None) else self.scheduler
+
+        return runner.submit(GenerationRequest(
+            self.encode(data["messages"]),
+            stopping_criteria=build_stopping_criteria(self.tokenizer, stop),
+            logits_processor=build_logits_processor(self.tokenizer, constraint, self.scheduler.eos_token_ids),
+            **params
+        ))
+
+    def stats(self):
+        stats = {
+            "model": self.model_name,
+            "state": self.state,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "memory_bytes": self.memory_bytes,
+        }
+        if self.scheduler is not None:
+            stats.update(self.scheduler.stats())
+        if self.speculative is not None:
+            stats["speculative"] = self.speculative.stats()
+        return stats
+
+    def _load_and_warm_up(self):
+        try:
+            self.state = "loading"
+            started = time.time()
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=self.trust_remote_code)
+            self.model = load_model(
+                self.model_name,
+                device=self.device,
+                torch_dtype=self.torch_dtype,
+                trust_remote_code=self.trust_remote_code,
+                quantize_int8=self.quantize_int8
+            )
+            # Weights plus the most the prefix cache may grow to
+            self.memory_bytes = model_memory_bytes(self.model) + self.prefix_cache_mb * 1024 * 1024
+            if self.draft_model_name:
+                draft_tokenizer = AutoTokenizer.from_pretrained(self.draft_model_name, trust_remote_code=self.trust_remote_code)
+                draft_model = load_model(
+                    self.draft_model_name,
+                    device=self.device,
+                    trust_remote_code=self.trust_remote_code,
+                    quantize_int8=self.quantize_int8
+                )
+                self.speculative = SpeculativeGenerator(
+                    self.model, self.tokenizer, draft_model, draft_tokenizer
+                ).start()
+                self.memory_bytes += model_memory_bytes(draft_model)
+
+            prefix_cache = None
+            if self.prefix_cache_mb > 0:
+                prefix_cache = PrefixKVCache(max_bytes=self.prefix_cache_mb * 1024 * 1024)
+            self.scheduler = BatchScheduler(
+                self.model,
+                self.tokenizer,
+                max_batch_size=self.max_batch_size,
+                max_wait_ms=self.max_wait_ms,
+                eos_token_id=self.tokenizer.eos_token_id,
+                prefix_cache=prefix_cache
+            ).start()
+            self.load_seconds = time.time() - started
+
+            # A short constrained generation compiles kernels, allocates the
+            # KV cache and builds the constraint token index before traffic arrives
+            self.state = "warming_up"
+            started = time.time()
+            warmup = self.generate({
+                "messages": WARMUP_MESSAGES,
+                "max_new_tokens": 4,
+                "constraint": "{TRUE|FALSE}",
+                "speculative": False
+            })
+            for _ in warmup.stream():
+                pass
+            self.warmup_seconds = time.time() - started
+
+            self.state = "ready"
+            self._ready.set()
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
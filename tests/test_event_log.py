@@ -0,0 +1,83 @@
+"""
+EventLog (agent/event_log.py): records come back through read_events with
+long strings stored once per file, rotation keeps every file readable on its
+own, and a reopened log does not reference blobs it has not written.
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from agent.event_log import EventLog, read_events
+
+PROMPT = "You are a careful Python programmer. " * 20  # well over blob_min_chars
+
+
+class EventLogTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "logs", "session.jsonl")
+
+    def raw_records(self, path=None):
+        with open(path or self.path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_round_trip_with_shared_blobs(self):
+        log = EventLog(self.path)
+        for turn in range(3):
+            log.log("llm_request", messages=[{"role": "system", "content": PROMPT}, {"role": "user", "content": f"turn {turn}"}])
+        log.log("execution", returncode=1, seconds=0.25, stopped=None)
+        log.close()
+
+        events = read_events(self.path)
+        self.assertEqual([event["event"] for event in events], ["llm_request"] * 3 + ["execution"])
+        self.assertEqual(events[2]["messages"], [{"role": "system", "content": PROMPT}, {"role": "user", "content": "turn 2"}])
+        self.assertEqual(events[3]["returncode"], 1)
+        # The prompt is written once and referenced by all three requests
+        self.assertEqual(sum(record["event"] == "blob" for record in self.raw_records()), 1)
+        self.assertEqual((log.stats["events"], log.stats["blobs_written"], log.stats["blobs_reused"]), (4, 1, 2))
+
+    def test_rotation_keeps_each_file_self_contained(self):
+        log = EventLog(self.path, max_bytes=2000, backups=2)
+        for index in range(12):
+            log.log("code", index=index, code=f"{PROMPT}{index}", system=PROMPT)
+        log.close()
+
+        self.assertGreater(log.stats["rotations"], 0)
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        kept = []
+        for path in (self.path + ".2", self.path + ".1", self.path):
+            for event in read_events(path):
+                # Every reference resolves within its own file
+                self.assertEqual((event["code"], event["system"]), (f"{PROMPT}{event['index']}", PROMPT))
+                kept.append(event["index"])
+        # The newest records survive, in order
+        self.assertGreater(len(kept), 1)
+        self.assertEqual(kept, list(range(12 - len(kept), 12)))
+
+    def test_reopened_log_appends(self):
+        first = EventLog(self.path)
+        first.log("code", code=PROMPT)
+        first.close()
+        second = EventLog(self.path)
+        second.log("code", code=PROMPT)
+        second.flush()
+        second.close()
+        self.assertEqual([event["code"] for event in read_events(self.path)], [PROMPT, PROMPT])
+
+    def test_unserializable_fields_and_closed_log(self):
+        log = EventLog(self.path)
+        log.log("execution", cwd=os.path, limits=None)
+        log.close()
+        log.log("ignored")  # after close()
+        events = read_events(self.path)
+        self.assertEqual(len(events), 1)
+        self.assertIsInstance(events[0]["cwd"], str)
+
+
+if __name__ == "__main__":
+    unittest.main()
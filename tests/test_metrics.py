@@ -0,0 +1,93 @@
+"""
+Agent metrics (agent/metrics.py): nearest-rank summaries, the Prometheus
+text rendering of a registry, the /metrics endpoint and per-session reports.
+
+    python -m unittest discover tests
+"""
+import unittest
+import urllib.error
+import urllib.request
+
+from agent.metrics import MetricsRegistry, SessionMetrics, _summary
+
+
+class SummaryTest(unittest.TestCase):
+
+    def test_nearest_rank_percentiles(self):
+        summary = _summary(list(range(100, 0, -1)))  # 1..100, unordered
+        self.assertEqual(summary, {"count": 100, "total": 5050, "mean": 50.5, "p50": 50, "p95": 95, "max": 100})
+
+    def test_percentiles_are_samples(self):
+        summary = _summary([0.2, 0.1, 0.4, 0.3])
+        self.assertEqual((summary["p50"], summary["p95"]), (0.2, 0.4))
+        self.assertEqual(_summary([7.5])["p50"], 7.5)
+        self.assertEqual(_summary([]), {"count": 0})
+
+
+class PrometheusTextTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.declare("jobs_total", "counter", "Jobs by outcome.")
+        self.registry.declare("queue_depth", "gauge", "Jobs waiting.")
+        self.registry.declare("job_seconds", "histogram", "Job latency.", buckets=(0.1, 1))
+
+    def test_rendering(self):
+        self.registry.inc("jobs_total", outcome="ok")
+        self.registry.inc("jobs_total", 2, outcome='say "hi"\n')
+        self.registry.set("queue_depth", 3)
+        for value in (0.05, 0.1, 0.5, 5):
+            self.registry.observe("job_seconds", value, phase="run")
+        lines = self.registry.prometheus_text().splitlines()
+
+        self.assertIn("# HELP jobs_total Jobs by outcome.", lines)
+        self.assertIn("# TYPE jobs_total counter", lines)
+        self.assertIn('jobs_total{outcome="ok"} 1', lines)
+        self.assertIn('jobs_total{outcome="say \\"hi\\"\\n"} 2', lines)
+        self.assertIn("queue_depth 3", lines)
+        # Cumulative buckets; a value on a bound falls into that bucket
+        self.assertIn('job_seconds_bucket{phase="run",le="0.1"} 2', lines)
+        self.assertIn('job_seconds_bucket{phase="run",le="1"} 3', lines)
+        self.assertIn('job_seconds_bucket{phase="run",le="+Inf"} 4', lines)
+        self.assertIn('job_seconds_sum{phase="run"} 5.65', lines)
+        self.assertIn('job_seconds_count{phase="run"} 4', lines)
+
+    def test_redeclare_is_a_no_op_and_types_are_checked(self):
+        self.registry.inc("jobs_total")
+        self.registry.declare("jobs_total", "counter", "Other help.")
+        self.assertIn("# HELP jobs_total Jobs by outcome.", self.registry.prometheus_text())
+        with self.assertRaises(ValueError):
+            self.registry.declare("ratio", "summary", "Not supported.")
+
+    def test_serve(self):
+        self.registry.set("queue_depth", 1)
+        server = self.registry.serve(port=0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+            self.assertIn("queue_depth 1", response.read().decode("utf-8"))
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{base}/other", timeout=5)
+
+
+class SessionMetricsTest(unittest.TestCase):
+
+    def test_report_is_per_session(self):
+        registry = MetricsRegistry()
+        first, second = SessionMetrics(registry), SessionMetrics(registry)
+        for value in (1.0, 2.0, 3.0):
+            first.observe("bugout_phase_seconds", value, phase="llm")
+        first.inc("bugout_executions_total", outcome="ok")
+        second.observe("bugout_phase_seconds", 9.0, phase="llm")
+
+        report = first.report()
+        self.assertEqual(report["phase_seconds"]["llm"]["p50"], 2.0)
+        self.assertEqual(report["executions_total"], {"ok": 1})
+        self.assertEqual(first.values("bugout_phase_seconds", phase="llm"), [1.0, 2.0, 3.0])
+        # The shared registry sees both sessions
+        self.assertIn('bugout_phase_seconds_count{phase="llm"} 4', registry.prometheus_text())
+
+
+if __name__ == "__main__":
+    unittest.main()
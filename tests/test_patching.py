@@ -0,0 +1,70 @@
+"""
+Edit-mode patching (agent/patching.py): search/replace edits and unified
+diffs apply where they match exactly once, and are rejected otherwise.
+
+    python -m unittest discover tests
+"""
+import unittest
+
+from agent.patching import PatchError, apply_edits, apply_reply, apply_unified_diff, is_patch
+
+CODE = "def area(w, h):\n    return w + h\n\nprint(area(2, 3))\n"
+
+
+def edits_reply(search, replace):
+    return f"Fixed the formula.\n```edits\n<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE\n```"
+
+
+class ApplyEditsTest(unittest.TestCase):
+
+    def test_replaces_unique_match(self):
+        self.assertEqual(apply_edits(CODE, [("    return w + h\n", "    return w * h\n")]),
+                         CODE.replace("w + h", "w * h"))
+
+    def test_trailing_whitespace_fallback(self):
+        self.assertEqual(apply_edits("x = 1  \ny = 2\n", [("x = 1\n", "x = 3\n")]), "x = 3\ny = 2\n")
+
+    def test_ambiguous_match_is_rejected(self):
+        with self.assertRaises(PatchError):
+            apply_edits("x = 1\ny = 2\nx = 1\n", [("x = 1\n", "x = 3\n")])
+        # Two matches once trailing whitespace is ignored: neither is picked silently
+        with self.assertRaises(PatchError):
+            apply_edits("x = 1  \ny = 2\nx = 1 \n", [("x = 1\n", "x = 3\n")])
+
+    def test_missing_and_empty_search(self):
+        with self.assertRaises(PatchError):
+            apply_edits(CODE, [("return w - h\n", "return w * h\n")])
+        with self.assertRaises(PatchError):
+            apply_edits(CODE, [("\n", "pass\n")])
+
+
+class ApplyUnifiedDiffTest(unittest.TestCase):
+
+    def test_hunk_applies_despite_wrong_line_numbers(self):
+        diff = "--- a.py\n+++ a.py\n@@ -7,2 +7,2 @@\n def area(w, h):\n-    return w + h\n+    return w * h\n"
+        self.assertEqual(apply_unified_diff(CODE, diff), CODE.replace("w + h", "w * h"))
+
+    def test_mismatched_hunk(self):
+        with self.assertRaises(PatchError):
+            apply_unified_diff(CODE, "@@ -1,1 +1,1 @@\n-def volume(w, h):\n+def volume(w, h, d):\n")
+
+
+class ApplyReplyTest(unittest.TestCase):
+
+    def test_edits_reply(self):
+        reply = edits_reply("    return w + h\n", "    return w * h\n")
+        self.assertTrue(is_patch(reply))
+        self.assertEqual(apply_reply(CODE, reply), CODE.replace("w + h", "w * h"))
+
+    def test_full_script_reply_is_not_a_patch(self):
+        reply = "```python\nprint(6)\n```"
+        self.assertFalse(is_patch(reply))
+        self.assertIsNone(apply_reply(CODE, reply))
+
+    def test_patched_code_must_compile(self):
+        with self.assertRaises(PatchError):
+            apply_reply(CODE, edits_reply("    return w + h\n", "    return w +\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Pre-flight checks (agent/preflight.py): valid scripts pass untouched; syntax
+errors, undefined names (scope-aware for class-only names), unresolvable
+imports and tests or main() that never run are reported.
+
+    python -m unittest discover tests
+"""
+import textwrap
+import unittest
+
+from agent.preflight import format_issues, preflight
+
+VALID = textwrap.dedent("""
+    import unittest
+
+
+    def add(a, b):
+        return a + b
+
+
+    class TestAdd(unittest.TestCase):
+        def test_add(self):
+            self.assertEqual(add(2, 3), 5)
+
+
+    def main():
+        print(add(1, 1))
+
+
+    if __name__ == "__main__":
+        main()
+        unittest.main(argv=["ignored"], exit=False)
+""")
+
+
+def checks(code):
+    return [issue["check"] for issue in preflight(textwrap.dedent(code))]
+
+
+def undefined_names(code):
+    return [issue["message"] for issue in preflight(textwrap.dedent(code)) if issue["check"] == "undefined-name"]
+
+
+class PreflightTest(unittest.TestCase):
+
+    def test_valid_script_passes(self):
+        self.assertEqual(preflight(VALID), [])
+
+    def test_syntax_error_stops_other_checks(self):
+        issues = preflight("def broken(:\n    pass\n")
+        self.assertEqual([issue["check"] for issue in issues], ["syntax"])
+        self.assertEqual(issues[0]["line"], 1)
+
+    def test_unresolved_import(self):
+        self.assertIn("unresolved-import", checks("import no_such_module_here\n" + VALID))
+        # Imports guarded by try, or after a pip install, are left to the run
+        self.assertEqual(checks("try:\n    import no_such_module_here\nexcept ImportError:\n    pass\n" + VALID), [])
+        self.assertEqual(checks("import os\nos.system('pip install x')\nimport no_such_module_here\n" + VALID), [])
+
+    def test_tests_and_main_must_run(self):
+        self.assertEqual(checks("print(1)\n"), ["missing-tests"])
+        self.assertIn("tests-not-run", checks(VALID.replace('unittest.main(argv=["ignored"], exit=False)', "pass")))
+        self.assertIn("main-not-called", checks(VALID.replace("    main()\n", "")))
+        runner = "unittest.TextTestRunner().run(unittest.TestLoader().loadTestsFromTestCase(TestAdd))"
+        self.assertEqual(checks(VALID.replace('unittest.main(argv=["ignored"], exit=False)', runner)), [])
+
+    def test_dynamic_names_are_not_checked(self):
+        self.assertEqual(undefined_names("exec('value = 1')\nprint(value)\n"), [])
+
+    def test_format_issues(self):
+        feedback = format_issues(preflight("print(1)\nprint(valuse)\n"))
+        self.assertIn("- line 2 [undefined-name]: name 'valuse' is not defined", feedback)
+        self.assertIn("- code [missing-tests]", feedback)
+
+
+class UndefinedNameTest(unittest.TestCase):
+
+    def test_class_scope_names(self):
+        code = """
+            class Base:
+                def __init__(self):
+                    self.kind = __class__.__name__
+
+            class Child(Base):
+                label = __qualname__ + " in " + __module__
+
+                def __init__(self):
+                    super().__init__()
+                    helper = lambda: __class__
+                    self.owner = helper()
+
+            Child()
+        """
+        self.assertEqual(undefined_names(code), [])
+
+    def test_class_scope_names_outside_their_scope(self):
+        code = """
+            def outside():
+                return __class__
+
+            class Widget:
+                def method(self):
+                    return __qualname__
+
+            print(__module__)
+        """
+        self.assertEqual(sorted(undefined_names(code)), [
+            "name '__class__' is not defined",
+            "name '__module__' is not defined",
+            "name '__qualname__' is not defined",
+        ])
+
+    def test_misspelled_name(self):
+        self.assertEqual(undefined_names("values = [1, 2]\nprint(valuse)\n"), ["name 'valuse' is not defined"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+BatchScheduler on CPU with a tiny random causal LM: batched greedy streams
+match plain `model.generate`, and max_batch_size / max_wait_ms are respected.
+
+    python -m unittest discover tests
+"""
+import time
+import unittest
+
+from tiny_lm import tiny_model, tiny_tokenizer, prompt_ids, greedy_reference
+from scheduler import BatchScheduler, GenerationRequest
+
+
+class BatchSchedulerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = tiny_model()
+        cls.tokenizer = tiny_tokenizer()
+
+    def _scheduler(self, **kwargs):
+        scheduler = BatchScheduler(self.model, self.tokenizer, **kwargs)
+        # Record (time, batch size) of every decode step
+        scheduler.steps = []
+        decode_step = scheduler._decode_step
+
+        def recording_decode_step():
+            scheduler.steps.append((time.time(), len(scheduler.active)))
+            decode_step()
+
+        scheduler._decode_step = recording_decode_step
+        self.addCleanup(scheduler.stop)
+        return scheduler
+
+    def test_streams_match_greedy_generate(self):
+        scheduler = self._scheduler(max_batch_size=3, max_wait_ms=10)
+        cases = [(3 + 7 * index, 12 + 5 * index) for index in range(7)]  # (prompt length, max_new_tokens)
+        requests = []
+        # The first five are queued before the loop starts, the rest arrive while it decodes
+        for index, (length, max_new_tokens) in enumerate(cases[:5]):
+            requests.append(scheduler.submit(GenerationRequest(prompt_ids(length, index), max_new_tokens)))
+        scheduler.start()
+        for index, (length, max_new_tokens) in enumerate(cases[5:], start=5):
+            time.sleep(0.02)
+            requests.append(scheduler.submit(GenerationRequest(prompt_ids(length, index), max_new_tokens)))
+
+        for index, ((length, max_new_tokens), gen_request) in enumerate(zip(cases, requests)):
+            text = "".join(gen_request.stream())
+            expected = greedy_reference(self.model, prompt_ids(length, index), max_new_tokens)
+            self.assertEqual(gen_request.output_ids, expected, f"request {index}")
+            self.assertEqual(text, self.tokenizer.decode(expected, skip_special_tokens=True))
+
+        sizes = [size for _, size in scheduler.steps]
+        self.assertEqual(sizes[0], 3)
+        self.assertLessEqual(max(sizes), 3)
+        self.assertEqual(scheduler.stats()["decode_tokens"], sum(sizes))
+
+    def test_idle_scheduler_waits_max_wait_to_fill_a_batch(self):
+        scheduler = self._scheduler(max_batch_size=4, max_wait_ms=150).start()
+        first = scheduler.submit(GenerationRequest(prompt_ids(8, 0), 4))
+        time.sleep(0.05)
+        second = scheduler.submit(GenerationRequest(prompt_ids(12, 1), 4))
+        list(first.stream())
+        list(second.stream())
+
+        started, size = scheduler.steps[0]
+        # Both requests went into the first batch, which started after the window closed
+        self.assertEqual(size, 2)
+        self.assertGreaterEqual(started - first.submitted_at, 0.15 - 0.01)
+        self.assertLess(started - first.submitted_at, 1.0)
+
+    def test_busy_scheduler_admits_without_waiting(self):
+        scheduler = self._scheduler(max_batch_size=2, max_wait_ms=500).start()
+        first = scheduler.submit(GenerationRequest(prompt_ids(8, 0), 400))
+        while not scheduler.steps:
+            time.sleep(0.005)
+        second = scheduler.submit(GenerationRequest(prompt_ids(8, 1), 4))
+        list(second.stream())
+        # Admitted between decode steps of the running batch, not after another max_wait
+        self.assertLess(time.time() - second.submitted_at, 0.5)
+        first.cancel()
+        list(first.stream())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+SpeculativeGenerator on CPU with two tiny models sharing a tokenizer:
+greedy assisted output equals plain greedy output, and the acceptance-rate
+and tokens/sec stats are filled in.
+
+    python -m unittest discover tests
+"""
+import copy
+import unittest
+
+from tiny_lm import tiny_model, tiny_tokenizer, prompt_ids, greedy_reference
+from scheduler import GenerationRequest
+from speculative import SpeculativeGenerator
+
+CASES = [(5, 20), (17, 32), (40, 24)]  # (prompt length, max_new_tokens)
+
+
+class SpeculativeGeneratorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = tiny_model(seed=0, layers=2)
+        cls.tokenizer = tiny_tokenizer()
+
+    def _generate_all(self, draft_model):
+        generator = SpeculativeGenerator(self.model, self.tokenizer, draft_model, self.tokenizer).start()
+        self.addCleanup(generator.stop)
+        # Submitted together: the single worker runs them one after another
+        requests = [
+            generator.submit(GenerationRequest(prompt_ids(length, index), max_new_tokens))
+            for index, (length, max_new_tokens) in enumerate(CASES)
+        ]
+        for index, ((length, max_new_tokens), gen_request) in enumerate(zip(CASES, requests)):
+            text = "".join(gen_request.stream())
+            expected = greedy_reference(self.model, prompt_ids(length, index), max_new_tokens)
+            self.assertEqual(text, self.tokenizer.decode(expected, skip_special_tokens=True), f"request {index}")
+        return generator.stats()
+
+    def test_different_draft_matches_greedy(self):
+        stats = self._generate_all(tiny_model(seed=1, layers=1))
+        self.assertEqual(stats["requests"], len(CASES))
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(len(stats["recent"]), len(CASES))
+        for request_stats in stats["recent"]:
+            self.assertGreater(request_stats["tokens"], 0)
+            self.assertGreater(request_stats["tokens_per_sec"], 0)
+            self.assertGreater(request_stats["draft_proposed"], 0)
+            self.assertTrue(0.0 <= request_stats["acceptance_rate"] <= 1.0)
+
+    def test_identical_draft_is_accepted(self):
+        # A draft with the target's weights proposes exactly what the target verifies
+        stats = self._generate_all(copy.deepcopy(self.model))
+        self.assertGreater(stats["acceptance_rate"], 0.5)
+        for request_stats in stats["recent"]:
+            self.assertLess(request_stats["target_steps"], request_stats["tokens"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Deterministic unit-test verdicts (agent/test_results.py) from real unittest
+runner output, pytest summaries and the JSON results format; anything else
+is left to the LLM.
+
+    python -m unittest discover tests
+"""
+import io
+import json
+import unittest
+
+from agent.test_results import JSON_RESULTS_EXAMPLE, parse_test_results
+
+
+def unittest_output(*test_methods, verbosity=1):
+    """Runner output of a TestCase with the given methods as test_<name>."""
+    case = type("Sample", (unittest.TestCase,), {f"test_{method.__name__}": method for method in test_methods})
+    stream = io.StringIO()
+    suite = unittest.TestLoader().loadTestsFromTestCase(case)
+    unittest.TextTestRunner(stream=stream, verbosity=verbosity).run(suite)
+    return stream.getvalue()
+
+
+def ok(self):
+    self.assertEqual(1 + 1, 2)
+
+
+def wrong(self):
+    self.assertEqual(1 + 1, 3)
+
+
+def crash(self):
+    raise KeyError("missing")
+
+
+class UnittestOutputTest(unittest.TestCase):
+
+    def test_passing_run(self):
+        verdict = parse_test_results(unittest_output(ok))
+        self.assertEqual((verdict["format"], verdict["passed"], verdict["total"]), ("unittest", True, 1))
+
+    def test_failures_and_errors_are_named(self):
+        for verbosity in (1, 2):
+            verdict = parse_test_results(unittest_output(ok, wrong, crash, verbosity=verbosity))
+            self.assertFalse(verdict["passed"])
+            self.assertEqual(verdict["total"], 3)
+            statuses = {test["name"].rsplit(".", 1)[-1]: test["status"] for test in verdict["tests"]}
+            self.assertEqual(statuses["test_wrong"], "failed")
+            self.assertEqual(statuses["test_crash"], "error")
+            self.assertIn("AssertionError: 2 != 3", verdict["details"])
+            self.assertIn("Failed: ", verdict["summary"])
+
+    def test_no_tests_ran(self):
+        verdict = parse_test_results(unittest_output())
+        self.assertFalse(verdict["passed"])
+        self.assertEqual(verdict["total"], 0)
+
+
+class PytestOutputTest(unittest.TestCase):
+
+    def test_summary_line(self):
+        output = (
+            "=========================== short test summary info ============================\n"
+            "FAILED test_math.py::test_div - ZeroDivisionError: division by zero\n"
+            "========================= 1 failed, 3 passed in 0.05s =========================\n"
+        )
+        verdict = parse_test_results(output)
+        self.assertEqual((verdict["format"], verdict["passed"], verdict["total"]), ("pytest", False, 4))
+        self.assertEqual(verdict["tests"][0]["name"], "test_math.py::test_div")
+        self.assertIn("ZeroDivisionError", verdict["details"])
+
+    def test_quiet_passing_run(self):
+        verdict = parse_test_results("....\n4 passed, 1 warning in 0.01s\n")
+        self.assertEqual((verdict["passed"], verdict["total"]), (True, 4))
+
+
+class JsonResultsTest(unittest.TestCase):
+
+    def test_prompt_example(self):
+        verdict = parse_test_results(JSON_RESULTS_EXAMPLE)
+        self.assertEqual((verdict["format"], verdict["passed"], verdict["total"]), ("json", False, 2))
+        self.assertEqual(verdict["details"], "test_div: ZeroDivisionError")
+
+    def test_self_contradicting_results_are_left_to_the_llm(self):
+        self.assertIsNone(parse_test_results(json.dumps({"passed": True, "tests": [{"status": "failed"}]})))
+
+    def test_unknown_format(self):
+        self.assertIsNone(parse_test_results("all good, I think"))
+        self.assertIsNone(parse_test_results("   "))
+
+
+if __name__ == "__main__":
+    unittest.main()
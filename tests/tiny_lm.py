@@ -0,0 +1,57 @@
+"""
+Tiny random causal LMs and a word-level tokenizer for CPU tests of llm/.
+"""
+import os
+import sys
+
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+# llm/ modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm"))
+
+VOCAB_SIZE = 96
+
+
+def tiny_tokenizer():
+    """
+    Word-level tokenizer over "w0".."w93" plus <eos> (0) and <pad> (1).
+    """
+    vocab = {"<eos>": 0, "<pad>": 1}
+    vocab.update({f"w{index}": index + 2 for index in range(VOCAB_SIZE - 2)})
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<pad>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<eos>", pad_token="<pad>")
+
+
+def tiny_model(seed=0, layers=2, hidden_size=32):
+    """
+    Randomly initialized Llama in float64, so batched and unbatched forward
+    passes agree closely enough for greedy decoding to match exactly.
+    """
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=VOCAB_SIZE, hidden_size=hidden_size, intermediate_size=2 * hidden_size,
+        num_hidden_layers=layers, num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=512,
+        bos_token_id=None, eos_token_id=0, pad_token_id=1
+    )
+    return LlamaForCausalLM(config).to(torch.float64).eval()
+
+
+def prompt_ids(length, seed):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randint(2, VOCAB_SIZE, (length,), generator=generator).tolist()
+
+
+def greedy_reference(model, input_ids, max_new_tokens, eos_token_id=0):
+    """
+    Generated ids of plain greedy `model.generate`, without the final EOS.
+    """
+    with torch.no_grad():
+        output = model.generate(
+            torch.tensor([input_ids]), attention_mask=torch.ones((1, len(input_ids)), dtype=torch.long),
+            max_new_tokens=max_new_tokens, do_sample=False, eos_token_id=eos_token_id, pad_token_id=1
+        )
+    generated = output[0, len(input_ids):].tolist()
+    return generated[:generated.index(eos_token_id)] if eos_token_id in generated else generated